@@ -0,0 +1,237 @@
+"""Admission control for the API.
+
+Every request is sorted into a route class by path prefix. Each class has
+its own concurrency limit and a bounded wait queue, so a flood of expensive
+calls (AI, analyses, portfolio valuation) queues and sheds within its own
+class while cheap reads keep their slots.
+
+Queued requests are ordered by priority from the role claim in the bearer
+token (premium and admin before regular users), then by arrival. A full
+queue turns away the lowest-priority request, which may be the newcomer.
+
+Queue waits follow CoDel's controlled delay: while requests have been
+leaving the queue within the class's target delay, a waiter may queue for
+up to the class's interval. Once the minimum wait over a whole interval
+exceeds the target (a standing queue, not a burst), waiters only get the
+target before they are shed. Shed requests get an immediate 503 with
+Retry-After instead of timing out.
+
+Health checks and long-lived streams bypass admission, as does /batch
+itself: each of its sub-requests is admitted in its own route class, with
+the priority of the batch's token, so a batch cannot carry more expensive
+calls past a class than separate requests could.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 2))
+
+# Lower values are admitted first
+ROLE_PRIORITY = {"admin": 0, "premium": 0, "user": 1}
+DEFAULT_PRIORITY = 1
+
+# (name, path prefixes, concurrency limit, queue size, target delay ms, interval ms);
+# the first class with a matching prefix wins, and the last one catches everything
+ROUTE_CLASSES = [
+    ("bypass", ("/health", "/market/stream", "/docs", "/openapi.json", "/batch"), None, 0, 0, 0),
+    ("expensive", (
+        "/ai/", "/budgets/analysis", "/transactions/analysis", "/market/portfolio",
+        "/market/trending", "/goals/projection", "/admin/"
+    ), int(os.getenv("ADMISSION_EXPENSIVE_LIMIT", 8)), int(os.getenv("ADMISSION_EXPENSIVE_QUEUE", 32)), 500, 5000),
+    ("default", ("/",), int(os.getenv("ADMISSION_DEFAULT_LIMIT", 128)), int(os.getenv("ADMISSION_DEFAULT_QUEUE", 512)), 50, 1000),
+]
+
+class RouteClass:
+    """Concurrency slots and a priority wait queue for one class of routes"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, target: float, interval: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.active = 0
+        self.waiting = 0
+        self.overloaded = False
+        self.admitted = 0
+        self.queued = 0
+        self.shed = {"queue_full": 0, "queue_delay": 0, "displaced": 0}
+        self._queue = []  # (priority, seq, future, enqueued_at)
+        self._seq = itertools.count()
+        self._window_start = time.monotonic()
+        self._window_min_delay = None
+
+    def _observe_delay(self, delay: float):
+        """CoDel bookkeeping: is the minimum queue delay over an interval above target?"""
+        now = time.monotonic()
+        if self._window_min_delay is None or delay < self._window_min_delay:
+            self._window_min_delay = delay
+        if now - self._window_start >= self.interval:
+            self.overloaded = self._window_min_delay > self.target
+            self._window_start = now
+            self._window_min_delay = None
+
+    async def acquire(self, priority: int) -> Optional[str]:
+        """Waits for a slot; returns None once admitted, or the reason the request was shed"""
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            self._observe_delay(0.0)
+            return None
+
+        if self.waiting >= self.max_queue:
+            # Make room by turning away the lowest-priority, newest waiter if it ranks below this one
+            worst = max((entry for entry in self._queue if not entry[2].done()), default=None)
+            if worst is None or worst[0] <= priority:
+                self.shed["queue_full"] += 1
+                return "queue_full"
+            worst[2].set_result("displaced")
+            self.shed["displaced"] += 1
+            self.waiting -= 1
+
+        if len(self._queue) > 2 * self.max_queue:
+            # Drop entries of waiters that already left
+            self._queue = [entry for entry in self._queue if not entry[2].done()]
+            heapq.heapify(self._queue)
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, time.monotonic()))
+        self.waiting += 1
+        self.queued += 1
+
+        timeout = self.target if self.overloaded else self.interval
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+                self.waiting -= 1
+            elif future.result() is None:
+                self.release()
+            raise
+
+        if future.done():
+            reason = future.result()
+            if reason is None:
+                self.admitted += 1
+            return reason
+        future.cancel()
+        self.waiting -= 1
+        self.shed["queue_delay"] += 1
+        return "queue_delay"
+
+    def release(self):
+        """Frees a slot, handing it straight to the best waiter if there is one"""
+        self.active -= 1
+        while self._queue:
+            _, _, future, enqueued_at = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.waiting -= 1
+            self.active += 1
+            self._observe_delay(time.monotonic() - enqueued_at)
+            future.set_result(None)
+            break
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "overloaded": self.overloaded,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": dict(self.shed)
+        }
+
+def request_priority(headers: List[Tuple[bytes, bytes]]) -> int:
+    """Priority from the role claim of a valid bearer token; regular priority otherwise"""
+    from utils import SECRET_KEY
+    import jwt
+
+    for name, value in headers:
+        if name == b"authorization":
+            value = value.decode("latin-1")
+            if not value.startswith("Bearer "):
+                break
+            try:
+                payload = jwt.decode(value[len("Bearer "):], SECRET_KEY, algorithms=["HS256"])
+            except jwt.InvalidTokenError:
+                break
+            return ROLE_PRIORITY.get(payload.get("role"), DEFAULT_PRIORITY)
+    return DEFAULT_PRIORITY
+
+class Admission:
+    """The route classes, their prefixes and the shared counters"""
+
+    def __init__(self, route_classes=ROUTE_CLASSES, retry_after: int = ADMISSION_RETRY_AFTER_SECONDS):
+        self.retry_after = retry_after
+        self.prefixes = []  # (prefix, RouteClass, or None to bypass)
+        self.classes = {}
+        for name, prefixes, limit, max_queue, target_ms, interval_ms in route_classes:
+            route_class = None
+            if limit is not None:
+                route_class = RouteClass(name, limit, max_queue, target_ms / 1000, interval_ms / 1000)
+                self.classes[name] = route_class
+            self.prefixes.extend((prefix, route_class) for prefix in prefixes)
+
+    def classify(self, path: str) -> Optional[RouteClass]:
+        for prefix, route_class in self.prefixes:
+            if path.startswith(prefix):
+                return route_class
+        return None
+
+    def stats(self) -> Dict:
+        return {name: route_class.stats() for name, route_class in self.classes.items()}
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits, queues or sheds each HTTP request"""
+
+    def __init__(self, app, admission: Admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.admission.classify(scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Only requests that have to wait pay for reading their priority
+        priority = DEFAULT_PRIORITY
+        if route_class.active >= route_class.limit or route_class.waiting:
+            priority = request_priority(scope.get("headers", []))
+        reason = await route_class.acquire(priority)
+        if reason is not None:
+            await self._reject(send, route_class, reason)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+    async def _reject(self, send, route_class: RouteClass, reason: str):
+        logging.debug(f"Shed {route_class.name} request: {reason}")
+        body = json.dumps({"detail": "Server is busy, please retry shortly", "reason": reason}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.admission.retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+admission = Admission()
@@ -0,0 +1,122 @@
+"""Benchmark: /dashboard/snapshot against the multi-endpoint dashboard path.
+
+Seeds a synthetic user into a scratch database, then times the requests the
+dashboard used to make (/transactions/, /transactions/analysis, /budgets/)
+against the single /dashboard/snapshot request, counting the Mongo commands
+each path issues. Requests run in-process through the ASGI app.
+
+Requires a MongoDB server (MONGO_URI). Usage, from the backend directory:
+    python benchmarks/dashboard_snapshot.py [--transactions 5000] [--runs 30]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_DB_NAME", "wonder_finance_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+# Time the queries themselves, not the ETag-keyed response cache in front of them
+os.environ.setdefault("ETAG_CACHE_SECONDS", "0")
+
+from pymongo import monitoring
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+import httpx
+import jwt
+import database
+from main import app
+
+BENCH_EMAIL = "bench-dashboard@example.com"
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Utilities", "Health", "Travel", "Entertainment"]
+
+async def seed(transaction_count: int):
+    users = database.get_collection("users")
+    transactions = database.get_collection("transactions")
+    await users.delete_many({"email": BENCH_EMAIL})
+    await transactions.delete_many({"user_email": BENCH_EMAIL})
+    
+    await users.insert_one({
+        "email": BENCH_EMAIL,
+        "budgets": [{"category": c, "amount": 10000.0, "period": "monthly"} for c in CATEGORIES]
+    })
+    now = datetime.now()
+    docs = [{
+        "user_email": BENCH_EMAIL,
+        "amount": round(random.uniform(10, 5000), 2),
+        "category": random.choice(CATEGORIES),
+        "description": "benchmark transaction",
+        "transaction_type": random.choice(["expense", "expense", "expense", "income"]),
+        "date": now - timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+        "tags": None
+    } for _ in range(transaction_count)]
+    for i in range(0, len(docs), 1000):
+        await transactions.insert_many(docs[i:i + 1000])
+    await database.ensure_indexes()
+
+async def time_path(client, paths, runs):
+    latencies = []
+    commands_before = counter.count
+    for _ in range(runs):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[client.get(path) for path in paths])
+        latencies.append((time.perf_counter() - started) * 1000)
+        for response in responses:
+            response.raise_for_status()
+    return statistics.median(latencies), max(latencies), (counter.count - commands_before) / runs
+
+async def run(args):
+    database.connect()
+    await seed(args.transactions)
+    token = jwt.encode({"email": BENCH_EMAIL}, os.environ["SECRET_KEY"], algorithm="HS256")
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        old_paths = ["/transactions/?limit=10", "/transactions/analysis?period=month", "/budgets/"]
+        new_paths = ["/dashboard/snapshot?period=month&recent=10"]
+        # Warm up both paths (connection pool, plan cache)
+        await time_path(client, old_paths, 3)
+        await time_path(client, new_paths, 3)
+        
+        old = await time_path(client, old_paths, args.runs)
+        new = await time_path(client, new_paths, args.runs)
+    
+    print(f"{args.transactions} transactions, {args.runs} runs")
+    print(f"{'path':<28}{'median ms':>12}{'max ms':>10}{'mongo cmds':>12}")
+    print(f"{'multi-endpoint (3 GETs)':<28}{old[0]:>12.2f}{old[1]:>10.2f}{old[2]:>12.1f}")
+    print(f"{'/dashboard/snapshot':<28}{new[0]:>12.2f}{new[1]:>10.2f}{new[2]:>12.1f}")
+    
+    if not args.keep:
+        await database.get_collection("users").delete_many({"email": BENCH_EMAIL})
+        await database.get_collection("transactions").delete_many({"user_email": BENCH_EMAIL})
+    database.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
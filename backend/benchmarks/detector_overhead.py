@@ -0,0 +1,101 @@
+"""Benchmark: per-insert cost of the streaming spending detector.
+
+Builds a synthetic history per user (several categories, a few monthly
+subscriptions, random merchants), then times the O(1) detector update for
+new inserts at several history sizes, next to what the same signal would
+cost if computed by rescanning the history with analyze_spending_trends.
+Pure CPU; no database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/detector_overhead.py [--history 100,1000,10000] [--inserts 20000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import bson
+from spending_detector import UserState, observe
+from utils import analyze_spending_trends
+
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Utilities", "Health", "Travel", "Entertainment"]
+# Merchant names without digits, since digits are stripped when keying merchants
+MERCHANTS = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(8)) for _ in range(300)]
+SUBSCRIPTIONS = [("Netflix", 15.49), ("Spotify Premium", 9.99), ("Gym membership", 40.0)]
+
+def make_history(count: int, start: datetime):
+    """Random expenses over a year plus monthly subscription charges"""
+    span = timedelta(days=365)
+    rows = [{
+        "amount": round(random.lognormvariate(3.5, 0.8), 2),
+        "category": random.choice(CATEGORIES),
+        "description": f"Card payment {random.choice(MERCHANTS)}",
+        "transaction_type": "expense",
+        "date": start + span * random.random()
+    } for _ in range(count)]
+    for name, amount in SUBSCRIPTIONS:
+        for month in range(12):
+            rows.append({
+                "amount": amount,
+                "category": "Entertainment",
+                "description": name,
+                "transaction_type": "expense",
+                "date": start + timedelta(days=30 * month, hours=random.random())
+            })
+    return sorted(rows, key=lambda r: r["date"])
+
+def time_per_call(fn, calls: int) -> float:
+    """Median microseconds per call over 5 rounds"""
+    rounds = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        rounds.append((time.perf_counter() - started) / calls * 1e6)
+    return statistics.median(rounds)
+
+def run(args):
+    start = datetime.now() - timedelta(days=366)
+    print(f"{'history':>9}{'detector us/insert':>20}{'rescan us/insert':>18}{'state bytes':>13}")
+    for size in [int(s) for s in args.history.split(",")]:
+        history = make_history(size, start)
+        state = UserState()
+        for row in history:
+            observe(state, row)
+        
+        now = datetime.now()
+        inserts = [{
+            "amount": round(random.lognormvariate(3.5, 0.8), 2),
+            "category": random.choice(CATEGORIES),
+            "description": f"Card payment {random.choice(MERCHANTS)}",
+            "transaction_type": "expense",
+            "date": now
+        } for _ in range(1000)]
+        position = [0]
+        
+        def detector_insert():
+            position[0] = (position[0] + 1) % len(inserts)
+            observe(state, inserts[position[0]])
+        
+        def rescan_insert():
+            analyze_spending_trends(history)
+        
+        detector_us = time_per_call(detector_insert, args.inserts)
+        rescan_us = time_per_call(rescan_insert, max(1, min(200, args.inserts // max(1, size // 50))))
+        state_bytes = len(bson.encode(state.to_dict()))
+        print(f"{len(history):>9}{detector_us:>20.2f}{rescan_us:>18.1f}{state_bytes:>13,}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="100,1000,10000", help="Comma-separated history sizes")
+    parser.add_argument("--inserts", type=int, default=20000)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark: vectorized currency conversion against per-row rate lookups.
+
+Builds a rate table of synthetic daily snapshots (a year of rates for ~160
+currencies, like the live feed), then converts result sets of several sizes
+with mixed currencies and dates to one base currency: once with
+fx.convert_rows (one array lookup) and once row by row with
+RateTable.rate, the way a per-transaction conversion would work. Pure CPU;
+no database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/fx_conversion.py [--rows 1000,10000,100000] [--currencies 160] [--days 365]
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import fx
+
+def make_snapshots(currency_count: int, days: int):
+    codes = ["INR", "EUR", "GBP", "JPY"]
+    while len(codes) < currency_count:
+        code = "".join(random.choice(string.ascii_uppercase) for _ in range(3))
+        if code not in codes and code != "USD":
+            codes.append(code)
+    base = {code: random.uniform(0.1, 200) for code in codes}
+    start = date.today() - timedelta(days=days)
+    return codes, [{
+        "date": (start + timedelta(days=d)).isoformat(),
+        "rates": {code: rate * random.uniform(0.98, 1.02) for code, rate in base.items()}
+    } for d in range(days) if random.random() > 0.1]  # Some days missing, as when a refresh fails
+
+def make_rows(count: int, codes, days: int):
+    now = datetime.now()
+    currencies = ["INR"] * 6 + ["USD"] * 3 + codes[1:20]
+    return [{
+        "amount": round(random.uniform(1, 5000), 2),
+        "currency": random.choice(currencies),
+        "date": now - timedelta(minutes=random.randint(0, days * 1440))
+    } for _ in range(count)]
+
+def timed(fn, rounds: int = 5) -> float:
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+def run(args):
+    codes, snapshots = make_snapshots(args.currencies, args.days)
+    started = time.perf_counter()
+    fx.table = fx.RateTable(snapshots)
+    print(f"rate table: {len(snapshots)} days x {len(fx.table.currencies)} currencies, "
+          f"built in {(time.perf_counter() - started) * 1000:.1f} ms")
+    
+    print(f"{'rows':>9}{'vectorized ms':>15}{'per-row ms':>12}{'speedup':>9}{'max abs diff':>14}")
+    for count in [int(r) for r in args.rows.split(",")]:
+        rows = make_rows(count, codes, args.days)
+        
+        def vectorized():
+            return fx.convert_rows([dict(row) for row in rows], "INR")
+        
+        def per_row():
+            converted = [dict(row) for row in rows]
+            for row in converted:
+                row["amount"] *= fx.table.rate(row["currency"], "INR", row["date"])
+                row["currency"] = "INR"
+            return converted
+        
+        # Both paths copy the rows and write the converted amounts back
+        vectorized_ms = timed(vectorized)
+        per_row_ms = timed(per_row)
+        difference = max(abs(a["amount"] - b["amount"]) for a, b in zip(vectorized(), per_row()))
+        print(f"{count:>9,}{vectorized_ms:>15.2f}{per_row_ms:>12.2f}{per_row_ms / vectorized_ms:>8.1f}x{difference:>14.2e}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000,100000", help="Comma-separated result set sizes")
+    parser.add_argument("--currencies", type=int, default=160)
+    parser.add_argument("--days", type=int, default=365)
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
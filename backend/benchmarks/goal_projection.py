@@ -0,0 +1,86 @@
+"""Benchmark: Monte Carlo goal projection latency.
+
+Times projections.simulate for a goal over the configured paths x months
+and fails (exit code 1) when the best run exceeds the latency budget. For
+scale, it also times a plain Python loop simulating the same model path by
+path on a small sample, extrapolated to the full path count. Pure CPU; no
+database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/goal_projection.py [--paths 50000] [--months 120] [--runs 7] [--budget-ms 200]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import projections
+
+GOAL = {
+    "start_balance": 50000.0,
+    "target": 1500000.0,
+    "contribution_mean": 8000.0,
+    "contribution_std": 2500.0,
+}
+
+def python_loop(paths: int, months: int, annual_return: float, annual_volatility: float):
+    """The same model, one path and one month at a time"""
+    drift = math.log1p(annual_return) / 12
+    volatility = annual_volatility / math.sqrt(12)
+    hits = 0
+    for _ in range(paths):
+        balance = GOAL["start_balance"]
+        for _ in range(months):
+            growth = math.exp(drift - volatility ** 2 / 2 + volatility * random.gauss(0, 1))
+            balance = balance * growth + random.gauss(GOAL["contribution_mean"], GOAL["contribution_std"])
+            if balance >= GOAL["target"]:
+                hits += 1
+                break
+    return hits / paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, default=50000)
+    parser.add_argument("--months", type=int, default=120)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--risk-tolerance", type=int, default=6)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("PROJECTION_BUDGET_MS", 200)))
+    parser.add_argument("--baseline-paths", type=int, default=500, help="Paths for the Python loop (0 to skip)")
+    args = parser.parse_args()
+
+    annual_return, annual_volatility = projections.portfolio_for_risk(args.risk_tolerance)
+    inputs = dict(GOAL, months=args.months, annual_return=annual_return,
+                  annual_volatility=annual_volatility, paths=args.paths)
+
+    timings = []
+    for run in range(args.runs + 1):
+        start = time.perf_counter()
+        result = projections.simulate(**inputs, seed=run)
+        elapsed = (time.perf_counter() - start) * 1000
+        if run:  # The first run pays for numpy's import and first allocations
+            timings.append(elapsed)
+
+    best = min(timings)
+    print(f"simulate {args.paths} paths x {args.months} months: "
+          f"best {best:.1f} ms, median {statistics.median(timings):.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"  probability {result['probability']:.3f}, final balance p50 {result['final_balance']['p50']:,.0f}")
+
+    if args.baseline_paths:
+        start = time.perf_counter()
+        probability = python_loop(args.baseline_paths, args.months, annual_return, annual_volatility)
+        loop_ms = (time.perf_counter() - start) * 1000 * args.paths / args.baseline_paths
+        print(f"python loop (extrapolated from {args.baseline_paths} paths): {loop_ms:.0f} ms, "
+              f"probability {probability:.3f}, {loop_ms / best:.0f}x slower")
+
+    if best > args.budget_ms:
+        print(f"\nFAIL: best run {best:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Import-time benchmark for the API entry point.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter and
+fails (exit code 1) when the cumulative import time of ``main`` exceeds the
+budget, or when a module that should load lazily was imported at startup.
+
+Usage (from the backend directory):
+    python benchmarks/import_time.py [--budget-ms 600] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that must only be imported on first use
+LAZY_MODULES = ["openai", "pandas", "requests", "jwt", "bcrypt", "motor", "pymongo", "uvicorn", "numpy"]
+
+def measure_once():
+    """Returns {module: (self_us, cumulative_us)} for one cold import of main"""
+    env = dict(os.environ)
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{result.stderr}")
+    
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", 600)))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    # The best run is the least noisy estimate of the real cost
+    best = min(runs, key=lambda timings: timings["main"][1])
+    total_ms = best["main"][1] / 1000
+
+    print(f"import main: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print(f"\nTop {args.top} modules by cumulative time:")
+    ranked = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in ranked[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"\nFAIL: imported eagerly at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+    
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
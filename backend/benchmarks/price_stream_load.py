@@ -0,0 +1,94 @@
+"""Load test for the live price stream fan-out.
+
+Runs thousands of in-process subscribers against a PriceHub backed by a
+fake upstream, then reports upstream calls per symbol, delivery latency
+and how many updates were conflated for deliberately slow consumers.
+
+Usage (from the backend directory):
+    python benchmarks/price_stream_load.py [--subscribers 5000] [--symbols 20] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_stream import PriceHub
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+async def run(args):
+    symbols = [f"stock:SYM{i}" for i in range(args.symbols)]
+    prices = {symbol: 100.0 for symbol in symbols}
+    upstream_calls = {symbol: 0 for symbol in symbols}
+
+    async def fake_fetch(symbol):
+        upstream_calls[symbol] += 1
+        prices[symbol] *= 1 + random.uniform(-0.01, 0.01)
+        return {"symbol": symbol, "price": round(prices[symbol], 4)}
+
+    hub = PriceHub(fake_fetch, args.interval)
+    latencies = []
+    delivered = 0
+    stop = asyncio.Event()
+
+    async def consume(subscriber, slow):
+        nonlocal delivered
+        while not stop.is_set():
+            batch = await subscriber.next_batch(0.5)
+            now = time.time()
+            for update in batch:
+                latencies.append(now - update["timestamp"])
+            delivered += len(batch)
+            if slow:
+                # Slow consumers fall several ticks behind and must be conflated
+                await asyncio.sleep(args.interval * 5)
+
+    subscribers = []
+    tasks = []
+    for i in range(args.subscribers):
+        subscriber = hub.subscribe(random.sample(symbols, min(args.per_subscriber, len(symbols))))
+        subscribers.append(subscriber)
+        tasks.append(asyncio.ensure_future(consume(subscriber, slow=i % 10 == 0)))
+
+    started = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    # A reconnecting client that saw everything up to the current sequence gets nothing
+    stats = hub.stats()
+    resumed = hub.subscribe(symbols, last_event_id=hub._seq)
+    resume_backlog = len(resumed.pending)
+    hub.unsubscribe(resumed)
+    for subscriber in subscribers:
+        hub.unsubscribe(subscriber)
+    await hub.close()
+
+    ticks = elapsed / args.interval
+    print(f"subscribers:            {args.subscribers} ({args.subscribers // 10} slow)")
+    print(f"symbols:                {args.symbols}, {args.per_subscriber} per subscriber")
+    print(f"upstream calls/symbol:  {statistics.mean(upstream_calls.values()):.1f} (~{ticks:.1f} poll ticks)")
+    print(f"updates delivered:      {delivered} ({delivered / elapsed:,.0f}/s)")
+    print(f"updates conflated:      {stats['dropped_updates']}")
+    print(f"delivery latency:       p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"resume backlog:         {resume_backlog} (expected 0)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--per-subscriber", type=int, default=3)
+    parser.add_argument("--interval", type=float, default=0.1, help="Upstream poll interval in seconds")
+    parser.add_argument("--seconds", type=float, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark: bytes read from MongoDB per endpoint, with and without projections.
+
+Seeds a synthetic user into a scratch database, calls each endpoint in-process
+through the ASGI app while recording the finds the repository issues, then
+replays every recorded find twice: once as issued (projected) and once with
+the projection removed, which is what the routers fetched before the
+repository layer existed. Document bytes are summed as BSON.
+
+Uses the MongoDB server at MONGO_URI, or with --mongomock an in-memory
+mongomock database (bytes depend only on the documents, not the server).
+Usage, from the backend directory:
+    python benchmarks/query_bytes.py [--transactions 5000] [--mongomock]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_DB_NAME", "wonder_finance_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+# Time the queries themselves, not the ETag-keyed response cache in front of them
+os.environ.setdefault("ETAG_CACHE_SECONDS", "0")
+
+import bson
+import httpx
+import jwt
+import database
+import repository
+from main import app
+
+class FindRecorder:
+    """Wraps the repository's find helpers and records every query they issue"""
+
+    def __init__(self):
+        self.finds = []  # (collection, filter, projection, limit, sort)
+
+    def install(self):
+        find, find_one = repository._find, repository._find_one
+
+        async def recorded_find(collection_name, query, projection, limit, sort=None, analytics=False):
+            self.finds.append((collection_name, query, projection, limit, sort))
+            return await find(collection_name, query, projection, limit, sort, analytics)
+
+        async def recorded_find_one(collection_name, query, projection):
+            self.finds.append((collection_name, query, projection, 1, None))
+            return await find_one(collection_name, query, projection)
+
+        repository._find, repository._find_one = recorded_find, recorded_find_one
+
+recorder = FindRecorder()
+
+BENCH_EMAIL = "bench-bytes@example.com"
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Utilities", "Health", "Travel", "Entertainment"]
+ENDPOINTS = [
+    "/transactions/?limit=50",
+    "/transactions/analysis?period=year",
+    "/budgets/",
+    "/budgets/analysis",
+    "/users/profile",
+    "/market/recommendations",
+    "/ai/budget-insights",
+]
+
+async def seed(transaction_count: int):
+    users = database.get_collection("users")
+    transactions = database.get_collection("transactions")
+    await users.delete_many({"email": BENCH_EMAIL})
+    await transactions.delete_many({"user_email": BENCH_EMAIL})
+    
+    await users.insert_one({
+        "email": BENCH_EMAIL,
+        "password": b"x" * 60,
+        "risk_tolerance": 6,
+        "budgets": [{"category": c, "amount": 10000.0, "period": "monthly"} for c in CATEGORIES]
+    })
+    now = datetime.now()
+    docs = [{
+        "user_email": BENCH_EMAIL,
+        "amount": round(random.uniform(10, 5000), 2),
+        "category": random.choice(CATEGORIES),
+        "description": "Card payment at merchant " + str(random.randint(1, 500)) + " reference " + "x" * 40,
+        "transaction_type": random.choice(["expense", "expense", "expense", "income"]),
+        "date": now - timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+        "tags": ["imported", "bank-sync", random.choice(CATEGORIES).lower()]
+    } for _ in range(transaction_count)]
+    for i in range(0, len(docs), 1000):
+        await transactions.insert_many(docs[i:i + 1000])
+    await database.ensure_indexes()
+
+async def replay_bytes(find, with_projection):
+    """BSON bytes of every document a recorded find returns"""
+    collection_name, query, projection, limit, sort = find
+    cursor = database.get_collection(collection_name).find(query, projection if with_projection else None)
+    if sort:
+        cursor = cursor.sort(*sort)
+    documents = await cursor.limit(limit).to_list(length=limit)
+    return sum(len(bson.encode(document)) for document in documents)
+
+async def run(args):
+    if args.mongomock:
+        import motor.motor_asyncio
+        import mongomock_motor
+
+        os.environ.setdefault("MONGO_URI", "mongodb://mongomock")
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    database.connect()
+    await seed(args.transactions)
+    recorder.install()
+    token = jwt.encode({"email": BENCH_EMAIL}, os.environ["SECRET_KEY"], algorithm="HS256")
+    
+    print(f"{args.transactions} transactions")
+    print(f"{'endpoint':<38}{'finds':>6}{'full docs':>14}{'projected':>14}{'saved':>8}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        for endpoint in ENDPOINTS:
+            recorder.finds = []
+            await client.get(endpoint)
+            # Data-version reads are bookkeeping, not part of the endpoint's payload
+            finds = [find for find in recorder.finds if find[0] != "data_versions"]
+            full = sum([await replay_bytes(find, with_projection=False) for find in finds])
+            projected = sum([await replay_bytes(find, with_projection=True) for find in finds])
+            saved = (1 - projected / full) * 100 if full else 0
+            print(f"{endpoint:<38}{len(finds):>6}{full:>14,}{projected:>14,}{saved:>7.1f}%")
+    
+    if not args.keep:
+        await database.get_collection("users").delete_many({"email": BENCH_EMAIL})
+        await database.get_collection("transactions").delete_many({"user_email": BENCH_EMAIL})
+    database.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data")
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock database")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark: upstream quote calls and cache hit rates with 1 vs N workers.
+
+Starts a fake Alpha Vantage upstream that counts requests, then runs the
+same quote traffic (a fixed total request rate over a skewed set of
+symbols) through 1 and through N worker processes, once with per-process
+caches and once with the shared memory-mapped segment. Each worker takes
+an equal share of the traffic, as behind a load balancer.
+
+With per-process caches upstream calls grow with the worker count; with the
+shared segment they must stay close to the single-worker count (exit code 1
+otherwise). No database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/shared_cache_workers.py [--workers 8] [--rate 400] [--seconds 5] [--symbols 100] [--ttl 1]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    """Alpha Vantage GLOBAL_QUOTE answering in a few milliseconds"""
+
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with FakeUpstream.lock:
+            FakeUpstream.requests += 1
+        time.sleep(0.005)
+        price = round(random.uniform(90, 110), 2)
+        payload = json.dumps({"Global Quote": {
+            "05. price": str(price), "09. change": "0.5", "10. change percent": "0.5%",
+            "03. high": str(price + 1), "04. low": str(price - 1), "06. volume": "1000"
+        }}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def worker(env: dict, rate: float, seconds: float, symbols: int, seed: int, results):
+    """One worker process: paced quote requests for skewed symbols; reports how many it fetched"""
+    os.environ.update(env)
+    if not env.get("SHARED_CACHE_PATH"):
+        os.environ.pop("SHARED_CACHE_PATH", None)
+    import quotes
+    import shared_cache
+
+    rng = random.Random(seed)
+    # A few symbols are far more popular than the rest, as with real portfolios
+    weights = [1 / (rank + 1) for rank in range(symbols)]
+    names = [f"SYM{i}" for i in range(symbols)]
+
+    async def run():
+        requests, started = [], time.perf_counter()
+        for i in range(int(rate * seconds)):
+            await asyncio.sleep(max(started + i / rate - time.perf_counter(), 0))
+            symbol = rng.choices(names, weights)[0]
+            requests.append(asyncio.ensure_future(quotes.get_stock_quote(symbol)))
+        await asyncio.gather(*requests)
+        return len(requests)
+
+    count = asyncio.run(run())
+    stats = shared_cache.stats()
+    results.put({"requests": count, "fetches": stats["fetches"]})
+
+def scenario(args, upstream_url: str, backend: str, workers: int):
+    env = {
+        "ALPHA_VANTAGE_URL": upstream_url,
+        "QUOTE_CACHE_SECONDS": str(args.ttl),
+        "QUOTE_HEDGING": "false",
+        "SHARED_CACHE_PATH": ""
+    }
+    path = None
+    if backend == "shared":
+        import shared_cache
+
+        path = os.path.join(tempfile.gettempdir(), f"wonder-finance-bench-{os.getpid()}.cache")
+        shared_cache.create_segment(path, shared_cache.parse_classes(shared_cache.SHARED_CACHE_CLASSES),
+                                    shared_cache.SHARED_CACHE_WAYS)
+        env["SHARED_CACHE_PATH"] = path
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    before = FakeUpstream.requests
+    processes = [
+        context.Process(target=worker, args=(env, args.rate / workers, args.seconds, args.symbols, seed, results))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if path:
+        os.unlink(path)
+
+    requests = sum(report["requests"] for report in reports)
+    # Requests a worker answered without fetching: its own hits, joined fetches and other workers' fills
+    hit_rate = 1 - sum(report["fetches"] for report in reports) / requests
+    upstream = FakeUpstream.requests - before
+    print(f"  {backend:<6} cache, {workers} worker{'s' if workers > 1 else ' '}: {requests} requests, "
+          f"{upstream:5d} upstream calls ({upstream / requests:.1%}), hit rate {hit_rate:.1%}")
+    return upstream, hit_rate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=400, help="Total quote requests per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--ttl", type=float, default=1, help="QUOTE_CACHE_SECONDS")
+    parser.add_argument("--max-growth", type=float, default=1.25,
+                        help="Allowed upstream calls with N shared workers, relative to 1 worker")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    upstream_url = f"http://{host}:{port}/query"
+
+    print(f"{args.rate:.0f} quote requests/s for {args.seconds:.0f} s over {args.symbols} symbols, "
+          f"quotes cached {args.ttl:g} s")
+    results = {}
+    for backend in ("local", "shared"):
+        for workers in (1, args.workers):
+            results[(backend, workers)] = scenario(args, upstream_url, backend, workers)
+    server.shutdown()
+
+    single = results[("shared", 1)][0]
+    shared = results[("shared", args.workers)][0]
+    local = results[("local", args.workers)][0]
+    print(f"\nwith {args.workers} workers the shared cache makes {local / shared:.1f}x fewer upstream calls "
+          f"than per-process caches")
+    if shared > single * args.max_growth:
+        print(f"\nFAIL: {shared} upstream calls with {args.workers} shared workers vs {single} with one "
+              f"(allowed {args.max_growth:g}x)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
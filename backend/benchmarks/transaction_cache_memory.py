@@ -0,0 +1,95 @@
+"""Benchmark: memory and analysis time of cached transactions, columns vs dicts.
+
+Decodes synthetic transactions from BSON, as a Motor query returns them,
+and measures with tracemalloc what they hold as a list of dicts and as the
+transaction cache's TransactionColumns. Then times the spending analysis
+over both forms. Fails (exit code 1) when the columns take more than the
+byte budget per transaction. No database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/transaction_cache_memory.py [--rows 10000] [--categories 25] [--budget-bytes 64]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+from transaction_cache import TransactionColumns
+from utils import analyze_spending_trends
+
+def bson_rows(count: int, categories: int):
+    """Rows with the cache's projection, decoded from BSON like query results"""
+    import bson
+    from bson.objectid import ObjectId
+
+    now = datetime.utcnow().replace(microsecond=0)
+    names = [f"Category {i}" for i in range(categories)]
+    documents = [{
+        "_id": ObjectId(),
+        "amount": round(random.uniform(1, 5000), 2),
+        "currency": "INR",
+        "category": random.choice(names),
+        "transaction_type": random.choice(("expense", "expense", "expense", "income")),
+        "date": now - timedelta(minutes=random.randint(0, 365 * 24 * 60))
+    } for _ in range(count)]
+    return b"".join(bson.encode(document) for document in documents)
+
+def measure(build):
+    """(result, bytes still allocated by build)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, allocated
+
+def best_ms(function, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-bytes", type=float, default=64, help="Maximum column bytes per transaction")
+    args = parser.parse_args()
+
+    import bson
+    import numpy  # noqa: F401 - imported up front so its allocations are not measured
+
+    encoded = bson_rows(args.rows, args.categories)
+    rows, dict_bytes = measure(lambda: bson.decode_all(encoded))
+    columns, column_bytes = measure(lambda: TransactionColumns.from_rows(rows))
+    per_10k = 10000 / args.rows
+
+    print(f"{args.rows} transactions ({args.categories} categories):")
+    print(f"  dicts    {dict_bytes * per_10k / 1024:9.1f} KiB per 10k  ({dict_bytes / args.rows:6.1f} bytes/row)")
+    print(f"  columns  {column_bytes * per_10k / 1024:9.1f} KiB per 10k  ({column_bytes / args.rows:6.1f} bytes/row, "
+          f"arrays {columns.nbytes / args.rows:.1f})  {dict_bytes / column_bytes:.0f}x smaller")
+
+    start = datetime.utcnow() - timedelta(days=365)
+    dict_ms = best_ms(lambda: analyze_spending_trends(rows), args.runs)
+    window_ms = best_ms(lambda: analyze_spending_trends(columns.window(start, None, "INR")), args.runs)
+    print(f"spending analysis: dicts {dict_ms:.2f} ms, columns {window_ms:.2f} ms "
+          f"(window selection included), {dict_ms / window_ms:.0f}x faster")
+
+    if column_bytes / args.rows > args.budget_bytes:
+        print(f"\nFAIL: columns take {column_bytes / args.rows:.1f} bytes per transaction, "
+              f"budget {args.budget_bytes:.0f}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark: transaction insert throughput with and without group commit.
+
+Runs a fixed number of inserts at several concurrency levels, once through
+insert_one per transaction and once through the group-commit buffer, and
+reports inserts/sec with p50/p99 per-insert latency (time until the insert is
+acknowledged to its caller).
+
+Uses the MongoDB server at MONGO_URI. With --simulate it instead writes to
+an in-process stand-in where every round trip takes --rtt-ms plus
+--per-document-ms per document, over at most --pool connections; that
+isolates what batching saves in round trips, not server-side costs.
+Usage, from the backend directory:
+    python benchmarks/transaction_ingest.py [--inserts 5000] [--concurrency 1,10,50,200]
+        [--max-batch 200] [--max-delay-ms 5] [--simulate [--rtt-ms 1] [--per-document-ms 0.02] [--pool 100]]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_DB_NAME", "wonder_finance_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import database
+from repository import insert_transactions_batch
+from write_buffer import GroupCommitBuffer
+
+BENCH_EMAIL = "bench-ingest@example.com"
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Utilities", "Health", "Travel", "Entertainment"]
+
+def make_transaction():
+    return {
+        "user_email": BENCH_EMAIL,
+        "amount": round(random.uniform(10, 5000), 2),
+        "category": random.choice(CATEGORIES),
+        "description": "benchmark transaction",
+        "transaction_type": "expense",
+        "date": datetime.now(),
+        "tags": None
+    }
+
+async def insert_one(transaction):
+    result = await database.get_collection("transactions").insert_one(transaction)
+    return result.inserted_id
+
+class SimulatedServer:
+    """Stands in for MongoDB: each round trip holds a pooled connection for its latency"""
+
+    def __init__(self, rtt: float, per_document: float, pool: int):
+        self.rtt = rtt
+        self.per_document = per_document
+        self.connections = asyncio.Semaphore(pool)
+
+    async def round_trip(self, documents: int):
+        async with self.connections:
+            await asyncio.sleep(self.rtt + self.per_document * documents)
+
+    async def insert_one(self, transaction):
+        await self.round_trip(1)
+
+    async def insert_batch(self, transactions):
+        await self.round_trip(len(transactions))
+        return [None] * len(transactions)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run_level(insert, inserts, concurrency):
+    """Runs `inserts` inserts from `concurrency` concurrent writers"""
+    latencies = []
+    remaining = [inserts]
+    
+    async def writer():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            await insert(make_transaction())
+            latencies.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return inserts / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+async def run(args):
+    if args.simulate:
+        server = SimulatedServer(args.rtt_ms / 1000, args.per_document_ms / 1000, args.pool)
+        buffer = GroupCommitBuffer(server.insert_batch, args.max_batch, args.max_delay_ms / 1000)
+        modes = [("insert_one", server.insert_one), ("group commit", buffer.insert)]
+        print(f"simulated server: {args.rtt_ms}ms per round trip + {args.per_document_ms}ms per document, "
+              f"{args.pool} connections")
+    else:
+        database.connect()
+        transactions = database.get_collection("transactions")
+        await transactions.delete_many({"user_email": BENCH_EMAIL})
+        await database.ensure_indexes()
+        buffer = GroupCommitBuffer(insert_transactions_batch, args.max_batch, args.max_delay_ms / 1000)
+        modes = [("insert_one", insert_one), ("group commit", buffer.insert)]
+    
+    print(f"{args.inserts} inserts per run, group commit max_batch={args.max_batch} max_delay={args.max_delay_ms}ms")
+    print(f"{'mode':<14}{'writers':>8}{'inserts/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        for name, insert in modes:
+            # Warm up the connection pool for this concurrency level
+            await run_level(insert, concurrency, concurrency)
+            rate, p50, p99 = await run_level(insert, args.inserts, concurrency)
+            print(f"{name:<14}{concurrency:>8}{rate:>12,.0f}{p50:>10.2f}{p99:>10.2f}")
+    
+    await buffer.drain()
+    if buffer.batches:
+        print(f"group commit: {buffer.documents} documents in {buffer.batches} batches "
+              f"(avg {buffer.documents / buffer.batches:.1f} per batch)")
+    
+    if not args.simulate:
+        if not args.keep:
+            await transactions.delete_many({"user_email": BENCH_EMAIL})
+        database.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inserts", type=int, default=5000)
+    parser.add_argument("--concurrency", default="1,10,50,200", help="Comma-separated writer counts")
+    parser.add_argument("--max-batch", type=int, default=200)
+    parser.add_argument("--max-delay-ms", type=float, default=5)
+    parser.add_argument("--keep", action="store_true", help="Keep the inserted data")
+    parser.add_argument("--simulate", action="store_true", help="Write to a simulated server instead of MongoDB")
+    parser.add_argument("--rtt-ms", type=float, default=1, help="Simulated round-trip time")
+    parser.add_argument("--per-document-ms", type=float, default=0.02, help="Simulated server time per document")
+    parser.add_argument("--pool", type=int, default=100, help="Simulated connection pool size (maxPoolSize)")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Benchmark: transaction search latency at scale.
+
+Seeds a scratch database with synthetic transactions (1M by default) spread
+over a number of users, with descriptions drawn from a merchant vocabulary
+and a few tags each, then times repository.search_transactions for several
+query shapes: text only, text + year, text + category + amount range,
+relevance vs date order, and a page reached through the cursor. A
+case-insensitive $regex scan over description is timed alongside as the
+baseline the text index replaces.
+
+Requires a MongoDB server (MONGO_URI). Seeding 1M documents takes a few
+minutes; pass --skip-seed to reuse data kept from a previous run with --keep.
+Usage, from the backend directory:
+    python benchmarks/transaction_search.py [--transactions 1000000] [--users 100] [--runs 50]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_DB_NAME", "wonder_finance_bench")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import database
+from repository import search_transactions, MAX_TIME_MS
+
+BENCH_PREFIX = "bench-search-"
+CATEGORIES = ["Food", "Rent", "Transport", "Shopping", "Utilities", "Health", "Travel", "Entertainment"]
+MERCHANTS = {
+    "Transport": ["Uber trip", "Lyft ride", "Metro card top-up", "Shell fuel station", "City parking"],
+    "Food": ["Whole Foods Market", "Starbucks coffee", "Uber Eats order", "Domino's pizza", "Local bakery"],
+    "Shopping": ["Amazon marketplace", "Target store", "IKEA furniture", "Apple store", "Nike online"],
+    "Entertainment": ["Netflix subscription", "Spotify premium", "Cinema tickets", "Steam games", "Concert tickets"],
+    "Utilities": ["Electricity bill", "Water utility", "Comcast internet", "Mobile phone plan", "Gas utility"],
+    "Health": ["Pharmacy purchase", "Dental clinic", "Gym membership", "Optician", "Physiotherapy session"],
+    "Travel": ["Delta airlines", "Marriott hotel", "Airbnb booking", "Hertz car rental", "Uber airport trip"],
+    "Rent": ["Monthly rent payment", "Building maintenance fee"],
+}
+TAGS = ["work", "personal", "reimbursable", "family", "recurring", "cash", "card", "travel", "gift", "business"]
+QUERIES = [
+    ("text", {"text": "uber"}),
+    ("text + year", {"text": "uber", "start": datetime(2025, 1, 1), "end": datetime(2025, 12, 31, 23, 59, 59)}),
+    ("text + category + amount", {"text": "uber", "category": "Transport", "min_amount": 20, "max_amount": 80}),
+    ("tag", {"text": "reimbursable"}),
+    ("two words", {"text": "netflix spotify"}),
+]
+
+def make_transaction(email: str, start: datetime, days: int):
+    category = random.choice(CATEGORIES)
+    return {
+        "user_email": email,
+        "amount": round(random.lognormvariate(3.5, 0.9), 2),
+        "category": category,
+        "description": f"{random.choice(MERCHANTS[category])} #{random.randint(1000, 9999)}",
+        "transaction_type": "expense",
+        "date": start + timedelta(seconds=random.randint(0, days * 86400)),
+        "tags": random.sample(TAGS, random.randint(0, 3)) or None
+    }
+
+async def seed(transaction_count: int, users: int):
+    transactions = database.get_collection("transactions")
+    await transactions.delete_many({"user_email": {"$regex": f"^{BENCH_PREFIX}"}})
+    start = datetime(2024, 1, 1)
+    emails = [f"{BENCH_PREFIX}{i}@example.com" for i in range(users)]
+    batch = []
+    for _ in range(transaction_count):
+        batch.append(make_transaction(random.choice(emails), start, 730))
+        if len(batch) == 10000:
+            await transactions.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await transactions.insert_many(batch, ordered=False)
+    started = time.perf_counter()
+    await database.ensure_indexes()
+    print(f"seeded {transaction_count:,} transactions for {users} users; indexes built in {time.perf_counter() - started:.1f}s")
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.95)], ordered[-1]
+
+async def time_search(emails, runs, pages, **kwargs):
+    """Latency of fetching `pages` pages (the last page is the one timed)"""
+    latencies = []
+    for i in range(runs):
+        email = emails[i % len(emails)]
+        after = None
+        for _ in range(pages):
+            started = time.perf_counter()
+            results = await search_transactions(email, limit=20, after=after, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+            if len(results) < 20:
+                break
+            last = results[-1]
+            after = (last["score"] if kwargs.get("order") == "relevance" else last["date"], last["_id"])
+        latencies.append(elapsed)
+    return summarize(latencies)
+
+async def time_regex(emails, runs, text):
+    transactions = database.get_collection("transactions")
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        cursor = transactions.find(
+            {"user_email": emails[i % len(emails)], "description": {"$regex": re.escape(text), "$options": "i"}},
+            {"user_email": 0}, max_time_ms=MAX_TIME_MS
+        ).sort("date", -1).limit(20)
+        await cursor.to_list(length=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return summarize(latencies)
+
+async def run(args):
+    database.connect()
+    if not args.skip_seed:
+        await seed(args.transactions, args.users)
+    emails = [f"{BENCH_PREFIX}{i}@example.com" for i in range(args.users)]
+    
+    print(f"{'query':<28}{'order':<11}{'page':>5}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for name, kwargs in QUERIES:
+        for order in ("relevance", "date"):
+            await time_search(emails, 3, 1, order=order, **kwargs)  # Warm up
+            p50, p95, worst = await time_search(emails, args.runs, 1, order=order, **kwargs)
+            print(f"{name:<28}{order:<11}{1:>5}{p50:>9.2f}{p95:>9.2f}{worst:>9.2f}")
+    for order in ("relevance", "date"):
+        p50, p95, worst = await time_search(emails, args.runs, 3, order=order, text="uber")
+        print(f"{'text (via cursor)':<28}{order:<11}{3:>5}{p50:>9.2f}{p95:>9.2f}{worst:>9.2f}")
+    p50, p95, worst = await time_regex(emails, args.runs, "uber")
+    print(f"{'$regex scan (baseline)':<28}{'date':<11}{1:>5}{p50:>9.2f}{p95:>9.2f}{worst:>9.2f}")
+    
+    if not args.keep:
+        await database.get_collection("transactions").delete_many({"user_email": {"$regex": f"^{BENCH_PREFIX}"}})
+    database.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse previously seeded data")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded data")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Fault-injection run for the quote providers' breakers and hedging.
+
+Starts a local fake upstream that speaks the Alpha Vantage and CoinGecko
+quote APIs, points quotes.py at it, and injects faults:
+
+  tail      a small fraction of responses is slow; compares quote latency
+            percentiles with and without hedged requests
+  outage    every response is a 500; the breaker must open, later calls
+            must fail fast with the last known quote marked stale, and the
+            breaker must close again through half-open probes once the
+            upstream recovers
+  brownout  every response is slower than the slow-call threshold; the
+            breaker must open on slow calls alone
+
+Exits with code 1 if any expectation fails. No database is needed.
+
+Usage, from the backend directory:
+    python benchmarks/upstream_faults.py [--calls 2000] [--concurrency 8] [--tail-rate 0.02] [--tail-ms 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+SYMBOLS = [f"SYM{i}" for i in range(20)]
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    """Alpha Vantage GLOBAL_QUOTE and CoinGecko simple/price with injected faults"""
+
+    faults = {"base_ms": 10, "tail_rate": 0.0, "tail_ms": 0, "error_rate": 0.0}
+    requests = 0
+
+    def do_GET(self):
+        FakeUpstream.requests += 1
+        faults = self.faults
+        delay = faults["base_ms"] * random.uniform(0.5, 1.5)
+        if random.random() < faults["tail_rate"]:
+            delay = faults["tail_ms"]
+        time.sleep(delay / 1000)
+        if random.random() < faults["error_rate"]:
+            self.send_error(500)
+            return
+
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        price = round(random.uniform(90, 110), 2)
+        if url.path.endswith("/simple/price"):
+            body = {params["ids"]: {"usd": price, "inr": price * 83, "usd_24h_change": 0.5}}
+        else:
+            body = {"Global Quote": {
+                "05. price": str(price), "09. change": "0.5", "10. change percent": "0.5%",
+                "03. high": str(price + 1), "04. low": str(price - 1), "06. volume": "1000"
+            }}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def start_fake_upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+async def timed_calls(quotes, count: int, concurrency: int):
+    """Runs count stock quote calls; returns (latencies in ms, errors, stale responses)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors, stale = [], 0, 0
+
+    async def one(i):
+        nonlocal errors, stale
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                quote = await quotes.get_stock_quote(SYMBOLS[i % len(SYMBOLS)])
+                stale += bool(quote.get("stale"))
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[one(i) for i in range(count)])
+    return latencies, errors, stale
+
+def reset(quotes):
+    quotes.alpha_vantage = quotes._provider("Alpha Vantage")
+    FakeUpstream.requests = 0
+
+async def tail_scenario(quotes, args, check):
+    print(f"\n== tail: {args.tail_rate:.0%} of responses take {args.tail_ms} ms")
+    FakeUpstream.faults.update(base_ms=10, tail_rate=args.tail_rate, tail_ms=args.tail_ms, error_rate=0.0)
+    results = {}
+    for hedging in (False, True):
+        reset(quotes)
+        quotes.QUOTE_HEDGING = hedging
+        await timed_calls(quotes, 50, args.concurrency)  # Latency history for the hedge delay
+        latencies, errors, _ = await timed_calls(quotes, args.calls, args.concurrency)
+        stats = quotes.alpha_vantage.stats()
+        results[hedging] = percentile(latencies, 99)
+        print(f"  hedging {'on ' if hedging else 'off'}: p50 {percentile(latencies, 50):6.1f} ms  "
+              f"p95 {percentile(latencies, 95):6.1f} ms  p99 {percentile(latencies, 99):6.1f} ms  "
+              f"errors {errors}  upstream requests/call {FakeUpstream.requests / (args.calls + 50):.3f}  "
+              f"hedges {stats['hedges']}  win rate {stats['hedge_win_rate']}")
+    quotes.QUOTE_HEDGING = True
+    check("hedged p99 is lower than unhedged p99", results[True] < results[False])
+
+async def outage_scenario(quotes, args, check):
+    print("\n== outage: every response is a 500, then the upstream recovers")
+    FakeUpstream.faults.update(base_ms=10, tail_rate=0.0, error_rate=0.0)
+    reset(quotes)
+    await timed_calls(quotes, len(SYMBOLS), 1)  # Last known quotes for every symbol
+
+    FakeUpstream.faults["error_rate"] = 1.0
+    latencies, errors, stale = await timed_calls(quotes, 200, 1)
+    breaker = quotes.alpha_vantage.breaker
+    stats = quotes.alpha_vantage.stats()
+    print(f"  breaker {breaker.state} after {stats['failures']} failures; {stats['rejected']} calls rejected, "
+          f"{stale} served stale, {errors} errors, upstream requests {FakeUpstream.requests - len(SYMBOLS)}")
+    print(f"  rejected call latency p50 {percentile(latencies[-100:], 50):.3f} ms")
+    check("breaker opens during the outage", breaker.state == breaker.OPEN)
+    check("callers get stale quotes instead of errors", errors == 0 and stale == 200)
+    check("rejected calls fail fast (< 1 ms)", percentile(latencies[-100:], 50) < 1)
+
+    FakeUpstream.faults["error_rate"] = 0.0
+    await asyncio.sleep(breaker.open_seconds + 0.1)
+    states = []
+    for symbol in SYMBOLS[:breaker.half_open_successes + 1]:
+        await quotes.get_stock_quote(symbol)
+        states.append(breaker.state)
+    print(f"  after recovery: {' -> '.join(states)}")
+    check("breaker closes again through half-open probes", breaker.state == breaker.CLOSED)
+
+async def brownout_scenario(quotes, args, check):
+    slow_ms = int(quotes.BREAKER_SLOW_CALL_SECONDS * 1000 * 1.2)
+    print(f"\n== brownout: every response takes {slow_ms} ms (slow-call threshold "
+          f"{quotes.BREAKER_SLOW_CALL_SECONDS * 1000:.0f} ms)")
+    reset(quotes)
+    FakeUpstream.faults.update(base_ms=10, tail_rate=1.0, tail_ms=slow_ms, error_rate=0.0)
+    started = time.perf_counter()
+    await timed_calls(quotes, quotes.BREAKER_MIN_CALLS * 3, quotes.BREAKER_MIN_CALLS)
+    breaker = quotes.alpha_vantage.breaker
+    print(f"  breaker {breaker.state} after {time.perf_counter() - started:.1f} s, "
+          f"upstream requests {FakeUpstream.requests} for {quotes.BREAKER_MIN_CALLS * 3} calls")
+    check("breaker opens on slow calls", breaker.state == breaker.OPEN)
+
+async def run(args):
+    server = start_fake_upstream()
+    host, port = server.server_address
+    os.environ["ALPHA_VANTAGE_URL"] = f"http://{host}:{port}/query"
+    os.environ["COINGECKO_URL"] = f"http://{host}:{port}"
+    os.environ.setdefault("BREAKER_OPEN_SECONDS", "1")
+    os.environ.setdefault("BREAKER_SLOW_CALL_SECONDS", "0.3")
+    os.environ.setdefault("QUOTE_TIMEOUT_SECONDS", "2")
+    # Every call must reach the provider, not the fresh-quote cache in front of it
+    os.environ.setdefault("QUOTE_CACHE_SECONDS", "0")
+    import quotes
+
+    failures = []
+
+    def check(label, ok):
+        print(f"  {'PASS' if ok else 'FAIL'}: {label}")
+        if not ok:
+            failures.append(label)
+
+    await tail_scenario(quotes, args, check)
+    await outage_scenario(quotes, args, check)
+    await brownout_scenario(quotes, args, check)
+    server.shutdown()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tail-rate", type=float, default=0.02)
+    parser.add_argument("--tail-ms", type=int, default=500)
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args))
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
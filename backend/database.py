@@ -1,17 +1,108 @@
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise ValueError("MONGO_URI is not set in the environment variables.")
-
-try:
-    client = AsyncIOMotorClient(MONGO_URI)
-    database = client["wonder_finance"]
-    users_collection = database["users"]
-    transactions_collection = database["transactions"]
-except Exception as e:
-    raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}")
\ No newline at end of file
+DATABASE_NAME = os.getenv("MONGO_DB_NAME", "wonder_finance")
+
+# Connection pool and transport tuning; unset variables keep the driver defaults
+CLIENT_OPTIONS_FROM_ENV = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),  # e.g. "zstd,snappy,zlib"
+}
+
+# Read preference for analytics queries, e.g. "secondaryPreferred" to keep them off the primary
+ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "primary")
+READ_PREFERENCE_NAMES = {
+    "primary": "PRIMARY",
+    "primaryPreferred": "PRIMARY_PREFERRED",
+    "secondary": "SECONDARY",
+    "secondaryPreferred": "SECONDARY_PREFERRED",
+    "nearest": "NEAREST",
+}
+if ANALYTICS_READ_PREFERENCE not in READ_PREFERENCE_NAMES:
+    raise ValueError(f"Unknown MONGO_ANALYTICS_READ_PREFERENCE '{ANALYTICS_READ_PREFERENCE}'")
+
+client = None
+database = None
+_collections = {}
+
+def get_client_options():
+    """Client keyword arguments built from the MONGO_* environment variables"""
+    options = {}
+    for option, (env_var, cast) in CLIENT_OPTIONS_FROM_ENV.items():
+        value = os.getenv(env_var)
+        if value:
+            options[option] = cast(value)
+    return options
+
+def connect():
+    """Creates the MongoDB client and returns the database handle.
+
+    Called from the application lifespan; direct callers (scripts, first use
+    outside the app) get the client created on demand instead.
+    """
+    global client, database
+    if database is not None:
+        return database
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        raise ValueError("MONGO_URI is not set in the environment variables.")
+
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(MONGO_URI, **get_client_options())
+        database = client[DATABASE_NAME]
+    except Exception as e:
+        raise ConnectionError(f"Failed to connect to MongoDB: {str(e)}")
+    return database
+
+async def ensure_indexes():
+    """Creates the indexes the routers' query shapes rely on"""
+    await get_collection("transactions").create_index([("user_email", 1), ("date", -1)])
+    # Search is always per user, so user_email prefixes the text index
+    await get_collection("transactions").create_index(
+        [("user_email", 1), ("description", "text"), ("tags", "text")],
+        weights={"description": 1, "tags": 2},
+        name="transaction_search"
+    )
+    await get_collection("users").create_index("email")
+    await get_collection("budgets").create_index([("user_email", 1), ("category", 1), ("period", 1)], unique=True)
+    await get_collection("budget_history").create_index([("user_email", 1), ("category", 1), ("changed_at", -1)])
+    await get_collection("alerts").create_index([("user_email", 1), ("created_at", -1)])
+    await get_collection("goals").create_index([("user_email", 1), ("priority", 1)])
+    await get_collection("jobs").create_index([("status", 1), ("_id", 1)])
+    # $merge targets need a unique index on their "on" fields
+    await get_collection("report_partials").create_index([("job_id", 1), ("chunk", 1), ("key", 1)], unique=True)
+    await get_collection("reports").create_index([("job_id", 1), ("key", 1)], unique=True)
+
+def close():
+    """Closes the MongoDB client, if one was created"""
+    global client, database
+    if client is not None:
+        client.close()
+    client = None
+    database = None
+    _collections.clear()
+
+def get_collection(name: str, analytics: bool = False):
+    """Returns a collection from the active client, connecting on first use.
+
+    Analytics collections read with ANALYTICS_READ_PREFERENCE so heavy scans
+    can be routed to secondaries.
+    """
+    key = (name, analytics)
+    if key not in _collections:
+        collection = connect()[name]
+        if analytics and ANALYTICS_READ_PREFERENCE != "primary":
+            from pymongo import ReadPreference
+            read_preference = getattr(ReadPreference, READ_PREFERENCE_NAMES[ANALYTICS_READ_PREFERENCE])
+            collection = collection.with_options(read_preference=read_preference)
+        _collections[key] = collection
+    return _collections[key]
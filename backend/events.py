@@ -0,0 +1,29 @@
+import logging
+from typing import Callable, List
+
+# Topics published when a user's data changes
+TRANSACTIONS = "transactions"
+BUDGETS = "budgets"
+PROFILE = "profile"
+GOALS = "goals"
+CHANGE_TOPICS = (TRANSACTIONS, BUDGETS, PROFILE, GOALS)
+
+_subscribers: List[Callable[[str, str], None]] = []
+
+def subscribe(handler: Callable[[str, str], None]):
+    """Registers handler(user_email, topic) for every change event in this process"""
+    _subscribers.append(handler)
+
+def unsubscribe(handler: Callable[[str, str], None]):
+    if handler in _subscribers:
+        _subscribers.remove(handler)
+
+def publish(user_email: str, topic: str):
+    """Delivers a change event synchronously, so handlers run before the write returns"""
+    if topic not in CHANGE_TOPICS:
+        raise ValueError(f"Unknown change topic '{topic}'")
+    for handler in list(_subscribers):
+        try:
+            handler(user_email, topic)
+        except Exception as e:
+            logging.error(f"Change event handler failed for {topic}: {e}")
@@ -0,0 +1,260 @@
+"""Foreign exchange rates and currency conversion.
+
+Daily rate snapshots (units of each currency per USD) are stored in the
+fx_rates collection, one document per day, and refreshed by a background
+job. In memory they form a RateTable: a day x currency matrix, forward-filled
+so every day after the first snapshot has a rate for every currency seen.
+A conversion on a given date uses that day's row (or the latest row before
+it; dates before the first snapshot use the first one).
+
+convert_rows converts a whole result set to the user's base currency with
+one vectorized lookup; rows already in the target currency cost nothing, so
+single-currency users never touch numpy. Until rates for the target are
+loaded (first boot without network and no stored snapshot) amounts are left
+in their own currencies; responses report that with rates_available.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from repository import load_fx_rates, save_fx_rates, get_base_currency
+
+# Currency for transactions stored before currencies existed, and for users without a base currency
+DEFAULT_CURRENCY = os.getenv("DEFAULT_CURRENCY", "INR")
+FX_RATES_URL = os.getenv("FX_RATES_URL", "https://open.er-api.com/v6/latest/USD")
+FX_REFRESH_SECONDS = int(os.getenv("FX_REFRESH_SECONDS", 6 * 3600))
+PIVOT_CURRENCY = "USD"
+# Active ISO 4217 currency codes, for validating input before any rates are loaded
+ISO_CURRENCIES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN BWP BYN BZD
+    CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD
+    GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD KZT
+    LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR
+    NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SLL SOS SRD
+    SSP STN SVC SYP SZL THB TJS TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VES VND VUV WST XAF XCD
+    XCG XOF XPF YER ZAR ZMW ZWG ZWL
+""".split())
+
+class RateTable:
+    """Day x currency matrix of per-USD rates built from daily snapshots"""
+
+    def __init__(self, snapshots: List[Dict]):
+        snapshots = sorted(snapshots, key=lambda s: s["date"])
+        self.version = self._version(snapshots[-1]) if snapshots else None
+        self.days = [date.fromisoformat(s["date"]).toordinal() for s in snapshots]
+        self.currencies = sorted({PIVOT_CURRENCY}.union(*[s["rates"] for s in snapshots]))
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.matrix = self._build_matrix(snapshots) if snapshots else None
+        self.day_array = self._day_array() if snapshots else None
+
+    @staticmethod
+    def _version(snapshot: Dict) -> str:
+        # The newest day's rates can be replaced by a later fetch on the same day
+        digest = hashlib.sha1(repr(sorted(snapshot["rates"].items())).encode()).hexdigest()[:8]
+        return f"{snapshot['date']}-{digest}"
+
+    def _build_matrix(self, snapshots):
+        import numpy as np
+
+        matrix = np.full((len(snapshots), len(self.currencies)), np.nan)
+        for row, snapshot in enumerate(snapshots):
+            for currency, rate in snapshot["rates"].items():
+                if rate:
+                    matrix[row, self.index[currency]] = rate
+        matrix[:, self.index[PIVOT_CURRENCY]] = 1.0
+
+        # Forward-fill gaps from earlier days, then back-fill currencies first seen later
+        rows = np.arange(len(snapshots))[:, None]
+        filled = np.where(np.isnan(matrix), 0, rows)
+        matrix = matrix[np.maximum.accumulate(filled, axis=0), np.arange(len(self.currencies))]
+        reverse = matrix[::-1]
+        filled = np.where(np.isnan(reverse), 0, rows)
+        return reverse[np.maximum.accumulate(filled, axis=0), np.arange(len(self.currencies))][::-1]
+
+    def _day_array(self):
+        import numpy as np
+        return np.asarray(self.days, dtype=np.int64)
+
+    def _column(self, currency: str) -> int:
+        column = self.index.get(currency)
+        if column is None or self.matrix is None:
+            raise HTTPException(status_code=503, detail=f"No exchange rate available for {currency}")
+        return column
+
+    def rate(self, source: str, target: str, on: date) -> float:
+        """Units of target per unit of source on a day"""
+        if source == target:
+            return 1.0
+        source_column, target_column = self._column(source), self._column(target)
+        row = max(bisect_right(self.days, on.toordinal()) - 1, 0)
+        return float(self.matrix[row, target_column] / self.matrix[row, source_column])
+
+    def convert(self, amounts, currencies, dates, target: str):
+        """Converts parallel sequences of amounts, currency codes and dates into target.
+
+        Returns a numpy array. The rate lookup is done as array operations:
+        one searchsorted for the day rows and one gather for the rates.
+        Amounts in a currency without rates are bad data: they are logged and
+        left out (converted to 0) rather than failing the whole conversion.
+        """
+        import numpy as np
+
+        target_column = self._column(target)
+        index = self.index
+        count = len(amounts)
+        amounts = np.fromiter(amounts, dtype=float, count=count)
+        columns = np.fromiter((index.get(code, -1) for code in currencies), dtype=np.int64, count=count)
+        if count and columns.min() < 0:
+            _log_unknown({code for code in currencies if code not in index})
+        # date.toordinal is far cheaper than numpy's datetime64 parsing of Python datetimes
+        days = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=count)
+        return self._convert(amounts, columns, days, target_column)
+
+    def convert_coded(self, amounts, codes, currencies: List[str], days, target: str):
+        """Like convert, for numpy columns: currency codes into currencies, and day ordinals"""
+        import numpy as np
+
+        target_column = self._column(target)
+        lookup = np.fromiter((self.index.get(code, -1) for code in currencies), dtype=np.int64, count=len(currencies))
+        columns = lookup[codes]
+        if len(columns) and columns.min() < 0:
+            _log_unknown({currencies[code] for code in np.unique(codes[columns < 0]).tolist()})
+        return self._convert(amounts, columns, days, target_column)
+
+    def _convert(self, amounts, columns, days, target_column):
+        import numpy as np
+
+        rows = np.clip(np.searchsorted(self.day_array, days, side="right") - 1, 0, None)
+        unknown = columns < 0
+        converted = amounts * self.matrix[rows, target_column] / self.matrix[rows, np.where(unknown, 0, columns)]
+        converted[unknown] = 0.0
+        return converted
+
+def _log_unknown(currencies):
+    logging.error(f"No exchange rate for stored currency {', '.join(sorted(map(str, currencies)))}; "
+                  f"those amounts are left out of converted totals")
+
+table = RateTable([])
+_refresh_task = None
+
+def rates_version() -> Optional[str]:
+    """Identifies the newest snapshot; part of the validator of converted responses"""
+    return table.version
+
+def rates_available(target: str) -> bool:
+    """Whether amounts can be converted into target; when not, conversions leave them unconverted"""
+    return table.matrix is not None and target in table.index
+
+def convert_rows(rows: List[Dict], target: str, field: str = "amount") -> List[Dict]:
+    """Converts each row's amount field into target in place.
+
+    Rows carry currency (missing means DEFAULT_CURRENCY) and date (missing
+    means today).
+    """
+    if all((row.get("currency") or DEFAULT_CURRENCY) == target for row in rows) or not rates_available(target):
+        return rows
+    today = date.today()
+    converted = table.convert(
+        [row.get(field, 0) for row in rows],
+        [row.get("currency") or DEFAULT_CURRENCY for row in rows],
+        [row.get("date") or today for row in rows],
+        target
+    )
+    for row, amount in zip(rows, converted.tolist()):
+        row[field] = amount
+        row["currency"] = target
+    return rows
+
+def convert_columns(amounts, codes, currencies: List[str], days, target: str):
+    """Converts a numpy amount column into target.
+
+    codes index into currencies and days are day ordinals; like convert_rows,
+    a column already all in target is returned as is.
+    """
+    import numpy as np
+
+    if all(currencies[code] == target for code in np.unique(codes).tolist()) or not rates_available(target):
+        return amounts
+    return table.convert_coded(amounts, codes, currencies, days, target)
+
+def convert_amount(amount: float, source: str, target: str, on: Optional[date] = None) -> float:
+    """Scalar conversion for single values (quotes, a single transaction)"""
+    if source == target:
+        return amount
+    return amount * table.rate(source, target, on or date.today())
+
+def is_supported(currency: str) -> bool:
+    """Whether a currency code can be converted (any ISO 4217 code until rates are loaded)"""
+    if table.matrix is None:
+        return currency in ISO_CURRENCIES
+    return currency in table.index
+
+async def get_user_currency(user_email: str) -> str:
+    """The user's base currency, cached until their profile changes"""
+    from user_cache import user_cache
+    import events
+
+    currency = await user_cache.get_or_compute(
+        user_email, "base_currency", None, (events.PROFILE,),
+        lambda: get_base_currency(user_email)
+    )
+    return currency or DEFAULT_CURRENCY
+
+def _fetch_rates_sync() -> Optional[Dict]:
+    import requests
+
+    response = requests.get(FX_RATES_URL, timeout=10).json()
+    if response.get("result") != "success" or response.get("base_code") != PIVOT_CURRENCY:
+        logging.error(f"Unexpected FX rates response: {response.get('error-type') or response.get('result')}")
+        return None
+    updated = datetime.utcfromtimestamp(response["time_last_update_unix"]).date()
+    return {"date": updated.isoformat(), "rates": response["rates"]}
+
+async def load():
+    """Rebuilds the in-memory table from the stored snapshots"""
+    global table
+    snapshots = await load_fx_rates()
+    if snapshots:
+        table = RateTable(snapshots)
+
+async def refresh():
+    """Fetches today's rates, stores them and rebuilds the table"""
+    loop = asyncio.get_event_loop()
+    snapshot = await loop.run_in_executor(None, _fetch_rates_sync)
+    if snapshot is None:
+        return
+    await save_fx_rates(snapshot["date"], snapshot["rates"])
+    await load()
+
+async def _refresh_loop():
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            logging.error(f"FX rate refresh failed: {e}")
+        await asyncio.sleep(FX_REFRESH_SECONDS)
+
+async def start():
+    """Loads stored rates and starts the refresh loop"""
+    global _refresh_task
+    try:
+        await load()
+    except Exception as e:
+        logging.error(f"Error loading FX rates: {e}")
+    if _refresh_task is None:
+        _refresh_task = asyncio.ensure_future(_refresh_loop())
+
+async def stop():
+    """Cancels the background refresh loop"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
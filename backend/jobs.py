@@ -0,0 +1,161 @@
+"""Admin report jobs.
+
+Cross-user reports are too heavy to compute inside a request, so POST
+/admin/jobs only queues a job and a runner in each API worker works through
+the queue in the background. A job walks the users collection in _id order,
+one chunk of users per aggregation (see aggregate_report_chunk), and saves
+its position after every chunk. The runner holds a lease on the job that it
+renews at each checkpoint: if the worker dies, another worker claims the job
+once the lease lapses and resumes from the last checkpoint, and chunks that
+ran twice overwrite their own partial rows.
+
+The runner only works for JOB_DUTY_CYCLE of the time, sleeping in
+proportion to how long each chunk took, so reports never crowd out
+interactive queries on the same database.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict
+from fastapi import HTTPException
+from repository import (
+    REPORT_DIMENSIONS,
+    aggregate_report_chunk,
+    checkpoint_job,
+    claim_job,
+    count_users,
+    delete_report_partials,
+    finalize_report,
+    finish_job,
+    get_job,
+    get_user_emails,
+)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 10))
+JOB_CHUNK_USERS = int(os.getenv("JOB_CHUNK_USERS", 200))
+# Fraction of wall time a runner spends aggregating
+JOB_DUTY_CYCLE = min(max(float(os.getenv("JOB_DUTY_CYCLE", 0.5)), 0.05), 1.0)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+REPORT_TYPES = set(REPORT_DIMENSIONS)
+
+_runner_task = None
+
+def _parse_date(value, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} '{value}', expected YYYY-MM-DD")
+
+def parse_params(report_type: str, params: Dict) -> Dict:
+    """Validates a report's parameters into the form its aggregation takes"""
+    if report_type not in REPORT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown report type '{report_type}'")
+
+    if report_type == "cohort_spending":
+        parsed = {}
+        if params.get("start"):
+            parsed["start"] = _parse_date(params["start"], "start")
+        if params.get("end"):
+            parsed["end"] = _parse_date(params["end"], "end")
+        return parsed
+
+    if report_type == "budget_adherence":
+        month = str(params.get("month") or datetime.utcnow().strftime("%Y-%m"))
+        try:
+            start = datetime.strptime(month, "%Y-%m")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid month '{month}', expected YYYY-MM")
+        next_month = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return {"start": start, "end": next_month - timedelta(microseconds=1)}
+
+    try:
+        days = int(params.get("days", 30))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="days must be an integer")
+    if not 1 <= days <= 3650:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 3650")
+    return {"since": datetime.utcnow() - timedelta(days=days)}
+
+async def run_job(job: Dict) -> bool:
+    """Runs a claimed job to completion from its checkpoint; False if it was cancelled or lost"""
+    job_id, report_type, params = job["_id"], job["type"], job["params"]
+    checkpoint = job.get("checkpoint") or {"last_user_id": None, "chunks": 0, "users": 0}
+    if checkpoint["chunks"]:
+        logging.info(f"Resuming job {job_id} after {checkpoint['users']} users")
+    total = await count_users()
+
+    while True:
+        users = await get_user_emails(checkpoint["last_user_id"], JOB_CHUNK_USERS)
+        if not users:
+            break
+        started = asyncio.get_event_loop().time()
+        await aggregate_report_chunk(
+            report_type, job_id, checkpoint["chunks"], checkpoint["last_user_id"], users[-1]["_id"], params
+        )
+        checkpoint = {
+            "last_user_id": users[-1]["_id"],
+            "chunks": checkpoint["chunks"] + 1,
+            "users": checkpoint["users"] + len(users)
+        }
+        progress = {"processed_users": checkpoint["users"], "total_users": max(total, checkpoint["users"])}
+        if not await checkpoint_job(job_id, WORKER_ID, JOB_LEASE_SECONDS, {"checkpoint": checkpoint, **progress}):
+            logging.info(f"Job {job_id} was cancelled or taken over, stopping")
+            return False
+        elapsed = asyncio.get_event_loop().time() - started
+        await asyncio.sleep(elapsed * (1 - JOB_DUTY_CYCLE) / JOB_DUTY_CYCLE)
+
+    rows = await finalize_report(report_type, job_id)
+    return await finish_job(job_id, WORKER_ID, "done", {"rows": rows, "processed_users": checkpoint["users"]})
+
+async def run_next() -> bool:
+    """Claims and runs one job; False when the queue is empty"""
+    job = await claim_job(WORKER_ID, JOB_LEASE_SECONDS)
+    if job is None:
+        return False
+    try:
+        finished = await run_job(job)
+    except asyncio.CancelledError:
+        # Shutting down; the lease lapses and another worker resumes the job
+        raise
+    except Exception as e:
+        logging.error(f"Job {job['_id']} ({job['type']}) failed: {e}")
+        if await finish_job(job["_id"], WORKER_ID, "failed", {"error": str(e)}):
+            await delete_report_partials(job["_id"])
+        return True
+    if finished:
+        logging.info(f"Job {job['_id']} ({job['type']}) finished")
+    elif (await get_job(str(job["_id"])) or {}).get("status") == "cancelled":
+        # A job taken over by another worker keeps its partials
+        await delete_report_partials(job["_id"])
+    return True
+
+async def _runner_loop():
+    while True:
+        try:
+            if await run_next():
+                continue
+        except Exception as e:
+            logging.error(f"Job runner error: {e}")
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+async def start():
+    """Starts the background job runner"""
+    global _runner_task
+    if JOBS_ENABLED and _runner_task is None:
+        _runner_task = asyncio.ensure_future(_runner_loop())
+
+async def stop():
+    """Cancels the job runner; a job in progress is resumed by the next worker to claim it"""
+    global _runner_task
+    if _runner_task is not None:
+        _runner_task.cancel()
+        try:
+            await _runner_task
+        except asyncio.CancelledError:
+            pass
+        _runner_task = None
@@ -1,23 +1,97 @@
+from contextlib import asynccontextmanager
+from importlib import import_module
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from routes.users import router as user_router
-from routes.transactions import router as transaction_router
-from routes.ai import router as ai_router
-from routes.market import router as market_router
-from routes.news import router as news_router
-from routes.budget import router as budget_router  # Import the new budget router
-import uvicorn
+import database
+from admission import ADMISSION_CONTROL, AdmissionMiddleware, admission
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Router modules are imported only when enabled, so a disabled feature
+# costs nothing at startup. Keys are the names accepted by ENABLED_ROUTERS.
+ROUTERS = {
+    "users": ("routes.users", "/users", ["Users"]),
+    "transactions": ("routes.transactions", "/transactions", ["Transactions"]),
+    "ai": ("routes.ai", "/ai", ["AI Insights"]),
+    "market": ("routes.market", "/market", ["Market Data"]),
+    "news": ("routes.news", "/news", ["Financial News"]),
+    "budgets": ("routes.budget", "/budgets", ["Budget Management"]),
+    "dashboard": ("routes.dashboard", "/dashboard", ["Dashboard"]),
+    "batch": ("routes.batch", "/batch", ["Batch"]),
+    "alerts": ("routes.alerts", "/alerts", ["Alerts"]),
+    "goals": ("routes.goals", "/goals", ["Financial Goals"]),
+    "admin": ("routes.admin", "/admin", ["Admin"]),
+}
+
+def get_enabled_routers():
+    """Router names from ENABLED_ROUTERS (comma-separated), defaulting to all"""
+    configured = os.getenv("ENABLED_ROUTERS")
+    if not configured:
+        return list(ROUTERS)
+    
+    enabled = []
+    for name in configured.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in ROUTERS:
+            logging.warning(f"Unknown router '{name}' in ENABLED_ROUTERS, ignoring")
+            continue
+        enabled.append(name)
+    return enabled
+
+enabled_routers = get_enabled_routers()
+
+# Routers that convert amounts between currencies and need the FX rate table
+FX_ROUTERS = {"transactions", "budgets", "ai", "market", "dashboard", "goals"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Creates database clients and background jobs when the worker starts, and stops them on shutdown"""
+    database.connect()
+    await database.ensure_indexes()
+    if "news" in enabled_routers:
+        import news_cache
+        await news_cache.start()
+    if FX_ROUTERS.intersection(enabled_routers):
+        import fx
+        await fx.start()
+    if "transactions" in enabled_routers:
+        import spending_detector
+        await spending_detector.start()
+    if "admin" in enabled_routers:
+        import jobs
+        await jobs.start()
+    yield
+    if "admin" in enabled_routers:
+        await jobs.stop()
+    if FX_ROUTERS.intersection(enabled_routers):
+        await fx.stop()
+    if "transactions" in enabled_routers:
+        await spending_detector.stop()
+    if "news" in enabled_routers:
+        await news_cache.stop()
+    if "market" in enabled_routers:
+        from routes.market import price_hub
+        await price_hub.close()
+    from repository import flush_write_buffers
+    await flush_write_buffers()
+    database.close()
+
 app = FastAPI(
     title="Wonder Finance API",
     description="Advanced financial management API with AI-powered insights",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
+# Admission control runs inside CORS, so shed responses still carry CORS headers
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware, admission=admission)
+
 # Configure CORS
 origins = [
     "http://localhost",
@@ -32,15 +106,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Include Routes
-app.include_router(user_router, prefix="/users", tags=["Users"])
-app.include_router(transaction_router, prefix="/transactions", tags=["Transactions"])
-app.include_router(ai_router, prefix="/ai", tags=["AI Insights"])
-app.include_router(market_router, prefix="/market", tags=["Market Data"])
-app.include_router(news_router, prefix="/news", tags=["Financial News"])
-app.include_router(budget_router, prefix="/budgets", tags=["Budget Management"])  # Add the budget router
+for name in enabled_routers:
+    module_name, prefix, tags = ROUTERS[name]
+    app.include_router(import_module(module_name).router, prefix=prefix, tags=tags)
 
 @app.get("/")
 def home():
@@ -54,6 +126,39 @@ def home():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/admission")
+def admission_stats():
+    """Slots, queue lengths and shed counts per route class"""
+    return admission.stats()
+
+@app.get("/health/cache")
+def cache_stats():
+    """Backend and counters of the host-wide cache, as seen by this worker"""
+    import shared_cache
+    return shared_cache.stats()
+
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Wonder Finance API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 1)),
+                        help="Worker processes; more than one shares a cache segment between them")
+    args = parser.parse_args()
+
+    import uvicorn
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        import shared_cache
+
+        # Workers import the app themselves and map the segment created here
+        path = os.environ.setdefault("SHARED_CACHE_PATH", shared_cache.default_path(args.port))
+        shared_cache.create_segment(
+            path, shared_cache.parse_classes(shared_cache.SHARED_CACHE_CLASSES), shared_cache.SHARED_CACHE_WAYS
+        )
+        try:
+            uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+        finally:
+            os.unlink(path)
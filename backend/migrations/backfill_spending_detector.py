@@ -0,0 +1,102 @@
+"""Rebuilds the spending detector's running statistics from transaction history.
+
+Replays each user's transactions oldest first through the same O(1) update
+the API applies on insert and saves the result to detector_state, replacing
+what was there. Alerts raised during the replay are discarded unless
+--with-alerts is given, so existing history does not flood the notification
+center; recurring charges found are still marked as reported.
+
+It can run next to the API. Saving a rebuilt state bumps its base; a
+worker holding observations made on the older base finds its next save
+conflicting, sees the new base, and takes the rebuilt state instead of
+merging its observations into it (they came from the same history, so
+merging would count them twice). A transaction written while its user is
+being replayed can miss both the replay and the worker's statistics; it is
+counted by the next backfill.
+
+Usage, from the backend directory:
+    python -m migrations.backfill_spending_detector [--user EMAIL] [--batch-size 200] [--with-alerts]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+import database
+from repository import get_detector_rows, get_user_emails, insert_alerts, save_detector_state
+from spending_detector import UserState, observe
+import fx
+from fx import get_user_currency, convert_rows
+
+logging.basicConfig(level=logging.INFO)
+
+PAGE_SIZE = 1000
+
+async def run(user: str, batch_size: int, with_alerts: bool):
+    database.connect()
+    try:
+        await database.ensure_indexes()
+        await fx.load()
+        if user:
+            await backfill_user(user, with_alerts)
+        else:
+            await backfill_all(batch_size, with_alerts)
+    finally:
+        database.close()
+
+async def backfill_user(email: str, with_alerts: bool) -> int:
+    """Replays one user's history into a fresh state; returns the transactions read"""
+    currency = await get_user_currency(email)
+    state = UserState()
+    alerts = []
+    count = 0
+    after = None
+    while True:
+        rows = await get_detector_rows(email, after, PAGE_SIZE)
+        if not rows:
+            break
+        after = (rows[-1]["date"], rows[-1]["_id"])
+        convert_rows(rows, currency)
+        for row in rows:
+            raised = observe(state, row)
+            if with_alerts:
+                for alert in raised:
+                    alert.update({
+                        "user_email": email,
+                        "transaction_id": str(row["_id"]),
+                        "created_at": datetime.utcnow(),
+                        "read": False
+                    })
+                    alerts.append(alert)
+        count += len(rows)
+    
+    await save_detector_state(email, state.to_dict(), rebuilt=True)
+    if alerts:
+        await insert_alerts(alerts)
+    return count
+
+async def backfill_all(batch_size: int, with_alerts: bool):
+    users = transactions = 0
+    last_user_id = None
+    while True:
+        batch = await get_user_emails(last_user_id, batch_size)
+        if not batch:
+            break
+        for user in batch:
+            if user.get("email"):
+                transactions += await backfill_user(user["email"], with_alerts)
+                users += 1
+        last_user_id = batch[-1]["_id"]
+        logging.info(f"Backfilled {users} users, {transactions} transactions")
+    logging.info(f"Spending detector backfill complete: {users} users, {transactions} transactions")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", help="Backfill a single user")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--with-alerts", action="store_true", help="Store the alerts raised during the replay")
+    args = parser.parse_args()
+    asyncio.run(run(args.user, args.batch_size, args.with_alerts))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Moves budgets embedded in user documents into the budgets collection.
+
+Runs against a live deployment: users are processed in _id order in small
+batches, with a checkpoint saved after each batch so an interrupted run
+resumes where it stopped. The API migrates any user it touches on its own
+while this runs, and every copy is idempotent, so both can proceed at once.
+When no user with embedded budgets remains the migration is marked done and
+the API stops checking user documents for embedded budgets.
+
+Usage, from the backend directory:
+    python -m migrations.migrate_embedded_budgets [--batch-size 200] [--pause 0.5] [--restart]
+"""
+import argparse
+import asyncio
+import logging
+
+import database
+from repository import (
+    BUDGET_MIGRATION_ID,
+    get_migration_state,
+    get_users_with_embedded_budgets,
+    migrate_user_budgets,
+    save_migration_state,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+async def run(batch_size: int, pause: float, restart: bool):
+    database.connect()
+    try:
+        await database.ensure_indexes()
+        await migrate(batch_size, pause, restart)
+    finally:
+        database.close()
+
+async def migrate(batch_size: int, pause: float, restart: bool):
+    state = None if restart else await get_migration_state(BUDGET_MIGRATION_ID)
+    state = state or {"last_user_id": None, "users": 0, "budgets": 0, "done": False}
+    if state.get("done"):
+        logging.info("Embedded budget migration already complete")
+        return
+    if state["last_user_id"] is not None:
+        logging.info(f"Resuming after user {state['last_user_id']} ({state['users']} users migrated so far)")
+    
+    while True:
+        users = await get_users_with_embedded_budgets(state["last_user_id"], batch_size)
+        if not users:
+            break
+        for user in users:
+            state["budgets"] += await migrate_user_budgets(user)
+            state["users"] += 1
+        state["last_user_id"] = users[-1]["_id"]
+        await save_migration_state(BUDGET_MIGRATION_ID, state)
+        logging.info(f"Migrated {state['users']} users, {state['budgets']} budgets")
+        # Leave room for interactive traffic between batches
+        await asyncio.sleep(pause)
+    
+    # Users whose array changed mid-copy still embed budgets; start over for them
+    if await get_users_with_embedded_budgets(None, 1):
+        state["last_user_id"] = None
+        await save_migration_state(BUDGET_MIGRATION_ID, state)
+        logging.info("Some users changed during the run; run the migration again to finish them")
+        return
+    
+    state["done"] = True
+    await save_migration_state(BUDGET_MIGRATION_ID, state)
+    logging.info(f"Embedded budget migration complete: {state['users']} users, {state['budgets']} budgets")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.5, help="Seconds to sleep between batches")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.pause, args.restart))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -27,6 +27,7 @@ class UserProfile(BaseModel):
     risk_tolerance: Optional[int] = Field(None, ge=1, le=10, description="Risk tolerance on a scale of 1-10")
     investment_goals: Optional[List[str]] = None
     preferred_categories: Optional[List[str]] = None
+    base_currency: Optional[str] = Field(None, description="ISO 4217 code that totals and budgets are reported in")
 
 class Transaction(BaseModel):
     user_email: EmailStr
@@ -36,6 +37,7 @@ class Transaction(BaseModel):
     transaction_type: TransactionType
     date: datetime = Field(default_factory=datetime.utcnow)
     tags: Optional[List[str]] = None
+    currency: Optional[str] = Field(None, description="ISO 4217 code; defaults to the user's base currency")
 
 class Budget(BaseModel):
     user_email: EmailStr
@@ -60,4 +62,16 @@ class InvestmentAsset(BaseModel):
     asset_type: str  # stock, crypto, etf, etc.
     quantity: float = Field(gt=0)
     purchase_price: float = Field(gt=0)
-    purchase_date: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    purchase_date: datetime = Field(default_factory=datetime.utcnow)
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str = Field(description="Path of an existing GET route, e.g. /transactions/")
+    params: Dict[str, Union[str, int, float, bool, List[str]]] = Field(default_factory=dict)
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+class AdminJobRequest(BaseModel):
+    type: str = Field(description="Report type, e.g. cohort_spending, budget_adherence, role_usage")
+    params: Dict[str, Union[str, int, float]] = Field(default_factory=dict)
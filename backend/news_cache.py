@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from repository import load_news_snapshot, save_news_snapshot
+from shared_cache import get_or_fetch
+
+NEWS_API_URL = "https://newsapi.org/v2/top-headlines"
+NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+
+# Categories refreshed in the background; "business" is NewsAPI's own category,
+# the others are keyword queries within it
+NEWS_CATEGORIES = [c.strip() for c in os.getenv("NEWS_CATEGORIES", "business,finance,economy,markets").split(",") if c.strip()]
+NEWS_REFRESH_SECONDS = int(os.getenv("NEWS_REFRESH_SECONDS", 900))
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", 500))
+NEWS_PERSIST = os.getenv("NEWS_PERSIST", "false").lower() == "true"
+NEWS_PAGE_SIZE = 100  # NewsAPI maximum per request
+
+# Keyword views for categories that are not refreshed are memoized up to this many
+MAX_KEYWORD_VIEWS = 64
+
+if not NEWS_API_KEY:
+    logging.warning("NEWS_API_KEY is not configured. News features may not work properly.")
+
+def format_article(article: Dict) -> Dict:
+    """Converts a NewsAPI article into the payload served by /news/latest"""
+    return {
+        "title": article.get("title"),
+        "description": article.get("description"),
+        "source": (article.get("source") or {}).get("name"),
+        "url": article.get("url"),
+        "image_url": article.get("urlToImage"),
+        "published_at": article.get("publishedAt")
+    }
+
+def _hash(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    normalized = " ".join(text.lower().split()).rstrip("/")
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+class NewsStore:
+    """Bounded, deduplicated store of preformatted articles.
+
+    Articles are keyed by URL hash and also indexed by title hash, so the same
+    story syndicated under different URLs or returned for several categories
+    is stored once. Sorted per-category views are rebuilt after each refresh,
+    which keeps serving to a list slice.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.refreshed_at = None
+        self._entries = OrderedDict()  # key -> {"article": ..., "categories": set}
+        self._titles = {}  # title hash -> key
+        self._views = {}  # category (None for all) -> articles, newest first
+        self._keyword_views = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, category: str, articles: List[Dict]) -> int:
+        """Adds formatted articles for a category, returning how many were new"""
+        added = 0
+        for article in articles:
+            url_key = _hash(article.get("url"))
+            title_key = _hash(article.get("title"))
+            if not url_key and not title_key:
+                continue
+            
+            key = url_key if url_key in self._entries else self._titles.get(title_key)
+            if key is None:
+                key = url_key or title_key
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"article": article, "categories": set()}
+                self._entries[key] = entry
+                if title_key:
+                    self._titles[title_key] = key
+                added += 1
+            entry["categories"].add(category)
+            # Recently seen articles are the last to be evicted
+            self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_items:
+            key, evicted = self._entries.popitem(last=False)
+            title_key = _hash(evicted["article"].get("title"))
+            if self._titles.get(title_key) == key:
+                del self._titles[title_key]
+        return added
+
+    def rebuild_views(self):
+        """Recomputes the sorted per-category views after a refresh"""
+        ordered = sorted(self._entries.values(), key=lambda e: e["article"].get("published_at") or "", reverse=True)
+        views = {None: [e["article"] for e in ordered]}
+        for entry in ordered:
+            for category in entry["categories"]:
+                views.setdefault(category, []).append(entry["article"])
+        self._views = views
+        self._keyword_views = {}
+        self.refreshed_at = datetime.utcnow()
+
+    def latest(self, category: Optional[str] = None, count: int = 5) -> List[Dict]:
+        """Returns up to count newest articles for a category (all if None)"""
+        if category is not None:
+            category = category.strip().lower()
+        view = self._views.get(category)
+        if view is None:
+            view = self._keyword_view(category)
+        return view[:count]
+
+    def _keyword_view(self, keyword: str) -> List[Dict]:
+        view = self._keyword_views.get(keyword)
+        if view is None:
+            view = [
+                article for article in self._views.get(None, [])
+                if keyword in (article.get("title") or "").lower()
+                or keyword in (article.get("description") or "").lower()
+            ]
+            if len(self._keyword_views) >= MAX_KEYWORD_VIEWS:
+                self._keyword_views.clear()
+            self._keyword_views[keyword] = view
+        return view
+
+    def snapshot(self) -> List[Dict]:
+        """Serializable copy of the store, oldest first"""
+        return [
+            {"article": entry["article"], "categories": sorted(entry["categories"])}
+            for entry in self._entries.values()
+        ]
+
+    def load(self, snapshot: List[Dict]):
+        """Restores a snapshot taken by snapshot()"""
+        for item in snapshot:
+            for category in item.get("categories", []):
+                self.add(category, [item["article"]])
+        self.rebuild_views()
+
+store = NewsStore(NEWS_CACHE_SIZE)
+_refresh_task = None
+_inflight = None
+
+def _fetch_category_sync(category: str) -> List[Dict]:
+    import requests
+    
+    params = {
+        "apiKey": NEWS_API_KEY,
+        "language": "en",
+        "pageSize": NEWS_PAGE_SIZE,
+        "category": "business"
+    }
+    if category != "business":
+        params["q"] = category
+    
+    response = requests.get(NEWS_API_URL, params=params, timeout=10)
+    if response.status_code != 200:
+        raise RuntimeError(f"News API error: {response.json().get('message', 'Unknown error')}")
+    return [format_article(article) for article in response.json().get("articles", [])]
+
+async def _fetch_category(category: str) -> List[Dict]:
+    # Workers on one host refresh on their own schedules; whichever fetches a
+    # category first in a refresh interval shares it with the others
+    loop = asyncio.get_event_loop()
+    return await get_or_fetch(
+        f"news:{category}", NEWS_REFRESH_SECONDS,
+        lambda: loop.run_in_executor(None, _fetch_category_sync, category)
+    )
+
+async def _refresh():
+    results = await asyncio.gather(
+        *[_fetch_category(category) for category in NEWS_CATEGORIES],
+        return_exceptions=True
+    )
+    
+    added = 0
+    for category, result in zip(NEWS_CATEGORIES, results):
+        if isinstance(result, Exception):
+            # Keep serving what we already have for this category
+            logging.error(f"Error refreshing news category {category}: {result}")
+            continue
+        added += store.add(category, result)
+    store.rebuild_views()
+    logging.info(f"News cache refreshed: {added} new articles, {len(store)} cached")
+    
+    if NEWS_PERSIST:
+        try:
+            await save_news_snapshot(store.snapshot(), store.refreshed_at)
+        except Exception as e:
+            logging.error(f"Error persisting news cache: {e}")
+
+async def refresh():
+    """Refreshes all categories, sharing one upstream pass between concurrent callers"""
+    global _inflight
+    if _inflight is None or _inflight.done():
+        _inflight = asyncio.ensure_future(_refresh())
+    await asyncio.shield(_inflight)
+
+async def _refresh_loop():
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            logging.error(f"News refresh failed: {e}")
+        await asyncio.sleep(NEWS_REFRESH_SECONDS)
+
+async def start():
+    """Warms the store from Mongo (if persistence is on) and starts the refresh loop"""
+    global _refresh_task
+    if NEWS_PERSIST:
+        try:
+            saved = await load_news_snapshot()
+            if saved:
+                store.load(saved.get("articles", []))
+        except Exception as e:
+            logging.error(f"Error loading persisted news cache: {e}")
+    
+    if not NEWS_API_KEY:
+        return
+    if _refresh_task is None:
+        _refresh_task = asyncio.ensure_future(_refresh_loop())
+
+async def stop():
+    """Cancels the background refresh loop"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+async def get_latest_news(category: Optional[str] = None, count: int = 5) -> List[Dict]:
+    """Serves news from the store; only a store that was never filled waits on a refresh"""
+    if store.refreshed_at is None and NEWS_API_KEY:
+        await refresh()
+    return store.latest(category, count)
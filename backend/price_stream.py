@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+class Subscriber:
+    """One streaming client's view of the hub.
+
+    Pending updates are conflated per symbol: a consumer that falls behind
+    only ever holds the latest value for each symbol, never a backlog.
+    """
+
+    __slots__ = ("symbols", "pending", "dropped", "_event")
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols = frozenset(symbols)
+        self.pending = {}
+        self.dropped = 0
+        self._event = asyncio.Event()
+
+    def offer(self, update: Dict):
+        if update["symbol"] in self.pending:
+            self.dropped += 1
+        self.pending[update["symbol"]] = update
+        self._event.set()
+
+    async def next_batch(self, timeout: float) -> List[Dict]:
+        """Waits up to timeout for updates; an empty list means send a heartbeat"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._event.clear()
+        batch = sorted(self.pending.values(), key=lambda u: u["seq"])
+        self.pending = {}
+        return batch
+
+class PriceHub:
+    """Shares one upstream poll per symbol across every subscriber.
+
+    A poller task runs for a symbol only while someone is subscribed to it,
+    and the symbol's last value is dropped when its poller stops.
+    Each published update carries a hub-wide sequence number, so a client
+    reconnecting with the last sequence it saw is sent just the symbols that
+    changed since then.
+    """
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Dict]], interval: float):
+        self.fetch = fetch
+        self.interval = interval
+        self.upstream_calls = 0
+        self._seq = 0
+        self._latest = {}  # symbol -> last published update
+        self._subscribers = {}  # symbol -> set of Subscriber
+        self._pollers = {}  # symbol -> asyncio.Task
+
+    def subscribe(self, symbols: Iterable[str], last_event_id: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(symbols)
+        for symbol in subscriber.symbols:
+            self._subscribers.setdefault(symbol, set()).add(subscriber)
+            if symbol not in self._pollers:
+                self._pollers[symbol] = asyncio.ensure_future(self._poll(symbol))
+            
+            # New clients get the current value; resuming clients only what they missed
+            latest = self._latest.get(symbol)
+            if latest and (last_event_id is None or latest["seq"] > last_event_id):
+                subscriber.offer(latest)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        for symbol in subscriber.symbols:
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[symbol]
+
+    def publish(self, symbol: str, quote: Dict):
+        """Fans a new quote out to every subscriber of the symbol (unchanged quotes are skipped)"""
+        latest = self._latest.get(symbol)
+        if latest is not None and latest["quote"] == quote:
+            return
+        self._seq += 1
+        update = {"seq": self._seq, "symbol": symbol, "quote": quote, "timestamp": time.time()}
+        self._latest[symbol] = update
+        for subscriber in self._subscribers.get(symbol, ()):
+            subscriber.offer(update)
+
+    async def _poll(self, symbol: str):
+        try:
+            while self._subscribers.get(symbol):
+                try:
+                    self.upstream_calls += 1
+                    quote = await self.fetch(symbol)
+                    self.publish(symbol, quote)
+                except Exception as e:
+                    logging.error(f"Error polling price for {symbol}: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            self._pollers.pop(symbol, None)
+            self._latest.pop(symbol, None)
+
+    async def close(self):
+        """Cancels all poller tasks"""
+        pollers = list(self._pollers.values())
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        subscribers = set()
+        for subs in self._subscribers.values():
+            subscribers.update(subs)
+        return {
+            "symbols": len(self._subscribers),
+            "subscribers": len(subscribers),
+            "upstream_calls": self.upstream_calls,
+            "dropped_updates": sum(s.dropped for s in subscribers)
+        }
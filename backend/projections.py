@@ -0,0 +1,222 @@
+"""Monte Carlo projections for financial goals.
+
+A goal's balance grows each month by a random market return and a random
+contribution. Returns are log-normal with an expected return and volatility
+set by the user's risk tolerance. Contributions are normal around the
+user's historical monthly savings (income minus expenses), scaled by the
+goal's share of the user's savings.
+
+All paths are simulated together as arrays of months x paths: the random
+draws and growth factors are generated for every path and month in bulk,
+and the balance recurrence B[t] = B[t-1] * R[t] + C[t] steps through the
+months with each step applied to all paths at once. Arrays are float32,
+which is precise enough for probabilities and percentiles and halves the
+memory traffic.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional
+from repository import get_monthly_flows, get_risk_tolerance
+from fx import get_user_currency, convert_rows, rates_version, rates_available
+from user_cache import user_cache
+import events
+
+PROJECTION_PATHS = int(os.getenv("PROJECTION_PATHS", 50000))
+# Horizon for goals without a deadline, and the longest horizon simulated
+DEFAULT_HORIZON_MONTHS = 120
+MAX_HORIZON_MONTHS = 600
+SAVINGS_HISTORY_MONTHS = 12
+
+# Annual expected return and volatility at risk tolerance 1 and 10;
+# tolerances in between are interpolated linearly
+CONSERVATIVE_PORTFOLIO = (0.04, 0.03)
+AGGRESSIVE_PORTFOLIO = (0.10, 0.18)
+
+def portfolio_for_risk(risk_tolerance: int):
+    """(annual expected return, annual volatility) for a risk tolerance of 1-10"""
+    weight = (min(max(risk_tolerance, 1), 10) - 1) / 9
+    return tuple(
+        low + (high - low) * weight
+        for low, high in zip(CONSERVATIVE_PORTFOLIO, AGGRESSIVE_PORTFOLIO)
+    )
+
+def savings_stats(monthly_net: List[float]) -> Dict:
+    """Mean and standard deviation of monthly savings"""
+    count = len(monthly_net)
+    if count == 0:
+        return {"months": 0, "mean": 0.0, "std": 0.0}
+    mean = sum(monthly_net) / count
+    variance = sum((value - mean) ** 2 for value in monthly_net) / (count - 1) if count > 1 else 0.0
+    return {"months": count, "mean": mean, "std": variance ** 0.5}
+
+def contribution_shares(goals: List[Dict]) -> Dict[str, float]:
+    """Splits savings across goals by priority (1 is the highest of 5)"""
+    weights = {str(goal["_id"]): 6 - goal.get("priority", 3) for goal in goals}
+    total = sum(weights.values())
+    return {goal_id: weight / total for goal_id, weight in weights.items()} if total else {}
+
+def horizon_months(deadline: Optional[datetime], now: datetime) -> int:
+    """Whole months from now until the deadline (at least one)"""
+    if deadline is None:
+        return DEFAULT_HORIZON_MONTHS
+    months = (deadline.year - now.year) * 12 + deadline.month - now.month
+    if deadline.day < now.day:
+        months -= 1
+    return min(max(months, 1), MAX_HORIZON_MONTHS)
+
+def simulate(start_balance: float, target: float, months: int, contribution_mean: float,
+             contribution_std: float, annual_return: float, annual_volatility: float,
+             paths: int = PROJECTION_PATHS, seed: int = 0) -> Dict:
+    """Simulates paths of monthly balances and summarizes how they reach target"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    monthly_drift = np.log1p(annual_return) / 12
+    monthly_volatility = annual_volatility / np.sqrt(12)
+    # Antithetic pairs: the second half of the paths mirrors the first half's
+    # shocks, which halves the random draws and reduces the variance. Arrays
+    # are (2, months, paths / 2), so each month of each half is contiguous.
+    half = (paths + 1) // 2
+
+    def shocks():
+        draws = np.empty((2, months, half), dtype=np.float32)
+        rng.standard_normal((months, half), dtype=np.float32, out=draws[0])
+        np.negative(draws[0], out=draws[1])
+        return draws
+
+    # Monthly growth factors R[t]
+    growth = shocks()
+    growth *= monthly_volatility
+    growth += monthly_drift - monthly_volatility ** 2 / 2
+    np.exp(growth, out=growth)
+
+    # Contributions C[t], turned into balances in place month by month
+    balances = shocks()
+    balances *= contribution_std
+    balances += contribution_mean
+    balances[:, 0] += start_balance * growth[:, 0]
+    carried = np.empty((2, half), dtype=np.float32)
+    for month in range(1, months):
+        np.multiply(balances[:, month - 1], growth[:, month], out=carried)
+        balances[:, month] += carried
+
+    reached = balances >= target
+    hit = reached.any(axis=1)
+    final = balances[:, -1].ravel()
+    p10, p50, p90 = np.percentile(final, [10, 50, 90])
+    # argmax finds the first month at or above target on the paths that get there
+    first_month = np.concatenate([reached[i][:, hit[i]].argmax(axis=0) for i in range(2)]) + 1
+
+    return {
+        "probability": float(hit.mean()),
+        "probability_at_deadline": float((final >= target).mean()),
+        "final_balance": {"p10": float(p10), "p50": float(p50), "p90": float(p90)},
+        "median_months_to_target": float(np.median(first_month)) if len(first_month) else None
+    }
+
+def inputs_hash(inputs: Dict) -> str:
+    """Stable digest of a projection's inputs; also seeds its random numbers"""
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+async def get_savings_profile(user_email: str, currency: str) -> Dict:
+    """Monthly savings stats over the last complete months, cached until transactions change"""
+    now = datetime.now()
+    return await user_cache.get_or_compute(
+        user_email, "savings_profile", (currency, now.strftime("%Y-%m"), rates_version()),
+        (events.TRANSACTIONS,),
+        lambda: build_savings_profile(user_email, currency, now)
+    )
+
+async def build_savings_profile(user_email: str, currency: str, now: datetime) -> Dict:
+    months_back = now.year * 12 + now.month - 1 - SAVINGS_HISTORY_MONTHS
+    start = datetime(months_back // 12, months_back % 12 + 1, 1)
+    current_month = now.strftime("%Y-%m")
+
+    rows = [{
+        "month": row["_id"]["month"],
+        "type": row["_id"]["type"],
+        "currency": row["_id"].get("currency"),
+        "total": row["total"],
+        "date": datetime.strptime(row["_id"]["month"], "%Y-%m")
+    } for row in await get_monthly_flows(user_email, start) if row["_id"]["month"] != current_month]
+    convert_rows(rows, currency, field="total")
+
+    net = {}
+    for row in rows:
+        sign = 1 if row["type"] == "income" else -1
+        net[row["month"]] = net.get(row["month"], 0) + sign * row["total"]
+    if not net:
+        return savings_stats([])
+
+    # Months without transactions since the first active month count as zero
+    first = datetime.strptime(min(net), "%Y-%m")
+    months = []
+    month_index = first.year * 12 + first.month - 1
+    while True:
+        key = f"{month_index // 12}-{month_index % 12 + 1:02d}"
+        if key >= current_month:
+            break
+        months.append(net.get(key, 0.0))
+        month_index += 1
+    return savings_stats(months)
+
+async def project_goal(user_email: str, goal: Dict, share: float, savings: Dict,
+                       risk_tolerance: int, currency: str, paths: int, now: datetime) -> Dict:
+    """Projection for one goal, cached per (goal, inputs hash)"""
+    annual_return, annual_volatility = portfolio_for_risk(risk_tolerance)
+    inputs = {
+        "start_balance": goal.get("current_amount", 0),
+        "target": goal["target_amount"],
+        "months": horizon_months(goal.get("deadline"), now),
+        "contribution_mean": savings["mean"] * share,
+        "contribution_std": savings["std"] * share,
+        "annual_return": annual_return,
+        "annual_volatility": annual_volatility,
+        "paths": paths
+    }
+    digest = inputs_hash({**inputs, "currency": currency})
+
+    async def compute():
+        if inputs["start_balance"] >= inputs["target"]:
+            return {"probability": 1.0, "probability_at_deadline": 1.0,
+                    "final_balance": None, "median_months_to_target": 0}
+        loop = asyncio.get_event_loop()
+        # numpy releases the GIL in most of the array work, so other requests keep moving
+        return await loop.run_in_executor(None, partial(simulate, **inputs, seed=int(digest[:8], 16)))
+
+    result = await user_cache.get_or_compute(
+        user_email, "goal_projection", (str(goal["_id"]), digest), (events.GOALS,), compute
+    )
+    return {
+        **result,
+        "months": inputs["months"],
+        "monthly_contribution": inputs["contribution_mean"]
+    }
+
+async def project_goals(user_email: str, goals: List[Dict], paths: int = PROJECTION_PATHS) -> Dict:
+    """Projections for all of a user's goals, in their base currency"""
+    now = datetime.now()
+    currency = await get_user_currency(user_email)
+    savings = await get_savings_profile(user_email, currency)
+    risk_tolerance = await get_risk_tolerance(user_email)
+    shares = contribution_shares(goals)
+
+    projections = []
+    for goal in goals:
+        goal_id = str(goal["_id"])
+        projection = await project_goal(
+            user_email, goal, shares[goal_id], savings, risk_tolerance, currency, paths, now
+        )
+        projections.append({"goal_id": goal_id, "name": goal["name"], **projection})
+
+    return {
+        "currency": currency,
+        "rates_available": rates_available(currency),
+        "risk_tolerance": risk_tolerance,
+        "savings": savings,
+        "projections": projections
+    }
@@ -0,0 +1,133 @@
+"""Stock, index and crypto quotes from Alpha Vantage and CoinGecko.
+
+Every quote read goes through the provider's circuit breaker and is hedged
+(see upstream.py), so a degraded provider costs callers at most
+QUOTE_TIMEOUT_SECONDS, then nothing while its breaker is open, and a
+recently seen quote is served marked stale where possible. Fresh quotes are
+shared for QUOTE_CACHE_SECONDS through the host-wide cache (shared_cache.py),
+so every worker on a host polls a symbol once. The provider URLs
+can be pointed at a local fake upstream for fault-injection runs
+(benchmarks/upstream_faults.py).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict
+from fastapi import HTTPException
+from upstream import CircuitBreaker, Provider
+from shared_cache import get_or_fetch
+
+STOCK_API_KEY = os.getenv("STOCK_API_KEY")
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+COINGECKO_URL = os.getenv("COINGECKO_URL", "https://api.coingecko.com/api/v3")
+
+QUOTE_TIMEOUT_SECONDS = float(os.getenv("QUOTE_TIMEOUT_SECONDS", 5))
+QUOTE_HEDGING = os.getenv("QUOTE_HEDGING", "true").lower() == "true"
+# Maximum fraction of quote calls that may send a hedge
+QUOTE_HEDGE_BUDGET = float(os.getenv("QUOTE_HEDGE_BUDGET", 0.1))
+QUOTE_STALE_SECONDS = float(os.getenv("QUOTE_STALE_SECONDS", 3600))
+# How long a fresh quote is reused by every worker on the host (0 to always fetch)
+QUOTE_CACHE_SECONDS = float(os.getenv("QUOTE_CACHE_SECONDS", 30))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", 2))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+
+# Quote fetches block on the network, so they get their own threads rather
+# than competing with other executor work
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("QUOTE_MAX_WORKERS", 32)), thread_name_prefix="quotes")
+
+def _provider(name: str) -> Provider:
+    breaker = CircuitBreaker(
+        min_calls=BREAKER_MIN_CALLS,
+        error_rate=BREAKER_ERROR_RATE,
+        slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+        open_seconds=BREAKER_OPEN_SECONDS
+    )
+    return Provider(
+        name, breaker, QUOTE_TIMEOUT_SECONDS, _executor,
+        hedge_budget=QUOTE_HEDGE_BUDGET, stale_seconds=QUOTE_STALE_SECONDS
+    )
+
+alpha_vantage = _provider("Alpha Vantage")
+coingecko = _provider("CoinGecko")
+
+class UpstreamError(Exception):
+    """An upstream response that is not an answer (rate limit, malformed body)"""
+
+def _global_quote(symbol: str, timeout: float) -> Dict:
+    import requests
+
+    response = requests.get(
+        ALPHA_VANTAGE_URL,
+        params={"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": STOCK_API_KEY},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    data = response.json()
+    # Rate limiting comes back as 200 with a note instead of a quote
+    if "Note" in data or "Information" in data:
+        raise UpstreamError(data.get("Note") or data.get("Information"))
+    if not data.get("Global Quote"):
+        raise HTTPException(status_code=400, detail="Invalid Stock Symbol or API limit reached")
+    return data["Global Quote"]
+
+def _fetch_stock(symbol: str, timeout: float) -> Dict:
+    data = _global_quote(symbol, timeout)
+    return {
+        "symbol": symbol,
+        "price": float(data["05. price"]),
+        "change_percent": data["10. change percent"],
+        "high": data["03. high"],
+        "low": data["04. low"],
+        "volume": data["06. volume"]
+    }
+
+def _fetch_index(symbol: str, timeout: float) -> Dict:
+    data = _global_quote(symbol, timeout)
+    return {
+        "symbol": symbol,
+        "price": data.get("05. price"),
+        "change": data.get("09. change"),
+        "change_percent": data.get("10. change percent")
+    }
+
+def _fetch_crypto(symbol: str, timeout: float) -> Dict:
+    import requests
+
+    response = requests.get(
+        f"{COINGECKO_URL}/simple/price",
+        params={"ids": symbol, "vs_currencies": "usd,inr", "include_24hr_change": "true"},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    data = response.json()
+    if symbol not in data:
+        raise HTTPException(status_code=400, detail="Invalid Crypto Symbol")
+    return {
+        "symbol": symbol,
+        "price_usd": data[symbol]["usd"],
+        "price_inr": data[symbol]["inr"],
+        "change_24h_percent": data[symbol].get("usd_24h_change", 0)
+    }
+
+async def _quote(provider: Provider, key: str, fetch) -> Dict:
+    # Stale fallbacks are per worker and never shared as fresh quotes
+    return await get_or_fetch(
+        f"quote:{key}", QUOTE_CACHE_SECONDS,
+        lambda: provider.call(key, fetch, hedge=QUOTE_HEDGING),
+        cacheable=lambda quote: not quote.get("stale")
+    )
+
+async def get_stock_quote(symbol: str) -> Dict:
+    return await _quote(alpha_vantage, f"stock:{symbol}", partial(_fetch_stock, symbol))
+
+async def get_index_quote(symbol: str) -> Dict:
+    return await _quote(alpha_vantage, f"index:{symbol}", partial(_fetch_index, symbol))
+
+async def get_crypto_quote(symbol: str) -> Dict:
+    return await _quote(coingecko, f"crypto:{symbol}", partial(_fetch_crypto, symbol))
+
+def upstream_stats() -> Dict:
+    """Breaker state, hedging and latency counters per provider"""
+    return {provider.name: provider.stats() for provider in (alpha_vantage, coingecko)}
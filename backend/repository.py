@@ -0,0 +1,893 @@
+"""All MongoDB access for the API.
+
+Each query shape has its own projection so routes only pull the fields they
+use, and every read carries a server-side time limit (maxTimeMS) so one
+pathological query cannot pin a pooled connection. Reads marked analytics
+use the analytics read preference (see database.py); they are only used
+for responses that are not ETag-validated, because a lagging secondary
+would otherwise get cached under a new data version.
+"""
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from database import get_collection
+from write_buffer import GroupCommitBuffer
+
+MAX_TIME_MS = int(os.getenv("MONGO_MAX_TIME_MS", 5000))
+ANALYTICS_MAX_TIME_MS = int(os.getenv("MONGO_ANALYTICS_MAX_TIME_MS", 30000))
+
+# Group commit for transaction inserts: concurrent POST /transactions/ calls
+# share one insert_many, flushed at MAX_BATCH documents or after MAX_DELAY_MS
+TRANSACTION_GROUP_COMMIT = os.getenv("TRANSACTION_GROUP_COMMIT", "false").lower() == "true"
+TRANSACTION_GROUP_COMMIT_MAX_BATCH = int(os.getenv("TRANSACTION_GROUP_COMMIT_MAX_BATCH", 200))
+TRANSACTION_GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("TRANSACTION_GROUP_COMMIT_MAX_DELAY_MS", 5))
+
+# Projections, one per query shape
+TRANSACTION_LIST_FIELDS = {"user_email": 0}
+SPENDING_FIELDS = {"_id": 0, "amount": 1, "currency": 1, "category": 1, "date": 1}
+COLUMN_FIELDS = {"_id": 1, "amount": 1, "currency": 1, "category": 1, "transaction_type": 1, "date": 1}
+INVESTMENT_FIELDS = {"_id": 0, "symbol": 1, "asset_type": 1, "quantity": 1, "amount": 1, "currency": 1, "date": 1}
+INVESTMENT_SYMBOL_FIELDS = {"_id": 0, "symbol": 1, "asset_type": 1}
+PROFILE_FIELDS = {"_id": 0, "password": 0, "budgets": 0}
+CREDENTIAL_FIELDS = {"_id": 0, "password": 1, "role": 1}
+BUDGET_FIELDS = {"_id": 0}
+BUDGET_HISTORY_FIELDS = {"_id": 0, "user_email": 0}
+EMBEDDED_BUDGET_FIELDS = {"_id": 1, "email": 1, "budgets": 1}
+RISK_FIELDS = {"_id": 0, "risk_tolerance": 1}
+CURRENCY_FIELDS = {"_id": 0, "base_currency": 1}
+ROLE_FIELDS = {"_id": 0, "role": 1}
+GOAL_FIELDS = {"user_email": 0}
+JOB_LIST_FIELDS = {"checkpoint": 0, "lease_owner": 0}
+REPORT_ROW_FIELDS = {"_id": 0, "job_id": 0}
+SEARCH_FIELDS = {"user_email": 0}
+DETECTOR_FIELDS = {"_id": 1, "amount": 1, "currency": 1, "category": 1, "description": 1, "transaction_type": 1, "date": 1}
+ALERT_FIELDS = {"user_email": 0}
+USER_EMAIL_FIELDS = {"_id": 1, "email": 1}
+EXISTS_FIELDS = {"_id": 1}
+
+# Budget fields a client update may not overwrite
+PROTECTED_BUDGET_FIELDS = {"_id", "user_email", "version", "created_at", "updated_at"}
+MAX_BUDGETS_PER_USER = 500
+
+BUDGET_MIGRATION_ID = "embedded_budgets"
+MIGRATION_CHECK_SECONDS = 60
+_embedded_budgets_migrated = False
+_migration_checked_at = None
+
+async def _guard(awaitable):
+    """Awaits a query, turning a maxTimeMS expiry into a 503"""
+    try:
+        return await awaitable
+    except Exception as e:
+        from pymongo.errors import ExecutionTimeout
+        if isinstance(e, ExecutionTimeout):
+            raise HTTPException(status_code=503, detail="Database query timed out")
+        raise
+
+def _max_time(analytics: bool) -> int:
+    return ANALYTICS_MAX_TIME_MS if analytics else MAX_TIME_MS
+
+async def _find(collection_name: str, query: Dict, projection: Dict, limit: int,
+                sort: Optional[tuple] = None, analytics: bool = False) -> List[Dict]:
+    collection = get_collection(collection_name, analytics)
+    cursor = collection.find(query, projection, max_time_ms=_max_time(analytics))
+    if sort:
+        cursor = cursor.sort(*sort)
+    cursor = cursor.limit(limit)
+    return await _guard(cursor.to_list(length=limit))
+
+async def _find_one(collection_name: str, query: Dict, projection: Dict) -> Optional[Dict]:
+    collection = get_collection(collection_name)
+    return await _guard(collection.find_one(query, projection, max_time_ms=MAX_TIME_MS))
+
+def _date_range(start: Optional[datetime], end: Optional[datetime]) -> Dict:
+    date_query = {}
+    if start:
+        date_query["$gte"] = start
+    if end:
+        date_query["$lte"] = end
+    return date_query
+
+# Users
+
+async def user_exists(email: str) -> bool:
+    return await _find_one("users", {"email": email}, EXISTS_FIELDS) is not None
+
+async def insert_user(user: Dict):
+    await get_collection("users").insert_one(user)
+
+async def get_user_credentials(email: str) -> Optional[Dict]:
+    """Only the password hash, for login"""
+    return await _find_one("users", {"email": email}, CREDENTIAL_FIELDS)
+
+async def get_user_profile(email: str) -> Optional[Dict]:
+    return await _find_one("users", {"email": email}, PROFILE_FIELDS)
+
+async def update_user_profile(email: str, fields: Dict):
+    return await get_collection("users").update_one({"email": email}, {"$set": fields})
+
+async def get_risk_tolerance(email: str, default: int = 5) -> int:
+    user = await _find_one("users", {"email": email}, RISK_FIELDS)
+    return (user or {}).get("risk_tolerance") or default
+
+async def get_base_currency(email: str) -> Optional[str]:
+    user = await _find_one("users", {"email": email}, CURRENCY_FIELDS)
+    return user.get("base_currency") if user else None
+
+async def get_user_role(email: str) -> Optional[str]:
+    user = await _find_one("users", {"email": email}, ROLE_FIELDS)
+    return (user.get("role") or "user") if user else None
+
+async def count_users() -> int:
+    return await get_collection("users").estimated_document_count()
+
+# Budgets
+#
+# Budgets live in their own collection, one document per (user_email, category,
+# period), and every change is appended to budget_history instead of growing
+# the user document. Budgets still embedded in a user document are moved over
+# the first time that user's budgets are touched, until the migration tool
+# (migrations/migrate_embedded_budgets.py) has marked the move as done.
+
+async def embedded_budgets_pending() -> bool:
+    """Whether embedded budgets may still exist; re-checked at most once a minute"""
+    global _embedded_budgets_migrated, _migration_checked_at
+    if _embedded_budgets_migrated:
+        return False
+    now = time.monotonic()
+    if _migration_checked_at is None or now - _migration_checked_at >= MIGRATION_CHECK_SECONDS:
+        _migration_checked_at = now
+        state = await get_migration_state(BUDGET_MIGRATION_ID)
+        _embedded_budgets_migrated = bool(state and state.get("done"))
+    return not _embedded_budgets_migrated
+
+async def migrate_user_budgets(user: Dict) -> int:
+    """Copies one user document's embedded budgets into the budgets collection.
+
+    Copies are upserts that never overwrite a budget already in the collection,
+    so this is safe to repeat. The embedded array is only removed if it is
+    unchanged since it was read. Returns the number of budgets copied.
+    """
+    now = datetime.utcnow()
+    copied = 0
+    for budget in user.get("budgets") or []:
+        if not budget.get("category"):
+            continue
+        doc = {**budget, "user_email": user["email"], "period": budget.get("period", "monthly")}
+        result = await get_collection("budgets").update_one(
+            {"user_email": doc["user_email"], "category": doc["category"], "period": doc["period"]},
+            {"$setOnInsert": {**doc, "version": 1, "created_at": now, "updated_at": now}},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            copied += 1
+            await _record_budget_change({**doc, "version": 1}, "migrated")
+    
+    await get_collection("users").update_one(
+        {"_id": user["_id"], "budgets": user.get("budgets")},
+        {"$unset": {"budgets": ""}}
+    )
+    return copied
+
+async def _migrate_if_pending(email: str):
+    if await embedded_budgets_pending():
+        user = await _find_one("users", {"email": email, "budgets": {"$exists": True}}, EMBEDDED_BUDGET_FIELDS)
+        if user is not None:
+            await migrate_user_budgets(user)
+
+async def _record_budget_change(budget: Dict, change: str):
+    await get_collection("budget_history").insert_one({
+        "user_email": budget["user_email"],
+        "category": budget["category"],
+        "period": budget.get("period"),
+        "version": budget.get("version"),
+        "change": change,
+        "budget": {k: v for k, v in budget.items() if k != "_id"},
+        "changed_at": datetime.utcnow()
+    })
+
+async def get_user_budgets(email: str) -> List[Dict]:
+    await _migrate_if_pending(email)
+    return await _find("budgets", {"user_email": email}, BUDGET_FIELDS, MAX_BUDGETS_PER_USER)
+
+async def budget_exists(email: str, category: str, period: str) -> bool:
+    await _migrate_if_pending(email)
+    query = {"user_email": email, "category": category, "period": period}
+    return await _find_one("budgets", query, EXISTS_FIELDS) is not None
+
+async def add_budget(budget: Dict) -> bool:
+    """Inserts a budget at version 1; False if one exists for the category and period"""
+    from pymongo.errors import DuplicateKeyError
+    
+    now = datetime.utcnow()
+    doc = {**budget, "version": 1, "created_at": now, "updated_at": now}
+    try:
+        await get_collection("budgets").insert_one(doc)
+    except DuplicateKeyError:
+        return False
+    await _record_budget_change(doc, "created")
+    return True
+
+async def update_budget(email: str, category: str, period: str, fields: Dict) -> Optional[Dict]:
+    """Applies an update as a new version; returns the updated budget or None.
+
+    Moving a budget onto the category and period of another one is a 409.
+    """
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+    
+    await _migrate_if_pending(email)
+    fields = {k: v for k, v in fields.items() if k not in PROTECTED_BUDGET_FIELDS}
+    try:
+        budget = await get_collection("budgets").find_one_and_update(
+            {"user_email": email, "category": category, "period": period},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+            projection=BUDGET_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail=f"A {fields.get('period', period)} budget for '{fields.get('category', category)}' already exists"
+        )
+    if budget is not None:
+        await _record_budget_change(budget, "updated")
+    return budget
+
+async def delete_budget(email: str, category: str, period: str) -> bool:
+    await _migrate_if_pending(email)
+    budget = await get_collection("budgets").find_one_and_delete(
+        {"user_email": email, "category": category, "period": period},
+        projection=BUDGET_FIELDS
+    )
+    if budget is None:
+        return False
+    await _record_budget_change({**budget, "version": budget.get("version", 0) + 1}, "deleted")
+    return True
+
+async def get_budget_history(email: str, category: str, period: str, limit: int = 100) -> List[Dict]:
+    """Recorded versions of a budget, newest first"""
+    query = {"user_email": email, "category": category, "period": period}
+    return await _find("budget_history", query, BUDGET_HISTORY_FIELDS, limit, sort=("changed_at", -1))
+
+async def get_users_with_embedded_budgets(after_id=None, limit: int = 500) -> List[Dict]:
+    """A batch of user documents that still embed budgets, in _id order"""
+    query = {"budgets": {"$exists": True}}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return await _find("users", query, EMBEDDED_BUDGET_FIELDS, limit, sort=("_id", 1))
+
+# Goals
+
+async def insert_goal(goal: Dict):
+    result = await get_collection("goals").insert_one(goal)
+    return result.inserted_id
+
+async def list_goals(email: str, limit: int = 100) -> List[Dict]:
+    """The user's goals, highest priority first"""
+    return await _find("goals", {"user_email": email}, GOAL_FIELDS, limit, sort=("priority", 1))
+
+async def get_goal(email: str, goal_id: str) -> Optional[Dict]:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(goal_id):
+        return None
+    return await _find_one("goals", {"_id": ObjectId(goal_id), "user_email": email}, GOAL_FIELDS)
+
+async def update_goal(email: str, goal_id: str, fields: Dict) -> bool:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(goal_id):
+        return False
+    result = await get_collection("goals").update_one(
+        {"_id": ObjectId(goal_id), "user_email": email},
+        {"$set": fields}
+    )
+    return result.matched_count > 0
+
+async def delete_goal(email: str, goal_id: str) -> bool:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(goal_id):
+        return False
+    result = await get_collection("goals").delete_one({"_id": ObjectId(goal_id), "user_email": email})
+    return result.deleted_count > 0
+
+# Migration checkpoints
+
+async def get_migration_state(migration_id: str) -> Optional[Dict]:
+    return await _find_one("migrations", {"_id": migration_id}, {"_id": 0})
+
+async def save_migration_state(migration_id: str, fields: Dict):
+    await get_collection("migrations").update_one(
+        {"_id": migration_id},
+        {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+# Transactions
+
+async def insert_transaction(transaction: Dict):
+    """Inserts a transaction and returns its _id, group-committed when enabled"""
+    if transaction_write_buffer is not None:
+        return await transaction_write_buffer.insert(transaction)
+    result = await get_collection("transactions").insert_one(transaction)
+    return result.inserted_id
+
+async def insert_transactions_batch(transactions: List[Dict]) -> List[Optional[Exception]]:
+    """Unordered insert_many; returns None or the write error for each document"""
+    from pymongo.errors import BulkWriteError, WriteError
+    
+    try:
+        await get_collection("transactions").insert_many(transactions, ordered=False)
+        return [None] * len(transactions)
+    except BulkWriteError as e:
+        # A write concern error means no document's durability is known
+        if e.details.get("writeConcernErrors"):
+            raise
+        errors = [None] * len(transactions)
+        for error in e.details.get("writeErrors", []):
+            errors[error["index"]] = WriteError(error.get("errmsg"), error.get("code"), error)
+        return errors
+
+transaction_write_buffer = GroupCommitBuffer(
+    insert_transactions_batch,
+    TRANSACTION_GROUP_COMMIT_MAX_BATCH,
+    TRANSACTION_GROUP_COMMIT_MAX_DELAY_MS / 1000
+) if TRANSACTION_GROUP_COMMIT else None
+
+async def flush_write_buffers():
+    """Writes out any group-commit batches still pending (called at shutdown)"""
+    if transaction_write_buffer is not None:
+        await transaction_write_buffer.drain()
+
+async def delete_transaction(email: str, transaction_id: str):
+    from bson.objectid import ObjectId
+    return await get_collection("transactions").delete_one({"_id": ObjectId(transaction_id), "user_email": email})
+
+async def list_transactions(email: str, category: Optional[str] = None, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, limit: int = 50) -> List[Dict]:
+    """Newest-first transactions for the transaction list"""
+    query = {"user_email": email}
+    if category:
+        query["category"] = category
+    date_query = _date_range(start, end)
+    if date_query:
+        query["date"] = date_query
+    return await _find("transactions", query, TRANSACTION_LIST_FIELDS, limit, sort=("date", -1))
+
+async def get_spending_rows(email: str, start: datetime, end: Optional[datetime] = None,
+                            transaction_type: Optional[str] = None, limit: int = 1000,
+                            analytics: bool = False) -> List[Dict]:
+    """amount/category/date rows for spending and budget analysis"""
+    query = {"user_email": email, "date": _date_range(start, end)}
+    if transaction_type:
+        query["transaction_type"] = transaction_type
+    return await _find("transactions", query, SPENDING_FIELDS, limit, analytics=analytics)
+
+async def get_column_rows(email: str, start: datetime, end: Optional[datetime] = None,
+                          transaction_type: Optional[str] = None, limit: int = 50000) -> List[Dict]:
+    """_id/amount/currency/category/type/date rows for the columnar transaction cache"""
+    query = {"user_email": email, "date": _date_range(start, end)}
+    if transaction_type:
+        query["transaction_type"] = transaction_type
+    return await _find("transactions", query, COLUMN_FIELDS, limit)
+
+async def search_transactions(email: str, text: str, category: Optional[str] = None,
+                              start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                              order: str = "relevance", after: Optional[tuple] = None,
+                              limit: int = 20) -> List[Dict]:
+    """Text search over description and tags, via the (user_email, text) index.
+
+    order is "relevance" (text score, then _id) or "date" (newest first, then
+    _id); after is the (score or date, _id) of the last result of the
+    previous page. Each result carries its text score.
+    """
+    query = {"user_email": email, "$text": {"$search": text}}
+    if category:
+        query["category"] = category
+    date_query = _date_range(start, end)
+    if date_query:
+        query["date"] = date_query
+    if min_amount is not None or max_amount is not None:
+        query["amount"] = {}
+        if min_amount is not None:
+            query["amount"]["$gte"] = min_amount
+        if max_amount is not None:
+            query["amount"]["$lte"] = max_amount
+    
+    pipeline = [{"$match": query}, {"$addFields": {"score": {"$meta": "textScore"}}}]
+    sort_field = "score" if order == "relevance" else "date"
+    if after is not None:
+        value, last_id = after
+        pipeline.append({"$match": {"$or": [
+            {sort_field: {"$lt": value}},
+            {sort_field: value, "_id": {"$lt": last_id}}
+        ]}})
+    pipeline += [
+        {"$sort": {sort_field: -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": SEARCH_FIELDS}
+    ]
+    cursor = get_collection("transactions").aggregate(pipeline, maxTimeMS=MAX_TIME_MS)
+    return await _guard(cursor.to_list(length=limit))
+
+async def get_investments(email: str, limit: int = 1000) -> List[Dict]:
+    query = {"user_email": email, "transaction_type": "investment"}
+    return await _find("transactions", query, INVESTMENT_FIELDS, limit)
+
+async def get_investment_symbols(email: str, limit: int = 1000) -> List[Dict]:
+    query = {"user_email": email, "transaction_type": "investment"}
+    return await _find("transactions", query, INVESTMENT_SYMBOL_FIELDS, limit)
+
+DAY_EXPRESSION = {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}
+
+async def get_dashboard_facets(email: str, period_start: datetime, month_start: datetime,
+                               now: datetime, recent_limit: int) -> Dict:
+    """One pass over the user's recent transactions, newest first, split by $facet.
+
+    The leading $match/$sort is a bounded range of the (user_email, date)
+    index: transactions since the earlier of period_start and month_start,
+    however long the user's history. Totals are grouped per currency and day
+    so they can be converted at each day's exchange rate. Only when that
+    range holds fewer than recent_limit transactions is the recent list
+    topped up from older ones, in a second query.
+    """
+    since = min(period_start, month_start)
+    pipeline = [
+        {"$match": {"user_email": email, "date": {"$gte": since}}},
+        {"$sort": {"date": -1}},
+        {"$facet": {
+            "recent": [
+                {"$limit": recent_limit},
+                {"$project": {"user_email": 0}},
+                {"$addFields": {"_id": {"$toString": "$_id"}}}
+            ],
+            "period_totals": [
+                {"$match": {"date": {"$gte": period_start}}},
+                {"$group": {
+                    "_id": {"category": "$category", "type": "$transaction_type", "currency": "$currency", "day": DAY_EXPRESSION},
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1}
+                }}
+            ],
+            "budget_spent": [
+                {"$match": {"date": {"$gte": month_start, "$lte": now}, "transaction_type": "expense"}},
+                {"$group": {"_id": {"category": "$category", "currency": "$currency", "day": DAY_EXPRESSION}, "spent": {"$sum": "$amount"}}}
+            ]
+        }}
+    ]
+    cursor = get_collection("transactions").aggregate(pipeline, maxTimeMS=MAX_TIME_MS)
+    result = await _guard(cursor.to_list(length=1))
+    facets = result[0] if result else {"recent": [], "period_totals": [], "budget_spent": []}
+    
+    missing = recent_limit - len(facets["recent"])
+    if missing > 0:
+        older = await _find("transactions", {"user_email": email, "date": {"$lt": since}},
+                            TRANSACTION_LIST_FIELDS, missing, sort=("date", -1))
+        for transaction in older:
+            transaction["_id"] = str(transaction["_id"])
+        facets["recent"] += older
+    return facets
+
+async def get_monthly_flows(email: str, start: datetime) -> List[Dict]:
+    """Income and expense totals per month and currency since start"""
+    pipeline = [
+        {"$match": {"user_email": email, "date": {"$gte": start}, "transaction_type": {"$in": ["income", "expense"]}}},
+        {"$group": {
+            "_id": {
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+                "type": "$transaction_type",
+                "currency": "$currency"
+            },
+            "total": {"$sum": "$amount"}
+        }}
+    ]
+    cursor = get_collection("transactions", analytics=True).aggregate(pipeline, maxTimeMS=ANALYTICS_MAX_TIME_MS)
+    return await _guard(cursor.to_list(length=None))
+
+async def get_detector_rows(email: str, after: Optional[tuple] = None, limit: int = 1000) -> List[Dict]:
+    """A page of the user's transactions oldest first, after a (date, _id) position"""
+    query = {"user_email": email}
+    if after is not None:
+        date, last_id = after
+        query["$or"] = [{"date": {"$gt": date}}, {"date": date, "_id": {"$gt": last_id}}]
+    cursor = get_collection("transactions").find(query, DETECTOR_FIELDS, max_time_ms=ANALYTICS_MAX_TIME_MS)
+    cursor = cursor.sort([("date", 1), ("_id", 1)]).limit(limit)
+    return await _guard(cursor.to_list(length=limit))
+
+async def get_user_emails(after_id=None, limit: int = 500) -> List[Dict]:
+    """A batch of user _id/email pairs in _id order"""
+    query = {"_id": {"$gt": after_id}} if after_id is not None else {}
+    return await _find("users", query, USER_EMAIL_FIELDS, limit, sort=("_id", 1))
+
+# Spending detector state and alerts
+
+async def load_detector_state(email: str) -> Optional[Dict]:
+    return await _find_one("detector_state", {"_id": email}, {"_id": 0})
+
+async def save_detector_state(email: str, state: Dict, version: Optional[int] = None,
+                              rebuilt: bool = False) -> bool:
+    """Stores a user's detector state, bumping its version.
+
+    With version, only while the stored state is still at that version (0:
+    nothing stored yet); returns False when another writer saved first.
+    rebuilt marks a state replayed from history by also bumping its base.
+    """
+    from pymongo.errors import DuplicateKeyError
+    
+    query = {"_id": email}
+    if version is not None:
+        query["version"] = version if version else {"$exists": False}
+    increments = {"version": 1, "base": 1} if rebuilt else {"version": 1}
+    try:
+        await get_collection("detector_state").update_one(
+            query,
+            {"$set": {**state, "updated_at": datetime.utcnow()}, "$inc": increments},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The upsert found the _id taken: the stored state is at another version
+        return False
+    return True
+
+async def insert_alerts(alerts: List[Dict]):
+    await get_collection("alerts").insert_many(alerts)
+
+async def list_alerts(email: str, unread_only: bool = False, limit: int = 50) -> List[Dict]:
+    """Newest-first alerts for the notification center"""
+    query = {"user_email": email}
+    if unread_only:
+        query["read"] = False
+    return await _find("alerts", query, ALERT_FIELDS, limit, sort=("created_at", -1))
+
+async def count_unread_alerts(email: str) -> int:
+    return await _guard(get_collection("alerts").count_documents(
+        {"user_email": email, "read": False}, maxTimeMS=MAX_TIME_MS
+    ))
+
+async def mark_alert_read(email: str, alert_id: str) -> bool:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(alert_id):
+        return False
+    result = await get_collection("alerts").update_one(
+        {"_id": ObjectId(alert_id), "user_email": email},
+        {"$set": {"read": True}}
+    )
+    return result.matched_count > 0
+
+async def mark_all_alerts_read(email: str) -> int:
+    result = await get_collection("alerts").update_many(
+        {"user_email": email, "read": False},
+        {"$set": {"read": True}}
+    )
+    return result.modified_count
+
+# FX rates
+
+async def load_fx_rates(limit: int = 5000) -> List[Dict]:
+    """Stored daily rate snapshots as {date, rates}"""
+    docs = await _find("fx_rates", {}, {"rates": 1}, limit, sort=("_id", 1))
+    return [{"date": doc["_id"], "rates": doc["rates"]} for doc in docs]
+
+async def save_fx_rates(day: str, rates: Dict[str, float]):
+    await get_collection("fx_rates").replace_one(
+        {"_id": day},
+        {"rates": rates, "fetched_at": datetime.utcnow()},
+        upsert=True
+    )
+
+# Admin jobs
+#
+# Jobs are claimed with a lease that the runner renews at every checkpoint; a
+# job whose lease lapsed (its worker stopped) is claimed again and resumes
+# from its checkpoint. Writes from a runner that lost its lease are ignored.
+
+async def create_job(job: Dict):
+    result = await get_collection("jobs").insert_one(job)
+    return result.inserted_id
+
+async def get_job(job_id: str) -> Optional[Dict]:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await _find_one("jobs", {"_id": ObjectId(job_id)}, JOB_LIST_FIELDS)
+
+async def list_jobs(status: Optional[str] = None, before_id=None, limit: int = 20) -> List[Dict]:
+    """Newest-first jobs, optionally after a cursor _id"""
+    query = {}
+    if status:
+        query["status"] = status
+    if before_id is not None:
+        query["_id"] = {"$lt": before_id}
+    return await _find("jobs", query, JOB_LIST_FIELDS, limit, sort=("_id", -1))
+
+async def claim_job(owner: str, lease_seconds: float) -> Optional[Dict]:
+    """Atomically takes the oldest queued job, or a running job whose lease expired"""
+    from datetime import timedelta
+    from pymongo import ReturnDocument
+    
+    now = datetime.utcnow()
+    return await get_collection("jobs").find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "lease_expires": {"$lt": now}}
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": owner,
+                "lease_expires": now + timedelta(seconds=lease_seconds),
+                "updated_at": now
+            },
+            "$min": {"started_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def checkpoint_job(job_id, owner: str, lease_seconds: float, fields: Dict) -> bool:
+    """Saves progress and renews the lease; False if the job was cancelled or taken over"""
+    from datetime import timedelta
+    
+    now = datetime.utcnow()
+    result = await get_collection("jobs").update_one(
+        {"_id": job_id, "status": "running", "lease_owner": owner},
+        {"$set": {**fields, "lease_expires": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+    )
+    return result.matched_count > 0
+
+async def finish_job(job_id, owner: str, status: str, fields: Dict) -> bool:
+    now = datetime.utcnow()
+    result = await get_collection("jobs").update_one(
+        {"_id": job_id, "status": "running", "lease_owner": owner},
+        {"$set": {**fields, "status": status, "finished_at": now, "updated_at": now},
+         "$unset": {"lease_owner": "", "lease_expires": ""}}
+    )
+    return result.matched_count > 0
+
+async def cancel_job(job_id: str) -> bool:
+    from bson.objectid import ObjectId
+    
+    if not ObjectId.is_valid(job_id):
+        return False
+    now = datetime.utcnow()
+    result = await get_collection("jobs").update_one(
+        {"_id": ObjectId(job_id), "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "cancelled", "finished_at": now, "updated_at": now},
+         "$unset": {"lease_owner": "", "lease_expires": ""}}
+    )
+    return result.matched_count > 0
+
+# Admin reports
+#
+# Each report is built per chunk of users (an _id range): the chunk's
+# aggregation starts from users, pulls per-user summaries from transactions
+# and budgets through their user_email indexes, and $merges its grouped rows
+# into report_partials keyed by (job_id, chunk, key). Re-running a chunk after
+# a restart replaces its rows instead of adding to them. finalize_report sums
+# the partials per key into reports. Everything runs server-side with
+# allowDiskUse, so no pass holds more than one chunk's groups in memory.
+# Amounts are summed as stored, so money totals are keyed by currency.
+
+REPORT_DIMENSIONS = {
+    "cohort_spending": ["cohort", "category", "currency"],
+    "budget_adherence": ["category"],
+    "role_usage": ["role"],
+}
+REPORT_METRICS = {
+    "cohort_spending": ["total_spent", "transactions", "users"],
+    "budget_adherence": ["budgets", "within_budget", "total_budgeted", "total_spent"],
+    "role_usage": ["users", "active_users", "transactions", "budgets"],
+}
+REPORT_DERIVED = {
+    "cohort_spending": {
+        "spent_per_user": {"$cond": [{"$gt": ["$users", 0]}, {"$divide": ["$total_spent", "$users"]}, 0]}
+    },
+    "budget_adherence": {
+        "adherence_rate": {"$cond": [{"$gt": ["$budgets", 0]}, {"$divide": ["$within_budget", "$budgets"]}, 0]}
+    },
+    "role_usage": {
+        "transactions_per_active_user": {
+            "$cond": [{"$gt": ["$active_users", 0]}, {"$divide": ["$transactions", "$active_users"]}, 0]
+        }
+    },
+}
+
+def _report_chunk_stages(report_type: str, params: Dict) -> List[Dict]:
+    """Per-user lookups and the grouping for one report type, after the users $match"""
+    from fx import DEFAULT_CURRENCY
+    
+    if report_type == "cohort_spending":
+        tx_match = {"transaction_type": "expense"}
+        date_query = _date_range(params.get("start"), params.get("end"))
+        if date_query:
+            tx_match["date"] = date_query
+        return [
+            {"$project": {"email": 1, "cohort": {"$ifNull": [
+                {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}, "unknown"
+            ]}}},
+            {"$lookup": {
+                "from": "transactions", "localField": "email", "foreignField": "user_email",
+                "pipeline": [
+                    {"$match": tx_match},
+                    {"$group": {
+                        "_id": {"category": "$category", "currency": {"$ifNull": ["$currency", DEFAULT_CURRENCY]}},
+                        "total": {"$sum": "$amount"},
+                        "count": {"$sum": 1}
+                    }}
+                ],
+                "as": "spend"
+            }},
+            {"$unwind": "$spend"},
+            {"$group": {
+                "_id": {"cohort": "$cohort", "category": "$spend._id.category", "currency": "$spend._id.currency"},
+                "total_spent": {"$sum": "$spend.total"},
+                "transactions": {"$sum": "$spend.count"},
+                "users": {"$sum": 1}
+            }}
+        ]
+    
+    if report_type == "budget_adherence":
+        return [
+            {"$project": {"email": 1}},
+            {"$lookup": {
+                "from": "budgets", "localField": "email", "foreignField": "user_email",
+                "pipeline": [{"$match": {"period": "monthly"}}, {"$project": {"category": 1, "amount": 1}}],
+                "as": "budget"
+            }},
+            {"$unwind": "$budget"},
+            {"$lookup": {
+                "from": "transactions", "localField": "email", "foreignField": "user_email",
+                "let": {"category": "$budget.category"},
+                "pipeline": [
+                    {"$match": {
+                        "transaction_type": "expense",
+                        "date": _date_range(params["start"], params["end"]),
+                        "$expr": {"$eq": ["$category", "$$category"]}
+                    }},
+                    {"$group": {"_id": None, "spent": {"$sum": "$amount"}}}
+                ],
+                "as": "spent"
+            }},
+            {"$addFields": {"spent": {"$ifNull": [{"$arrayElemAt": ["$spent.spent", 0]}, 0]}}},
+            {"$group": {
+                "_id": {"category": "$budget.category"},
+                "budgets": {"$sum": 1},
+                "within_budget": {"$sum": {"$cond": [{"$lte": ["$spent", "$budget.amount"]}, 1, 0]}},
+                "total_budgeted": {"$sum": "$budget.amount"},
+                "total_spent": {"$sum": "$spent"}
+            }}
+        ]
+    
+    if report_type == "role_usage":
+        return [
+            {"$project": {"email": 1, "role": {"$ifNull": ["$role", "user"]}}},
+            {"$lookup": {
+                "from": "transactions", "localField": "email", "foreignField": "user_email",
+                "pipeline": [
+                    {"$match": {"date": {"$gte": params["since"]}}},
+                    {"$group": {"_id": None, "count": {"$sum": 1}}}
+                ],
+                "as": "activity"
+            }},
+            {"$lookup": {
+                "from": "budgets", "localField": "email", "foreignField": "user_email",
+                "pipeline": [{"$count": "count"}],
+                "as": "budget_count"
+            }},
+            {"$addFields": {"transactions": {"$ifNull": [{"$arrayElemAt": ["$activity.count", 0]}, 0]}}},
+            {"$group": {
+                "_id": {"role": "$role"},
+                "users": {"$sum": 1},
+                "active_users": {"$sum": {"$cond": [{"$gt": ["$transactions", 0]}, 1, 0]}},
+                "transactions": {"$sum": "$transactions"},
+                "budgets": {"$sum": {"$ifNull": [{"$arrayElemAt": ["$budget_count.count", 0]}, 0]}}
+            }}
+        ]
+    
+    raise ValueError(f"Unknown report type '{report_type}'")
+
+def _report_key(dimensions: List[str]) -> Dict:
+    """A string key joining the grouped dimensions, used for merging and pagination"""
+    parts = []
+    for dimension in dimensions:
+        if parts:
+            parts.append("|")
+        parts.append({"$toString": {"$ifNull": [f"$_id.{dimension}", ""]}})
+    return {"$concat": parts}
+
+async def aggregate_report_chunk(report_type: str, job_id, chunk: int, after_user_id, last_user_id, params: Dict):
+    """Aggregates one _id range of users into report_partials"""
+    user_range = {"$lte": last_user_id}
+    if after_user_id is not None:
+        user_range["$gt"] = after_user_id
+    dimensions = REPORT_DIMENSIONS[report_type]
+    pipeline = [{"$match": {"_id": user_range}}] + _report_chunk_stages(report_type, params) + [
+        {"$project": {
+            "_id": 0,
+            "job_id": {"$literal": job_id},
+            "chunk": {"$literal": chunk},
+            "key": _report_key(dimensions),
+            **{dimension: f"$_id.{dimension}" for dimension in dimensions},
+            **{metric: 1 for metric in REPORT_METRICS[report_type]}
+        }},
+        {"$merge": {"into": "report_partials", "on": ["job_id", "chunk", "key"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    cursor = get_collection("users").aggregate(pipeline, allowDiskUse=True, maxTimeMS=ANALYTICS_MAX_TIME_MS)
+    await _guard(cursor.to_list(length=None))
+
+async def finalize_report(report_type: str, job_id) -> int:
+    """Sums a job's partials per key into reports and drops the partials; returns the row count"""
+    dimensions = REPORT_DIMENSIONS[report_type]
+    pipeline = [
+        {"$match": {"job_id": job_id}},
+        {"$group": {
+            "_id": "$key",
+            **{dimension: {"$first": f"${dimension}"} for dimension in dimensions},
+            **{metric: {"$sum": f"${metric}"} for metric in REPORT_METRICS[report_type]}
+        }},
+        {"$addFields": REPORT_DERIVED[report_type]},
+        {"$project": {"_id": 0, "job_id": {"$literal": job_id}, "key": "$_id",
+                      **{field: 1 for field in dimensions + REPORT_METRICS[report_type]},
+                      **{field: 1 for field in REPORT_DERIVED[report_type]}}},
+        {"$merge": {"into": "reports", "on": ["job_id", "key"], "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    cursor = get_collection("report_partials").aggregate(pipeline, allowDiskUse=True, maxTimeMS=ANALYTICS_MAX_TIME_MS)
+    await _guard(cursor.to_list(length=None))
+    await delete_report_partials(job_id)
+    return await get_collection("reports").count_documents({"job_id": job_id})
+
+async def delete_report_partials(job_id):
+    await get_collection("report_partials").delete_many({"job_id": job_id})
+
+async def list_report_rows(job_id, after_key: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """A page of report rows in key order"""
+    query = {"job_id": job_id}
+    if after_key is not None:
+        query["key"] = {"$gt": after_key}
+    return await _find("reports", query, REPORT_ROW_FIELDS, limit, sort=("key", 1))
+
+# Data versions
+
+async def read_data_version(email: str) -> int:
+    doc = await _find_one("data_versions", {"_id": email}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+async def read_topic_versions(email: str) -> Dict[str, int]:
+    """Write counters per change topic; topics never written are missing"""
+    doc = await _find_one("data_versions", {"_id": email}, {"topics": 1})
+    return doc.get("topics", {}) if doc else {}
+
+async def increment_data_version(email: str, topic: Optional[str] = None) -> int:
+    from pymongo import ReturnDocument
+    
+    increments = {"version": 1}
+    if topic is not None:
+        increments[f"topics.{topic}"] = 1
+    doc = await get_collection("data_versions").find_one_and_update(
+        {"_id": email},
+        {"$inc": increments},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+# News cache snapshots
+
+async def load_news_snapshot() -> Optional[Dict]:
+    return await _find_one("news_cache", {"_id": "latest"}, {"_id": 0})
+
+async def save_news_snapshot(articles: List[Dict], refreshed_at: datetime):
+    await get_collection("news_cache").replace_one(
+        {"_id": "latest"},
+        {"articles": articles, "refreshed_at": refreshed_at},
+        upsert=True
+    )
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import datetime
+from repository import create_job, get_job, list_jobs, cancel_job, list_report_rows
+from models import AdminJobRequest
+from utils import get_current_admin
+from jobs import parse_params
+
+router = APIRouter()
+
+def _job_response(job):
+    job["_id"] = str(job["_id"])
+    # Parsed dates are stored with the job; show them as the admin sent them
+    job["params"] = {key: value.isoformat() if isinstance(value, datetime) else value
+                     for key, value in job.get("params", {}).items()}
+    return job
+
+@router.post("/jobs")
+async def submit_job(request: AdminJobRequest, admin_email: str = Depends(get_current_admin)):
+    """Queue a cross-user report; poll the job for progress"""
+    params = parse_params(request.type, request.params)
+    now = datetime.utcnow()
+    job_id = await create_job({
+        "type": request.type,
+        "params": params,
+        "status": "queued",
+        "requested_by": admin_email,
+        "processed_users": 0,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now
+    })
+    return {"job_id": str(job_id), "status": "queued"}
+
+@router.get("/jobs")
+async def get_jobs(
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    admin_email: str = Depends(get_current_admin)
+):
+    """List report jobs, newest first"""
+    from bson.objectid import ObjectId
+
+    if cursor is not None and not ObjectId.is_valid(cursor):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    jobs = await list_jobs(status, ObjectId(cursor) if cursor else None, limit)
+    jobs = [_job_response(job) for job in jobs]
+
+    return {"jobs": jobs, "next_cursor": jobs[-1]["_id"] if len(jobs) == limit else None}
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, admin_email: str = Depends(get_current_admin)):
+    """Get a job's status and progress"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return _job_response(job)
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_report_job(job_id: str, admin_email: str = Depends(get_current_admin)):
+    """Cancel a queued or running job"""
+    if not await cancel_job(job_id):
+        raise HTTPException(status_code=404, detail="No queued or running job with that id")
+
+    return {"message": "Job cancelled"}
+
+@router.get("/reports/{job_id}")
+async def get_report(
+    job_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    admin_email: str = Depends(get_current_admin)
+):
+    """Get a finished job's report rows in key order, a page at a time"""
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Report is not ready (job is {job['status']})")
+
+    rows = await list_report_rows(job["_id"], cursor, limit)
+    return {
+        "type": job["type"],
+        "rows": rows,
+        "next_cursor": rows[-1]["key"] if len(rows) == limit else None
+    }
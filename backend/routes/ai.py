@@ -1,57 +1,51 @@
 from fastapi import APIRouter, HTTPException, Depends, Header
 from typing import Optional
-from database import transactions_collection, users_collection
-from utils import generate_ai_suggestion, verify_token
-import openai
+from repository import get_risk_tolerance, get_spending_rows
+from utils import generate_ai_suggestion, get_current_user, get_openai
+from user_cache import user_cache
+from transaction_cache import transaction_cache
+from fx import get_user_currency, convert_rows, rates_version
+from versioning import get_data_version, make_etag, cached_response
+import events
 from datetime import datetime, timedelta
 
 router = APIRouter()
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-    
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
-    return payload["email"]
-
 async def get_user_financial_context(user_email):
-    """Get user's financial context for personalized advice"""
-    # Get user profile
-    user = await users_collection.find_one({"email": user_email})
-    
+    """Get user's financial context for personalized advice, cached until their transactions or profile change"""
+    return await user_cache.get_or_compute(
+        user_email, "financial_context", rates_version(),
+        (events.TRANSACTIONS, events.PROFILE),
+        lambda: build_financial_context(user_email)
+    )
+
+async def build_financial_context(user_email):
+    """Computes the financial context from the last 30 days of transactions"""
     # Get recent transactions
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
     
-    cursor = transactions_collection.find({
-        "user_email": user_email,
-        "date": {"$gte": start_date, "$lte": end_date}
-    })
-    transactions = await cursor.to_list(length=1000)
+    # Read before the transactions, so a write made by another worker is never missed
+    version = await get_data_version(user_email)
+    currency = await get_user_currency(user_email)
+    transactions = await transaction_cache.window(user_email, version, start_date, end_date, currency)
     
     # Calculate financial context
-    income = sum(tx["amount"] for tx in transactions if tx.get("transaction_type") == "income")
-    expenses = sum(tx["amount"] for tx in transactions if tx.get("transaction_type") == "expense")
+    income = transactions.total("income")
+    expenses = transactions.total("expense")
     
     # Get top spending categories
-    categories = {}
-    for tx in transactions:
-        if tx.get("transaction_type") == "expense":
-            category = tx.get("category", "Other")
-            if category in categories:
-                categories[category] += tx.get("amount", 0)
-            else:
-                categories[category] = tx.get("amount", 0)
+    categories = transactions.category_totals("expense")
     
     top_category = max(categories.items(), key=lambda x: x[1])[0] if categories else "Unknown"
     
     return {
+        "currency": currency,
         "monthly_income": income,
         "monthly_expenses": expenses,
         "transaction_count": len(transactions),
         "top_category": top_category,
-        "risk_tolerance": user.get("risk_tolerance", 5)
+        "risk_tolerance": await get_risk_tolerance(user_email)
     }
 
 @router.get("/api/ai/suggest")
@@ -73,35 +67,47 @@ async def get_financial_suggestion(user_email: str = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating suggestion: {str(e)}")
 
+async def compute_transaction_analysis(user_email: str, transaction_data: dict):
+    """Asks the model whether a potential transaction fits the user's finances"""
+    # Get user's financial context
+    user_context = await get_user_financial_context(user_email)
+    
+    # Create a prompt for the transaction analysis
+    prompt = f"""
+    Analyze this potential {transaction_data.get('category')} transaction of {transaction_data.get('amount')} for financial impact.
+    
+    User Financial Context:
+    - Monthly Income: {user_context['monthly_income']} {user_context['currency']}
+    - Monthly Expenses: {user_context['monthly_expenses']} {user_context['currency']}
+    - Top Spending Category: {user_context['top_category']}
+    
+    Provide a brief analysis of whether this transaction aligns with good financial practices.
+    """
+    
+    openai = get_openai()
+    response = openai.ChatCompletion.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a financial advisor providing concise transaction analysis."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=200
+    )
+    
+    return {"analysis": response.choices[0].message.content.strip()}
+
 @router.post("/analyze-transaction")
 async def analyze_transaction(transaction_data: dict, user_email: str = Depends(get_current_user)):
-    """Analyze a potential transaction and provide AI-powered insights"""
+    """Analyze a potential transaction and provide AI-powered insights, once per host per data version"""
+    # The analysis depends on the transaction (a stored one's id, or just its
+    # category and amount) and on the user's data through the financial
+    # context, so those key the result
+    version = await get_data_version(user_email)
+    key = make_etag(user_email, version, "ai/analyze-transaction", rates_version(),
+                    transaction_data.get("transaction_id"), transaction_data.get("category"),
+                    transaction_data.get("amount"))
     try:
-        # Get user's financial context
-        user_context = await get_user_financial_context(user_email)
-        
-        # Create a prompt for the transaction analysis
-        prompt = f"""
-        Analyze this potential {transaction_data.get('category')} transaction of {transaction_data.get('amount')} for financial impact.
-        
-        User Financial Context:
-        - Monthly Income: {user_context['monthly_income']}
-        - Monthly Expenses: {user_context['monthly_expenses']}
-        - Top Spending Category: {user_context['top_category']}
-        
-        Provide a brief analysis of whether this transaction aligns with good financial practices.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a financial advisor providing concise transaction analysis."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200
-        )
-        
-        return {"analysis": response.choices[0].message.content.strip()}
+        return await cached_response(key, lambda: compute_transaction_analysis(user_email, transaction_data))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing transaction: {str(e)}")
 
@@ -113,12 +119,9 @@ async def get_budget_insights(user_email: str = Depends(get_current_user)):
         end_date = datetime.now()
         start_date = end_date - timedelta(days=90)
         
-        cursor = transactions_collection.find({
-            "user_email": user_email,
-            "date": {"$gte": start_date, "$lte": end_date},
-            "transaction_type": "expense"
-        })
-        transactions = await cursor.to_list(length=1000)
+        transactions = await get_spending_rows(user_email, start_date, end_date, transaction_type="expense", analytics=True)
+        currency = await get_user_currency(user_email)
+        convert_rows(transactions, currency)
         
         # Categorize and sum transactions
         categories = {}
@@ -132,7 +135,7 @@ async def get_budget_insights(user_email: str = Depends(get_current_user)):
         # Create a prompt for budget insights
         category_breakdown = "\n".join([f"- {cat}: {amt}" for cat, amt in categories.items()])
         prompt = f"""
-        Analyze this user's spending in the last 90 days:
+        Analyze this user's spending in the last 90 days (amounts in {currency}):
         
         {category_breakdown}
         
@@ -140,6 +143,7 @@ async def get_budget_insights(user_email: str = Depends(get_current_user)):
         Keep suggestions concise and focused on practical ways to optimize spending.
         """
         
+        openai = get_openai()
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
             messages=[
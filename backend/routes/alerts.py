@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from repository import list_alerts, count_unread_alerts, mark_alert_read, mark_all_alerts_read
+from spending_detector import detector
+from utils import get_current_user
+
+router = APIRouter()
+
+@router.get("/")
+async def get_alerts(
+    unread_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    user_email: str = Depends(get_current_user)
+):
+    """Get spending alerts (anomalies, spending spikes, possible subscriptions), newest first"""
+    alerts = await list_alerts(user_email, unread_only, limit)
+    for alert in alerts:
+        alert["_id"] = str(alert["_id"])
+    
+    return {"alerts": alerts, "unread_count": await count_unread_alerts(user_email)}
+
+@router.post("/read-all")
+async def read_all_alerts(user_email: str = Depends(get_current_user)):
+    """Mark every alert as read"""
+    updated = await mark_all_alerts_read(user_email)
+    return {"message": f"{updated} alerts marked as read"}
+
+@router.post("/{alert_id}/read")
+async def read_alert(alert_id: str, user_email: str = Depends(get_current_user)):
+    """Mark one alert as read"""
+    if not await mark_alert_read(user_email, alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    return {"message": "Alert marked as read"}
+
+@router.get("/recurring")
+async def get_recurring_charges(user_email: str = Depends(get_current_user)):
+    """Get detected recurring charges with their next expected date"""
+    return {"recurring": await detector.recurring(user_email)}
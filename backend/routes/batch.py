@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from typing import Dict, Optional
+from urllib.parse import urlencode
+from models import BatchItem, BatchRequest
+from utils import get_current_user
+import asyncio
+import json
+import os
+
+router = APIRouter()
+
+MAX_BATCH_SIZE = 20
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", 30))
+
+# Routes that never finish (streams) or would recurse cannot be batched
+EXCLUDED_PATHS = ("/batch", "/market/stream")
+
+async def dispatch(app, item: BatchItem, user_email: str, authorization: Optional[str]) -> Dict:
+    """Runs one GET sub-request through the ASGI app in-process.
+
+    The already-authenticated user is passed in the request state, so the
+    sub-request skips token verification. It goes through admission control
+    like any request, in its own route class; the batch's Authorization
+    header gives it the same priority.
+    """
+    path = item.path.split("?", 1)[0]
+    headers = [(b"host", b"batch")]
+    if authorization:
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(item.params, doseq=True).encode(),
+        "headers": headers,
+        "client": None,
+        "server": None,
+        # Already authenticated as part of the batch
+        "state": {"user_email": user_email},
+    }
+    
+    response = {"status": 500, "headers": {}, "body": b""}
+    request_sent = False
+    
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Nothing more will arrive; park until the sub-request completes
+        await asyncio.Event().wait()
+    
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+    
+    await app(scope, receive, send)
+    
+    body = response["body"]
+    if response["headers"].get("content-type", "").startswith("application/json") and body:
+        body = json.loads(body)
+    else:
+        body = body.decode() or None
+    
+    result = {"id": item.id, "path": item.path, "status": response["status"], "body": body}
+    if "etag" in response["headers"]:
+        result["etag"] = response["headers"]["etag"]
+    return result
+
+async def run_item(app, item: BatchItem, user_email: str, authorization: Optional[str]) -> Dict:
+    if item.path.split("?", 1)[0].rstrip("/") in EXCLUDED_PATHS:
+        return {"id": item.id, "path": item.path, "status": 400, "body": {"detail": "Route cannot be batched"}}
+    try:
+        return await asyncio.wait_for(dispatch(app, item, user_email, authorization), BATCH_ITEM_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"id": item.id, "path": item.path, "status": 504, "body": {"detail": "Sub-request timed out"}}
+    except Exception as e:
+        return {"id": item.id, "path": item.path, "status": 500, "body": {"detail": str(e)}}
+
+@router.post("")
+async def run_batch(batch: BatchRequest, request: Request, user_email: str = Depends(get_current_user)):
+    """Run several GET requests concurrently with a single authentication.
+
+    Each result carries its own status, so one failing sub-request does not
+    fail the batch; total latency is that of the slowest sub-request.
+    """
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one request")
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch cannot contain more than {MAX_BATCH_SIZE} requests")
+    
+    authorization = request.headers.get("authorization")
+    results = await asyncio.gather(*[
+        run_item(request.app, item, user_email, authorization) for item in batch.requests
+    ])
+    return {"responses": results}
@@ -1,19 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from typing import List, Optional
-from database import users_collection, transactions_collection
+from repository import get_user_budgets, budget_exists, add_budget, update_budget as set_budget_fields, delete_budget as remove_budget, get_budget_history, get_spending_rows
 from models import Budget
-from utils import verify_token, calculate_budget_status
+from utils import get_current_user, calculate_budget_status
+from fx import get_user_currency, convert_rows, rates_version, rates_available
+from transaction_cache import transaction_cache
+import events
+from versioning import get_data_version, bump_data_version, make_etag, etag_matches, not_modified, set_etag_headers
 from datetime import datetime
 
 router = APIRouter()
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-    
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
-    return payload["email"]
+# Budgets are keyed by category and period; routes addressing one default to monthly
+PERIOD_QUERY = Query("monthly", description="Budget period: monthly, weekly or yearly")
 
 @router.post("/")
 async def create_budget(budget: Budget, user_email: str = Depends(get_current_user)):
@@ -21,36 +20,37 @@ async def create_budget(budget: Budget, user_email: str = Depends(get_current_us
     if budget.user_email != user_email:
         raise HTTPException(status_code=403, detail="Not authorized to create budget for another user")
     
-    # Check if budget for this category already exists
-    existing_budget = await users_collection.find_one({
-        "email": user_email,
-        "budgets.category": budget.category
-    })
-    
-    if existing_budget:
+    # Check if budget for this category and period already exists
+    if await budget_exists(user_email, budget.category, budget.period):
         raise HTTPException(status_code=400, detail=f"Budget for category '{budget.category}' already exists")
     
-    # Add budget to user document
+    # Add budget to the budgets collection (the unique index also catches races)
     budget_dict = budget.dict()
-    result = await users_collection.update_one(
-        {"email": user_email},
-        {"$push": {"budgets": budget_dict}}
-    )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="User not found")
+    if not await add_budget(budget_dict):
+        raise HTTPException(status_code=400, detail=f"Budget for category '{budget.category}' already exists")
     
+    await bump_data_version(user_email, events.BUDGETS)
     return {"message": f"Budget for {budget.category} created successfully"}
 
 @router.get("/")
-async def get_budgets(user_email: str = Depends(get_current_user)):
+async def get_budgets(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
     """Get all budgets for a user with status"""
-    user = await users_collection.find_one({"email": user_email})
+    # Budget status is computed over the current month at the current rates,
+    # so the day and the rates version are part of the validator
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "budgets", datetime.now().date(), rates_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
     
-    if not user or "budgets" not in user:
-        return {"budgets": []}
+    budgets = await get_user_budgets(user_email)
     
-    budgets = user.get("budgets", [])
+    if not budgets:
+        return {"budgets": []}
     
     # Get current date for budget period calculation
     current_date = datetime.now()
@@ -58,13 +58,11 @@ async def get_budgets(user_email: str = Depends(get_current_user)):
     # Get all transactions for this month to calculate budget status
     month_start = datetime(current_date.year, current_date.month, 1)
     
-    cursor = transactions_collection.find({
-        "user_email": user_email,
-        "date": {"$gte": month_start, "$lte": current_date},
-        "transaction_type": "expense"
-    })
-    
-    transactions = await cursor.to_list(length=1000)
+    # Budgets are set in the user's base currency
+    currency = await get_user_currency(user_email)
+    transactions = await transaction_cache.window(
+        user_email, version, month_start, current_date, currency, transaction_type="expense"
+    )
     
     # Calculate status for each budget
     budget_statuses = []
@@ -75,12 +73,13 @@ async def get_budgets(user_email: str = Depends(get_current_user)):
             **status
         })
     
-    return {"budgets": budget_statuses}
+    return {"budgets": budget_statuses, "rates_available": rates_available(currency)}
 
 @router.put("/{category}")
 async def update_budget(
     category: str, 
     budget_update: dict,
+    period: str = PERIOD_QUERY,
     user_email: str = Depends(get_current_user)
 ):
     """Update an existing budget"""
@@ -88,54 +87,59 @@ async def update_budget(
     if "user_email" in budget_update:
         del budget_update["user_email"]
     
-    result = await users_collection.update_one(
-        {
-            "email": user_email,
-            "budgets.category": category
-        },
-        {"$set": {f"budgets.$.{key}": value for key, value in budget_update.items()}}
-    )
+    updated = await set_budget_fields(user_email, category, period, budget_update)
     
-    if result.matched_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail=f"Budget for category '{category}' not found")
     
+    await bump_data_version(user_email, events.BUDGETS)
     return {"message": f"Budget for {category} updated successfully"}
 
 @router.delete("/{category}")
-async def delete_budget(category: str, user_email: str = Depends(get_current_user)):
+async def delete_budget(category: str, period: str = PERIOD_QUERY, user_email: str = Depends(get_current_user)):
     """Delete a budget"""
-    result = await users_collection.update_one(
-        {"email": user_email},
-        {"$pull": {"budgets": {"category": category}}}
-    )
-    
-    if result.modified_count == 0:
+    if not await remove_budget(user_email, category, period):
         raise HTTPException(status_code=404, detail=f"Budget for category '{category}' not found")
     
+    await bump_data_version(user_email, events.BUDGETS)
     return {"message": f"Budget for {category} deleted successfully"}
 
+@router.get("/{category}/history")
+async def get_budget_versions(category: str, period: str = PERIOD_QUERY, user_email: str = Depends(get_current_user)):
+    """Get the recorded versions of a budget, newest first"""
+    history = await get_budget_history(user_email, category, period)
+    
+    if not history:
+        raise HTTPException(status_code=404, detail=f"No history for budget '{category}'")
+    
+    return {"history": history}
+
 @router.get("/analysis")
-async def get_budget_analysis(user_email: str = Depends(get_current_user)):
+async def get_budget_analysis(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
     """Get an analysis of budget performance"""
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "budgets/analysis", datetime.now().date(), rates_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+    
     # Get user budgets
-    user = await users_collection.find_one({"email": user_email})
-    if not user or "budgets" not in user:
+    budgets = await get_user_budgets(user_email)
+    if not budgets:
         raise HTTPException(status_code=404, detail="No budgets found")
     
-    budgets = user.get("budgets", [])
-    
     # Get transactions from the last 3 months
     current_date = datetime.now()
     three_months_ago = datetime(current_date.year, current_date.month - 3, 1) if current_date.month > 3 else \
                        datetime(current_date.year - 1, current_date.month + 9, 1)
     
-    cursor = transactions_collection.find({
-        "user_email": user_email,
-        "date": {"$gte": three_months_ago, "$lte": current_date},
-        "transaction_type": "expense"
-    })
-    
-    transactions = await cursor.to_list(length=1000)
+    transactions = await get_spending_rows(user_email, three_months_ago, current_date, transaction_type="expense")
+    currency = await get_user_currency(user_email)
+    convert_rows(transactions, currency)
     
     # Group transactions by month and category
     monthly_spending = {}
@@ -176,4 +180,4 @@ async def get_budget_analysis(user_email: str = Depends(get_current_user)):
         
         budget_analysis.append(category_analysis)
     
-    return {"budget_analysis": budget_analysis}
+    return {"budget_analysis": budget_analysis, "rates_available": rates_available(currency)}
@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Depends, Header, Query, Response
+from typing import Optional
+from repository import get_dashboard_facets, get_user_budgets
+from utils import get_current_user, budget_status_from_spent
+from fx import get_user_currency, convert_rows, rates_version, rates_available
+from versioning import get_data_version, make_etag, etag_matches, not_modified, set_etag_headers, cached_response
+from datetime import date, datetime, timedelta
+import asyncio
+
+router = APIRouter()
+
+PERIOD_DAYS = {"week": 7, "month": 30, "year": 365}
+
+def daily_total(row: dict, field: str) -> dict:
+    """Flattens a per-(currency, day) facet group into a convertible row"""
+    group = row["_id"]
+    return {
+        "category": group.get("category"),
+        "type": group.get("type"),
+        "currency": group.get("currency"),
+        "date": date.fromisoformat(group["day"]) if group.get("day") else None,
+        "amount": row[field],
+        "count": row.get("count", 0)
+    }
+
+@router.get("/snapshot")
+async def get_dashboard_snapshot(
+    response: Response,
+    period: Optional[str] = "month",
+    recent: int = Query(10, ge=1, le=50, description="Number of recent transactions to include"),
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
+    """Recent transactions, period totals, top categories and budget status in one response"""
+    now = datetime.now()
+    
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "dashboard/snapshot", period, recent, now.date(), rates_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+    return await cached_response(etag, lambda: build_snapshot(user_email, period, recent, now))
+
+async def build_snapshot(user_email: str, period: Optional[str], recent: int, now: datetime) -> dict:
+    period_start = now - timedelta(days=PERIOD_DAYS.get(period, 30))
+    month_start = datetime(now.year, now.month, 1)
+    
+    # The budget lookup overlaps the aggregation instead of adding a round trip
+    facets, user_budgets, currency = await asyncio.gather(
+        get_dashboard_facets(user_email, period_start, month_start, now, recent),
+        get_user_budgets(user_email),
+        get_user_currency(user_email)
+    )
+    
+    # Totals come back per (currency, day); convert them all at once at each day's rate
+    period_totals = convert_rows([daily_total(row, "total") for row in facets["period_totals"]], currency)
+    budget_spent = convert_rows([daily_total(row, "spent") for row in facets["budget_spent"]], currency)
+    
+    totals = {}
+    categories = {}
+    transaction_count = 0
+    for row in period_totals:
+        tx_type = row["type"]
+        totals[tx_type] = totals.get(tx_type, 0) + row["amount"]
+        transaction_count += row["count"]
+        if tx_type == "expense":
+            categories[row["category"]] = categories.get(row["category"], 0) + row["amount"]
+    
+    spent_by_category = {}
+    for row in budget_spent:
+        spent_by_category[row["category"]] = spent_by_category.get(row["category"], 0) + row["amount"]
+    budgets = [
+        {**budget, **budget_status_from_spent(budget, spent_by_category.get(budget["category"], 0))}
+        for budget in user_budgets or []
+    ]
+    
+    return {
+        "period": period,
+        "currency": currency,
+        "rates_available": rates_available(currency),
+        "recent_transactions": facets["recent"],
+        "totals": totals,
+        "transaction_count": transaction_count,
+        "category_totals": categories,
+        "top_spending_categories": sorted(categories.items(), key=lambda x: x[1], reverse=True)[:3],
+        "budgets": budgets
+    }
@@ -0,0 +1,111 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Response, Query
+from typing import Optional
+from pydantic import ValidationError
+from repository import insert_goal, list_goals, get_goal, update_goal as set_goal_fields, delete_goal as remove_goal
+from models import FinancialGoal
+from utils import get_current_user
+from projections import project_goals, PROJECTION_PATHS
+from fx import rates_version
+import events
+from versioning import get_data_version, bump_data_version, make_etag, etag_matches, not_modified, set_etag_headers
+from datetime import datetime
+
+router = APIRouter()
+
+# Goal fields a client update may not overwrite
+PROTECTED_GOAL_FIELDS = {"_id", "user_email"}
+
+@router.post("/")
+async def create_goal(goal: FinancialGoal, user_email: str = Depends(get_current_user)):
+    """Create a savings goal (amounts in the user's base currency)"""
+    if goal.user_email != user_email:
+        raise HTTPException(status_code=403, detail="Not authorized to create a goal for another user")
+
+    goal_id = await insert_goal(goal.dict())
+    await bump_data_version(user_email, events.GOALS)
+    return {"message": f"Goal '{goal.name}' created successfully", "goal_id": str(goal_id)}
+
+@router.get("/")
+async def get_goals(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
+    """Get all goals, highest priority first"""
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "goals")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+
+    goals = await list_goals(user_email)
+    for goal in goals:
+        goal["_id"] = str(goal["_id"])
+
+    return {"goals": goals}
+
+@router.get("/projection")
+async def get_goal_projections(
+    response: Response,
+    paths: int = Query(PROJECTION_PATHS, ge=1000, le=200000),
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
+    """Estimate the probability of reaching each goal by its deadline.
+
+    Simulates market returns (by risk tolerance) and monthly savings (from the
+    last 12 months of income and expenses, split across goals by priority).
+    """
+    # Horizons count whole months from today, and savings are converted at current rates
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "goals/projection", paths, datetime.now().date(), rates_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+
+    goals = await list_goals(user_email)
+    if not goals:
+        raise HTTPException(status_code=404, detail="No goals found")
+
+    return await project_goals(user_email, goals, paths)
+
+@router.get("/{goal_id}")
+async def get_goal_details(goal_id: str, user_email: str = Depends(get_current_user)):
+    """Get one goal"""
+    goal = await get_goal(user_email, goal_id)
+    if goal is None:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    goal["_id"] = str(goal["_id"])
+    return goal
+
+@router.put("/{goal_id}")
+async def update_goal(goal_id: str, goal_update: dict, user_email: str = Depends(get_current_user)):
+    """Update a goal's fields"""
+    goal = await get_goal(user_email, goal_id)
+    if goal is None:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    fields = {key: value for key, value in goal_update.items() if key not in PROTECTED_GOAL_FIELDS}
+    try:
+        updated = FinancialGoal(**{**goal, **fields, "user_email": user_email})
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid goal update: {e.errors()[0]['msg']}")
+
+    new_fields = {key: value for key, value in updated.dict().items() if key in fields}
+    if not new_fields:
+        raise HTTPException(status_code=400, detail="No goal fields to update")
+    if not await set_goal_fields(user_email, goal_id, new_fields):
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    await bump_data_version(user_email, events.GOALS)
+    return {"message": "Goal updated successfully"}
+
+@router.delete("/{goal_id}")
+async def delete_goal(goal_id: str, user_email: str = Depends(get_current_user)):
+    """Delete a goal"""
+    if not await remove_goal(user_email, goal_id):
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    await bump_data_version(user_email, events.GOALS)
+    return {"message": "Goal deleted successfully"}
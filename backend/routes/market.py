@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, Cookie
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-import requests
+import asyncio
+import json
 import os
-from database import transactions_collection
-from utils import verify_token
-import pandas as pd
+import re
+from repository import get_investments, get_investment_symbols, get_risk_tolerance
+from price_stream import PriceHub
+from quotes import get_stock_quote, get_crypto_quote, upstream_stats, QUOTE_TIMEOUT_SECONDS
+from utils import verify_token, get_current_user, SECRET_KEY
+from fx import get_user_currency, convert_rows, convert_amount, rates_available
 from datetime import datetime, timedelta
 import logging
 
@@ -18,61 +23,37 @@ FINANCIAL_MODELING_API_KEY = os.getenv("FINANCIAL_MODELING_API_KEY")
 if not STOCK_API_KEY or not CRYPTO_API_KEY:
     logging.warning("API keys for stock or crypto are not configured. Some features may not work properly.")
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-    
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
-    return payload["email"]
+# Live price streaming: one upstream poll per symbol is shared by all subscribers
+PRICE_POLL_SECONDS = float(os.getenv("PRICE_POLL_SECONDS", 30))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
+MAX_STREAM_SYMBOLS = 50
+STREAM_ASSET_TYPES = ("stock", "crypto")
+# Ticker symbols and CoinGecko ids; anything else never reaches an upstream poller
+STREAM_SYMBOL_PATTERN = re.compile(r"^[A-Za-z0-9.\-]{1,32}$")
+# EventSource cannot send headers, so browsers authenticate streams with a
+# short-lived ticket in an HttpOnly cookie instead of a token in the URL
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", 300))
+STREAM_TICKET_AUDIENCE = "price_stream"
+STREAM_TICKET_COOKIE = "stream_ticket"
+# Cross-site cookies must be Secure; turn off only for local development over http
+STREAM_COOKIE_SECURE = os.getenv("STREAM_COOKIE_SECURE", "true").lower() == "true"
 
 @router.get("/stock/{symbol}")
-def get_stock_price(symbol: str):
-    try:
-        url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={STOCK_API_KEY}"
-        response = requests.get(url).json()
-        if "Global Quote" in response and response["Global Quote"]:
-            data = response["Global Quote"]
-            return {
-                "symbol": symbol, 
-                "price": float(data["05. price"]),
-                "change_percent": data["10. change percent"],
-                "high": data["03. high"],
-                "low": data["04. low"],
-                "volume": data["06. volume"]
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Invalid Stock Symbol or API limit reached")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching stock price: {str(e)}")
+async def get_stock_price(symbol: str):
+    """Get a stock quote (marked stale when served from the last known value)"""
+    return await get_stock_quote(symbol)
 
 @router.get("/crypto/{symbol}")
-def get_crypto_price(symbol: str):
-    try:
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={symbol}&vs_currencies=usd,inr&include_24hr_change=true"
-        response = requests.get(url).json()
-        if symbol in response:
-            data = response[symbol]
-            return {
-                "symbol": symbol, 
-                "price_usd": data["usd"],
-                "price_inr": data["inr"],
-                "change_24h_percent": data.get("usd_24h_change", 0)
-            }
-        else:
-            raise HTTPException(status_code=400, detail="Invalid Crypto Symbol")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching crypto price: {str(e)}")
+async def get_crypto_price(symbol: str):
+    """Get a cryptocurrency quote (marked stale when served from the last known value)"""
+    return await get_crypto_quote(symbol)
 
 @router.get("/portfolio")
 async def get_portfolio_overview(user_email: str = Depends(get_current_user)):
     """Get overview of user's investment portfolio"""
-    # Fetch all investment transactions
-    cursor = transactions_collection.find({
-        "user_email": user_email,
-        "transaction_type": "investment"
-    })
-    investments = await cursor.to_list(length=1000)
+    # Fetch all investment transactions, with amounts in the user's base currency
+    currency = await get_user_currency(user_email)
+    investments = convert_rows(await get_investments(user_email), currency)
     
     # Group by asset
     portfolio = {}
@@ -89,38 +70,53 @@ async def get_portfolio_overview(user_email: str = Depends(get_current_user)):
         portfolio[symbol]["total_quantity"] += inv.get("quantity", 0)
         portfolio[symbol]["total_invested"] += inv.get("amount", 0)
     
-    # Get current prices for each asset
+    # Get current prices for every asset concurrently
     portfolio_list = list(portfolio.values())
-    for asset in portfolio_list:
+    quotes = await asyncio.gather(*[fetch_asset_quote(asset) for asset in portfolio_list], return_exceptions=True)
+    for asset, price_data in zip(portfolio_list, quotes):
         try:
+            if isinstance(price_data, Exception):
+                raise price_data
+            # Quotes are in USD
             if asset["asset_type"] == "stock":
-                price_data = get_stock_price(asset["symbol"])
-                asset["current_price"] = price_data["price"]
+                asset["current_price"] = convert_amount(price_data["price"], "USD", currency)
             elif asset["asset_type"] == "crypto":
-                price_data = get_crypto_price(asset["symbol"])
-                asset["current_price"] = price_data["price_usd"]
+                asset["current_price"] = convert_amount(price_data["price_usd"], "USD", currency)
+            if price_data and price_data.get("stale"):
+                asset["price_as_of"] = price_data["as_of"]
                 
             # Calculate current value and profit/loss
             asset["current_value"] = asset["current_price"] * asset["total_quantity"]
             asset["profit_loss"] = asset["current_value"] - asset["total_invested"]
             asset["profit_loss_percent"] = (asset["profit_loss"] / asset["total_invested"]) * 100 if asset["total_invested"] > 0 else 0
+        except HTTPException as e:
+            asset["error"] = f"Unable to fetch current price: {e.detail}"
         except Exception as e:
             asset["error"] = f"Unable to fetch current price: {str(e)}"
     
-    return {"portfolio": portfolio_list}
+    return {"portfolio": portfolio_list, "currency": currency, "rates_available": rates_available(currency)}
+
+async def fetch_asset_quote(asset):
+    if asset["asset_type"] == "stock":
+        return await get_stock_quote(asset["symbol"])
+    if asset["asset_type"] == "crypto":
+        return await get_crypto_quote(asset["symbol"])
+    return None
 
 @router.get("/trending")
 def get_trending_assets():
     """Get trending stocks and cryptocurrencies"""
+    import requests
+    
     try:
         # Get trending stocks
         stocks_url = f"https://financialmodelingprep.com/api/v3/stock/gainers?apikey={FINANCIAL_MODELING_API_KEY}"
-        stocks_response = requests.get(stocks_url).json()
+        stocks_response = requests.get(stocks_url, timeout=QUOTE_TIMEOUT_SECONDS).json()
         trending_stocks = stocks_response.get("mostGainerStock", [])[:5]
         
         # Get trending cryptos
         crypto_url = "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=5&page=1&sparkline=false"
-        crypto_response = requests.get(crypto_url).json()
+        crypto_response = requests.get(crypto_url, timeout=QUOTE_TIMEOUT_SECONDS).json()
         
         return {
             "trending_stocks": trending_stocks,
@@ -133,8 +129,7 @@ def get_trending_assets():
 async def get_investment_recommendations(user_email: str = Depends(get_current_user)):
     """Get personalized investment recommendations based on user's profile"""
     # Get user profile for risk tolerance
-    user = await users_collection.find_one({"email": user_email})
-    risk_tolerance = user.get("risk_tolerance", 5)  # Default to medium risk
+    risk_tolerance = await get_risk_tolerance(user_email)  # Defaults to medium risk
     
     recommendations = {
         "message": f"Based on your risk profile (level {risk_tolerance}/10), here are some recommendations:",
@@ -159,3 +154,123 @@ async def get_investment_recommendations(user_email: str = Depends(get_current_u
         ])
     
     return recommendations
+
+async def fetch_quote(symbol_key: str):
+    """Fetches a quote for a streamed symbol of the form <asset_type>:<symbol>"""
+    asset_type, symbol = symbol_key.split(":", 1)
+    if asset_type == "stock":
+        return await get_stock_quote(symbol)
+    return await get_crypto_quote(symbol)
+
+price_hub = PriceHub(fetch_quote, PRICE_POLL_SECONDS)
+
+def parse_stream_symbols(symbols: Optional[str]) -> List[str]:
+    """Validates a comma-separated list such as stock:AAPL,crypto:bitcoin"""
+    parsed = []
+    for item in (symbols or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        asset_type, _, symbol = item.partition(":")
+        if asset_type not in STREAM_ASSET_TYPES or not STREAM_SYMBOL_PATTERN.match(symbol):
+            raise HTTPException(status_code=400, detail=f"Invalid stream symbol '{item}', expected stock:<symbol> or crypto:<id>")
+        parsed.append(f"{asset_type}:{symbol}")
+    return parsed
+
+async def get_portfolio_symbols(user_email: str) -> List[str]:
+    """Streamable symbols for every asset in the user's portfolio"""
+    investments = await get_investment_symbols(user_email)
+    return [
+        f"{inv.get('asset_type', 'stock')}:{inv['symbol']}"
+        for inv in investments
+        if inv.get("symbol") and inv.get("asset_type", "stock") in STREAM_ASSET_TYPES
+    ]
+
+@router.post("/stream/ticket")
+async def create_stream_ticket(response: Response, user_email: str = Depends(get_current_user)):
+    """Sets a short-lived cookie that authenticates /market/stream (and nothing else)"""
+    import jwt
+    
+    ticket = jwt.encode({
+        "email": user_email,
+        "aud": STREAM_TICKET_AUDIENCE,
+        "exp": datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    }, SECRET_KEY, algorithm="HS256")
+    response.set_cookie(
+        STREAM_TICKET_COOKIE, ticket,
+        max_age=STREAM_TICKET_SECONDS,
+        path="/market/stream",
+        httponly=True,
+        secure=STREAM_COOKIE_SECURE,
+        samesite="none" if STREAM_COOKIE_SECURE else "lax"
+    )
+    return {"expires_in": STREAM_TICKET_SECONDS}
+
+async def get_stream_user(authorization: Optional[str], stream_ticket: Optional[str]) -> str:
+    """The user a stream is for, from a bearer token or the stream ticket cookie"""
+    if authorization and authorization.startswith("Bearer "):
+        payload = await verify_token(authorization.split(" ")[1])
+    elif stream_ticket:
+        payload = await verify_token(stream_ticket, audience=STREAM_TICKET_AUDIENCE)
+    else:
+        raise HTTPException(status_code=401, detail="Price streams require a bearer token or a stream ticket")
+    return payload["email"]
+
+@router.get("/stream")
+async def stream_prices(
+    request: Request,
+    symbols: Optional[str] = Query(None, description="Comma-separated symbols, e.g. stock:AAPL,crypto:bitcoin"),
+    portfolio: bool = Query(False, description="Also stream every asset in the user's portfolio"),
+    authorization: Optional[str] = Header(None),
+    stream_ticket: Optional[str] = Cookie(None),
+    last_event_id: Optional[int] = Header(None)
+):
+    """Stream live price updates as Server-Sent Events.
+
+    Clients authenticate with a bearer token or, from a browser, with the
+    cookie set by POST /market/stream/ticket. Reconnecting clients send
+    Last-Event-ID (EventSource does this automatically) and receive only
+    the symbols that changed since then.
+    """
+    user_email = await get_stream_user(authorization, stream_ticket)
+    stream_symbols = parse_stream_symbols(symbols)
+    
+    if portfolio:
+        stream_symbols += await get_portfolio_symbols(user_email)
+    
+    stream_symbols = list(dict.fromkeys(stream_symbols))
+    if not stream_symbols:
+        raise HTTPException(status_code=400, detail="No symbols to stream")
+    if len(stream_symbols) > MAX_STREAM_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STREAM_SYMBOLS} symbols can be streamed")
+    
+    subscriber = price_hub.subscribe(stream_symbols, last_event_id)
+    
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                updates = await subscriber.next_batch(STREAM_HEARTBEAT_SECONDS)
+                if not updates:
+                    yield ": heartbeat\n\n"
+                    continue
+                for update in updates:
+                    yield f"id: {update['seq']}\nevent: price\ndata: {json.dumps(update)}\n\n"
+        finally:
+            price_hub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stream/stats")
+def get_stream_stats():
+    """Subscriber and upstream-call counters for the price stream"""
+    return price_hub.stats()
+
+@router.get("/upstream/stats")
+def get_upstream_stats():
+    """Circuit breaker state, hedge win rates and latencies per quote provider"""
+    return upstream_stats()
@@ -1,20 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from typing import List, Optional
-from database import transactions_collection, users_collection  # Fixed database import
+from repository import insert_transaction, list_transactions, delete_transaction as remove_transaction, search_transactions
 from models import Transaction, Budget
-from utils import validate_transaction, verify_token, analyze_spending_trends
+from utils import validate_transaction, get_current_user, analyze_spending_trends
+import events
+from transaction_cache import transaction_cache
+from spending_detector import record_transactions
+from fx import get_user_currency, is_supported, rates_version, rates_available
+from versioning import get_data_version, bump_data_version, make_etag, etag_matches, not_modified, set_etag_headers, cached_response
 from datetime import datetime, timedelta
+import base64
+import json
 
 router = APIRouter()
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-    
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
-    return payload["email"]
-
 @router.post("/")
 async def add_transaction(transaction: Transaction, user_email: str = Depends(get_current_user)):
     """Adds a new transaction after validation"""
@@ -25,57 +24,145 @@ async def add_transaction(transaction: Transaction, user_email: str = Depends(ge
     if error:
         raise HTTPException(status_code=400, detail=error)
     
-    await transactions_collection.insert_one(transaction_dict)
+    if transaction_dict.get("currency"):
+        transaction_dict["currency"] = transaction_dict["currency"].upper()
+        if not is_supported(transaction_dict["currency"]):
+            raise HTTPException(status_code=400, detail=f"Unsupported currency '{transaction_dict['currency']}'")
+    else:
+        transaction_dict["currency"] = await get_user_currency(user_email)
+    
+    await insert_transaction(transaction_dict)
+    version = await bump_data_version(user_email, events.TRANSACTIONS)
+    transaction_cache.add(user_email, [transaction_dict], version)
+    await record_transactions(user_email, [transaction_dict])
     return {"message": "Transaction added successfully", "transaction_id": str(transaction_dict["_id"])}
 
 @router.get("/")
 async def get_transactions(
+    response: Response,
     category: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
     user_email: str = Depends(get_current_user)
 ):
     """Get transactions with optional filters"""
-    query = {"user_email": user_email}
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "transactions", category, start_date, end_date, limit)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+    
+    transactions = await list_transactions(
+        user_email,
+        category=category,
+        start=datetime.fromisoformat(start_date) if start_date else None,
+        end=datetime.fromisoformat(end_date) if end_date else None,
+        limit=limit
+    )
+    for tx in transactions:
+        tx["_id"] = str(tx["_id"])
+    
+    return {"transactions": transactions}
+
+SEARCH_ORDERS = ("relevance", "date")
+
+def encode_search_cursor(order: str, last: dict) -> str:
+    """Opaque cursor holding the sort key of the last result on a page"""
+    value = last["score"] if order == "relevance" else last["date"].isoformat()
+    raw = json.dumps([order, value, str(last["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_search_cursor(order: str, cursor: str) -> tuple:
+    from bson.objectid import ObjectId
     
-    if category:
-        query["category"] = category
+    try:
+        cursor_order, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_order != order:
+            raise ValueError("cursor was issued for a different order")
+        if order == "date":
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(last_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/search")
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in descriptions and tags"),
+    category: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    order: str = Query("relevance", description="relevance or date"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
+    """Full-text search over transaction descriptions and tags with optional filters"""
+    if order not in SEARCH_ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of {', '.join(SEARCH_ORDERS)}")
     
-    date_query = {}
-    if start_date:
-        date_query["$gte"] = datetime.fromisoformat(start_date)
-    if end_date:
-        date_query["$lte"] = datetime.fromisoformat(end_date)
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "transactions/search", q, category, start_date, end_date,
+                     min_amount, max_amount, order, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
     
-    if date_query:
-        query["date"] = date_query
+    transactions = await search_transactions(
+        user_email,
+        q,
+        category=category,
+        start=datetime.fromisoformat(start_date) if start_date else None,
+        end=datetime.fromisoformat(end_date) if end_date else None,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        order=order,
+        after=decode_search_cursor(order, cursor) if cursor else None,
+        limit=limit
+    )
     
-    cursor = transactions_collection.find(query).sort("date", -1).limit(limit)
-    transactions = await cursor.to_list(length=limit)
+    next_cursor = encode_search_cursor(order, transactions[-1]) if len(transactions) == limit else None
+    for tx in transactions:
+        tx["_id"] = str(tx["_id"])
     
-    return {"transactions": transactions}
+    return {"transactions": transactions, "next_cursor": next_cursor}
 
 @router.delete("/{transaction_id}")
 async def delete_transaction(transaction_id: str, user_email: str = Depends(get_current_user)):
     """Delete a transaction by ID"""
-    from bson.objectid import ObjectId
-    
-    result = await transactions_collection.delete_one({"_id": ObjectId(transaction_id), "user_email": user_email})
+    result = await remove_transaction(user_email, transaction_id)
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    version = await bump_data_version(user_email, events.TRANSACTIONS)
+    transaction_cache.remove(user_email, transaction_id, version)
     return {"message": "Transaction deleted successfully"}
 
 @router.get("/analysis")
 async def get_spending_analysis(
+    response: Response,
     period: Optional[str] = "month",
+    if_none_match: Optional[str] = Header(None),
     user_email: str = Depends(get_current_user)
 ):
     """Get spending analysis for the user"""
     # Calculate date range based on period
     today = datetime.now()
+    
+    # The period window slides daily and amounts are converted at the current
+    # rates, so the day and the rates version are part of the validator
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "transactions/analysis", period, today.date(), rates_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+    
     if period == "week":
         start_date = today - timedelta(days=7)
     elif period == "month":
@@ -85,12 +172,13 @@ async def get_spending_analysis(
     else:
         start_date = today - timedelta(days=30)  # Default to month
 
-    # Get transactions for the period
-    cursor = transactions_collection.find({
-        "user_email": user_email,
-        "date": {"$gte": start_date}
-    })
-    transactions = await cursor.to_list(length=1000)
+    async def compute_analysis():
+        # Get transactions for the period, in the user's base currency, at
+        # the data version the ETag was built from (or a later one)
+        currency = await get_user_currency(user_email)
+        transactions = await transaction_cache.window(user_email, version, start_date, None, currency)
+        return {**analyze_spending_trends(transactions), "currency": currency,
+                "rates_available": rates_available(currency)}
     
-    analysis = analyze_spending_trends(transactions)
-    return analysis
+    # The ETag covers the data version, period, day and rates, so it keys the result
+    return await cached_response(etag, compute_analysis)
@@ -1,48 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
-from database import users_collection
-from models import User, UserProfile
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from repository import user_exists, insert_user, get_user_credentials, get_user_profile, update_user_profile, get_user_role
+from models import User, UserProfile, UserRole
 from typing import Optional
-import bcrypt
-import jwt
 import os
 from datetime import datetime, timedelta
-from utils import verify_token
+from utils import get_current_user
+from fx import is_supported
+import events
+from versioning import get_data_version, bump_data_version, make_etag, etag_matches, not_modified, set_etag_headers
 from pydantic import EmailStr
 
 router = APIRouter()
 SECRET_KEY = os.getenv("SECRET_KEY")
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header")
-    
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
-    return payload["email"]
-
 @router.post("/register")
 async def register(user: User):
+    import bcrypt
+    
     if not EmailStr.validate(user.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
-    if await users_collection.find_one({"email": user.email}):
+    if await user_exists(user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     hashed_pw = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt())
     user_dict = user.dict()
     user_dict["password"] = hashed_pw
     user_dict["created_at"] = datetime.utcnow()
+    # Roles are granted by an admin, never chosen at sign-up
+    user_dict["role"] = UserRole.USER
     
-    await users_collection.insert_one(user_dict)
+    await insert_user(user_dict)
+    await bump_data_version(user.email, events.PROFILE)
     return {"message": "User registered successfully"}
 
 @router.post("/login")
 async def login(user: User):
-    existing_user = await users_collection.find_one({"email": user.email})
+    import bcrypt
+    import jwt
+    
+    existing_user = await get_user_credentials(user.email)
     if not existing_user or not bcrypt.checkpw(user.password.encode(), existing_user["password"]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     # Create token with expiration
+    # The role only sets request priority under load; authorization checks the database
     token_data = {
         "email": user.email,
+        "role": existing_user.get("role") or UserRole.USER.value,
         "exp": datetime.utcnow() + timedelta(days=7)  # Token expires in 7 days
     }
     
@@ -50,12 +53,19 @@ async def login(user: User):
     return {"token": token, "email": user.email}
 
 @router.get("/profile")
-async def get_profile(user_email: str = Depends(get_current_user)):
+async def get_profile(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user_email: str = Depends(get_current_user)
+):
     """Get user profile data"""
-    profile = await users_collection.find_one(
-        {"email": user_email},
-        {"password": 0}  # Exclude password from results
-    )
+    version = await get_data_version(user_email)
+    etag = make_etag(user_email, version, "users/profile")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag_headers(response, etag)
+    
+    profile = await get_user_profile(user_email)  # Excludes the password hash
     
     if not profile:
         raise HTTPException(status_code=404, detail="User not found")
@@ -70,21 +80,28 @@ async def update_profile(profile: UserProfile, user_email: str = Depends(get_cur
     
     profile_dict = profile.dict(exclude_unset=True)
     
-    result = await users_collection.update_one(
-        {"email": user_email},
-        {"$set": profile_dict}
-    )
+    if profile_dict.get("base_currency"):
+        profile_dict["base_currency"] = profile_dict["base_currency"].upper()
+        if not is_supported(profile_dict["base_currency"]):
+            raise HTTPException(status_code=400, detail=f"Unsupported currency '{profile_dict['base_currency']}'")
+    
+    result = await update_user_profile(user_email, profile_dict)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found or no changes made")
     
+    await bump_data_version(user_email, events.PROFILE)
     return {"message": "Profile updated successfully"}
 
 @router.post("/refresh-token")
 async def refresh_token(user_email: str = Depends(get_current_user)):
     """Get a new token with extended expiration"""
+    import jwt
+    
+    # Carry the current role, as login does, so a refresh keeps the request priority
     token_data = {
         "email": user_email,
+        "role": await get_user_role(user_email) or UserRole.USER.value,
         "exp": datetime.utcnow() + timedelta(days=7)
     }
     
@@ -0,0 +1,407 @@
+"""Host-wide cache shared by all worker processes.
+
+With several workers per host (python main.py --workers N) each process
+would otherwise keep its own cold copy of quotes, news and computed
+responses, multiplying upstream calls and memory by the worker count.
+When SHARED_CACHE_PATH is set, values live instead in a memory-mapped file
+(under /dev/shm by default) that every worker on the host maps:
+
+- The segment holds a few size classes, each a set-associative table of
+  fixed-size slots: a key hashes to one bucket of SHARED_CACHE_WAYS slots,
+  and a value is stored in the smallest class whose slots fit it. Values
+  too large for the biggest class are not cached.
+- Each slot holds the key hash, an absolute expiry time, the key and the
+  pickled value. A write reuses the key's slot, an empty or expired slot,
+  or evicts the bucket's entry closest to expiry.
+- Buckets are locked with POSIX record locks on their own byte of the
+  file (shared for reads, exclusive for writes), so workers only contend
+  when they touch the same bucket.
+
+Without SHARED_CACHE_PATH the same interface is backed by a per-process LRU
+bounded in bytes. Either way values are stored pickled, so callers always
+get their own copy. The segment is only ever opened by this application's
+workers (mode 0600).
+
+get_or_fetch adds single flight on top: concurrent misses for a key in one
+worker share one fetch, and with the shared segment a short fill lease makes
+the other workers wait for that fetch instead of stampeding the upstream
+when a popular key expires.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+# slot bytes:slot count per size class, smallest first (24 MiB by default)
+SHARED_CACHE_CLASSES = os.getenv("SHARED_CACHE_CLASSES", "1024:8192,16384:512,262144:32")
+SHARED_CACHE_WAYS = int(os.getenv("SHARED_CACHE_WAYS", 8))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# How long other workers wait on the worker fetching an expired key before fetching it themselves
+FILL_LEASE_SECONDS = float(os.getenv("SHARED_CACHE_FILL_LEASE_SECONDS", 5))
+FILL_POLL_SECONDS = 0.005
+
+MAGIC = b"WFCACHE1"
+HEADER = struct.Struct("<8sII")  # magic, ways, class count
+CLASS = struct.Struct("<II")  # slot bytes, slot count
+HEADER_BYTES = 4096
+SLOT = struct.Struct("<QdII")  # key hash (0 = empty), expires at, key length, value length
+
+def parse_classes(spec: str) -> List[Tuple[int, int]]:
+    classes = []
+    for part in spec.split(","):
+        slot_bytes, slots = part.split(":")
+        classes.append((int(slot_bytes), int(slots)))
+    return sorted(classes)
+
+def default_path(port: int) -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"wonder-finance-{port}.cache")
+
+def _key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+class LocalCache:
+    """Per-process LRU of pickled values with expiry times, bounded in bytes"""
+
+    shared = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.too_large = 0
+        self._entries = OrderedDict()  # key -> (payload, expires_at)
+
+    def get(self, key: str, count: bool = True) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            self.misses += count
+            return None
+        self._entries.move_to_end(key)
+        self.hits += count
+        return pickle.loads(entry[0])
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        """Stores value only if key has no live entry; whether it was stored"""
+        if self.get(key, count=False) is not None:
+            return False
+        self.set(key, value, ttl)
+        return True
+
+    def set(self, key: str, value: Any, ttl: float):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            self.too_large += 1
+            return
+        self.delete(key)
+        self._entries[key] = (payload, time.time() + ttl)
+        self.bytes += len(payload)
+        while self.bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "local",
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "too_large": self.too_large
+        }
+
+class SlotTable:
+    """One size class of the segment: buckets of `ways` fixed-size slots"""
+
+    __slots__ = ("offset", "slot_bytes", "slots", "ways", "buckets", "lock_base")
+
+    def __init__(self, offset: int, slot_bytes: int, slots: int, ways: int, lock_base: int):
+        self.offset = offset
+        self.slot_bytes = slot_bytes
+        self.slots = slots
+        self.ways = ways
+        self.buckets = slots // ways
+        self.lock_base = lock_base
+
+    def bucket(self, key_hash: int) -> Tuple[int, int]:
+        """(file offset of the bucket's first slot, lock byte)"""
+        bucket = key_hash % self.buckets
+        return self.offset + bucket * self.ways * self.slot_bytes, self.lock_base + bucket
+
+    def fits(self, key_length: int, value_length: int) -> bool:
+        return SLOT.size + key_length + value_length <= self.slot_bytes
+
+    def find(self, segment, start: int, key_hash: int, key: bytes) -> Optional[int]:
+        """Offset of the slot holding key in the bucket at start, if any"""
+        for way in range(self.ways):
+            slot = start + way * self.slot_bytes
+            stored_hash, _, key_length, _ = SLOT.unpack_from(segment, slot)
+            if stored_hash == key_hash and segment[slot + SLOT.size:slot + SLOT.size + key_length] == key:
+                return slot
+        return None
+
+    def victim(self, segment, start: int, now: float) -> Tuple[int, bool]:
+        """(offset of an empty or expired slot, or of the one closest to expiry; whether it was live)"""
+        oldest, oldest_expiry = start, None
+        for way in range(self.ways):
+            slot = start + way * self.slot_bytes
+            stored_hash, expires_at, _, _ = SLOT.unpack_from(segment, slot)
+            if stored_hash == 0 or expires_at <= now:
+                return slot, False
+            if oldest_expiry is None or expires_at < oldest_expiry:
+                oldest, oldest_expiry = slot, expires_at
+        return oldest, True
+
+class SharedCache:
+    """Cache in a memory-mapped segment shared by every worker on the host"""
+
+    shared = True
+
+    def __init__(self, path: str, classes: List[Tuple[int, int]], ways: int):
+        import mmap
+
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.too_large = 0
+        create_segment(path, classes, ways, replace=False)
+        self._fd = os.open(path, os.O_RDWR)
+        self._segment = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self.tables = self._read_layout(classes, ways)
+        # Record locks are per process; threads of one process also need this
+        self._lock = threading.Lock()
+
+    def _read_layout(self, classes, ways) -> List[SlotTable]:
+        magic, stored_ways, count = HEADER.unpack_from(self._segment, 0)
+        stored = [CLASS.unpack_from(self._segment, HEADER.size + i * CLASS.size) for i in range(count)]
+        if magic != MAGIC or stored_ways != ways or stored != list(classes):
+            raise ValueError(f"{self.path} was created with a different cache layout")
+        tables, offset, lock_base = [], HEADER_BYTES, 0
+        for slot_bytes, slots in classes:
+            tables.append(SlotTable(offset, slot_bytes, slots, ways, lock_base))
+            offset += slot_bytes * slots
+            lock_base += slots // ways
+        return tables
+
+    def _lock_byte(self, lock_byte: int, exclusive: bool):
+        import fcntl
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, 1, lock_byte)
+
+    def _unlock_byte(self, lock_byte: int):
+        import fcntl
+
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, lock_byte)
+
+    def get(self, key: str, count: bool = True) -> Any:
+        key_bytes = key.encode()
+        key_hash = _key_hash(key_bytes)
+        payload = None
+        with self._lock:
+            for table in self.tables:
+                start, lock_byte = table.bucket(key_hash)
+                self._lock_byte(lock_byte, exclusive=False)
+                try:
+                    slot = table.find(self._segment, start, key_hash, key_bytes)
+                    if slot is not None:
+                        _, expires_at, key_length, value_length = SLOT.unpack_from(self._segment, slot)
+                        if expires_at > time.time():
+                            begin = slot + SLOT.size + key_length
+                            payload = self._segment[begin:begin + value_length]
+                finally:
+                    self._unlock_byte(lock_byte)
+                if slot is not None:
+                    break
+        if payload is None:
+            self.misses += count
+            return None
+        self.hits += count
+        return pickle.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._store(key, value, ttl, replace=True)
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        """Stores value only if key has no live entry, atomically across workers; whether it was stored"""
+        return self._store(key, value, ttl, replace=False)
+
+    def _store(self, key: str, value: Any, ttl: float, replace: bool) -> bool:
+        key_bytes = key.encode()
+        key_hash = _key_hash(key_bytes)
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        target = next((table for table in self.tables if table.fits(len(key_bytes), len(payload))), None)
+        with self._lock:
+            # A copy in another class (the value changed size) would shadow or outlive this one
+            for table in self.tables:
+                if table is not target:
+                    self._remove(table, key_hash, key_bytes)
+            if target is None:
+                self.too_large += 1
+                return False
+            start, lock_byte = target.bucket(key_hash)
+            self._lock_byte(lock_byte, exclusive=True)
+            try:
+                now = time.time()
+                slot = target.find(self._segment, start, key_hash, key_bytes)
+                if slot is not None and not replace and SLOT.unpack_from(self._segment, slot)[1] > now:
+                    return False
+                if slot is None:
+                    slot, live = target.victim(self._segment, start, now)
+                    self.evictions += live
+                begin = slot + SLOT.size
+                self._segment[begin:begin + len(key_bytes)] = key_bytes
+                self._segment[begin + len(key_bytes):begin + len(key_bytes) + len(payload)] = payload
+                SLOT.pack_into(self._segment, slot, key_hash, now + ttl, len(key_bytes), len(payload))
+            finally:
+                self._unlock_byte(lock_byte)
+        return True
+
+    def delete(self, key: str):
+        key_bytes = key.encode()
+        key_hash = _key_hash(key_bytes)
+        with self._lock:
+            for table in self.tables:
+                self._remove(table, key_hash, key_bytes)
+
+    def _remove(self, table: SlotTable, key_hash: int, key: bytes):
+        start, lock_byte = table.bucket(key_hash)
+        self._lock_byte(lock_byte, exclusive=True)
+        try:
+            slot = table.find(self._segment, start, key_hash, key)
+            if slot is not None:
+                SLOT.pack_into(self._segment, slot, 0, 0.0, 0, 0)
+        finally:
+            self._unlock_byte(lock_byte)
+
+    def stats(self) -> Dict:
+        """This process's counters, plus the segment's live entries per size class"""
+        now = time.time()
+        live = {}
+        with self._lock:
+            for table in self.tables:
+                count = 0
+                for slot in range(table.offset, table.offset + table.slots * table.slot_bytes, table.slot_bytes):
+                    stored_hash, expires_at, _, _ = SLOT.unpack_from(self._segment, slot)
+                    count += stored_hash != 0 and expires_at > now
+                live[table.slot_bytes] = count
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "entries_by_slot_bytes": live,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "too_large": self.too_large
+        }
+
+def create_segment(path: str, classes: List[Tuple[int, int]], ways: int, replace: bool = True):
+    """Creates a zeroed segment file; with replace=False an existing segment is kept"""
+    if not replace and os.path.exists(path):
+        return
+    size = HEADER_BYTES + sum(slot_bytes * slots for slot_bytes, slots in classes)
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".wonder-finance-cache-")
+    try:
+        os.ftruncate(fd, size)
+        header = HEADER.pack(MAGIC, ways, len(classes)) + b"".join(CLASS.pack(*c) for c in classes)
+        os.pwrite(fd, header, 0)
+        if replace:
+            os.replace(temporary, path)
+        else:
+            try:
+                # Several workers may race to create it; the first link wins
+                os.link(temporary, path)
+            except FileExistsError:
+                pass
+    finally:
+        os.close(fd)
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+
+def _open_cache():
+    if SHARED_CACHE_PATH:
+        try:
+            return SharedCache(SHARED_CACHE_PATH, parse_classes(SHARED_CACHE_CLASSES), SHARED_CACHE_WAYS)
+        except (OSError, ValueError) as e:
+            logging.error(f"Shared cache unavailable, using a per-process cache: {e}")
+    return LocalCache(LOCAL_CACHE_MAX_BYTES)
+
+cache = _open_cache()
+_inflight = {}
+_fetches = 0
+_waited = 0
+
+async def _wait_for_fill(key: str, lease_key: str) -> Any:
+    """Waits while another worker holds the fill lease; its value, or None once the lease is gone"""
+    while True:
+        value = cache.get(key, count=False)
+        if value is not None or cache.get(lease_key, count=False) is None:
+            return value
+        await asyncio.sleep(FILL_POLL_SECONDS)
+
+async def get_or_fetch(key: str, ttl: float, fetch: Callable[[], Awaitable[Any]],
+                       cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+    """The cached value for key, or fetch()'s result, stored for ttl seconds.
+
+    None is never cached, nor values cacheable() rejects. ttl <= 0 bypasses the cache.
+    """
+    if ttl <= 0:
+        return await fetch()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    pending = _inflight.get(key)
+    if pending is None:
+        async def fill():
+            global _fetches, _waited
+            lease_key = f"lease:{key}"
+            # With a shared segment, one worker fetches an expired key while the others wait for it
+            leased = cache.shared and cache.add(lease_key, os.getpid(), FILL_LEASE_SECONDS)
+            if cache.shared and not leased:
+                value = await _wait_for_fill(key, lease_key)
+                if value is not None:
+                    _waited += 1
+                    return value
+                # The holder let go without a value; fetch under a lease of our own if no one else took it
+                leased = cache.add(lease_key, os.getpid(), FILL_LEASE_SECONDS)
+            _fetches += 1
+            try:
+                value = await fetch()
+                if value is not None and (cacheable is None or cacheable(value)):
+                    cache.set(key, value, ttl)
+            finally:
+                # Our lease may have expired mid-fetch and been taken by another worker: leave that one be
+                if leased and cache.get(lease_key, count=False) == os.getpid():
+                    cache.delete(lease_key)
+            return value
+
+        def forget(done):
+            if _inflight.get(key) is done:
+                del _inflight[key]
+
+        pending = asyncio.ensure_future(fill())
+        _inflight[key] = pending
+        pending.add_done_callback(forget)
+    return await asyncio.shield(pending)
+
+def stats() -> Dict:
+    """Cache counters for this worker: lookups, fetches it made, and fills it took from other workers"""
+    return {**cache.stats(), "fetches": _fetches, "filled_by_other_workers": _waited}
@@ -0,0 +1,546 @@
+"""Streaming anomaly and recurring-payment detection.
+
+Every expense updates compact running statistics in O(1), so nothing ever
+rescans a user's history:
+
+- per (user, category): Welford mean/variance of amounts, and exponentially
+  decayed spend totals with a short (7 day) and long (90 day) half-life.
+  An amount far above the category's mean, or a week's spend running well
+  above the category's long-run rate, raises an anomaly alert.
+- per (user, merchant): a periodicity sketch of the gaps between charges and
+  their amounts (Welford again). Regular gaps with stable amounts make the
+  merchant a recurring-charge candidate; the first time it qualifies a
+  "possible subscription" alert is raised.
+
+State for active users is held in memory, loaded from the detector_state
+collection on first use and written back in the background every
+DETECTOR_FLUSH_SECONDS (and at shutdown). With several workers each keeps
+its own copy, so next to it a worker keeps what it observed since its last
+save. Saves are conditional on the stored version: when another worker
+saved in between, the pending observations are merged into the stored
+state (Welford statistics combine exactly, decayed sums after aligning
+their reference dates) instead of overwriting it. Deleting a transaction
+does not rewind the statistics; run the backfill command
+(migrations/backfill_spending_detector.py) to rebuild them from history.
+A rebuild bumps the stored state's base, and a worker whose state was
+loaded on an older base drops its pending observations and takes the
+rebuilt state: the history it was replayed from already holds them.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from repository import load_detector_state, save_detector_state, insert_alerts
+from fx import get_user_currency, convert_rows
+
+SPENDING_DETECTOR = os.getenv("SPENDING_DETECTOR", "true").lower() == "true"
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 3.0))
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", 8))
+DETECTOR_FLUSH_SECONDS = float(os.getenv("DETECTOR_FLUSH_SECONDS", 30))
+DETECTOR_MAX_USERS = int(os.getenv("DETECTOR_MAX_USERS", 10000))
+
+SHORT_HALF_LIFE_DAYS = 7
+LONG_HALF_LIFE_DAYS = 90
+# A week's decayed spend this many times the long-run rate is a velocity anomaly
+VELOCITY_RATIO_THRESHOLD = 3.0
+# The long-run rate is only trusted after this many days of history
+VELOCITY_MIN_DAYS = 30
+
+RECURRING_MIN_CHARGES = 3
+RECURRING_MAX_INTERVAL_CV = 0.15
+RECURRING_MAX_AMOUNT_CV = 0.25
+RECURRING_MIN_INTERVAL_DAYS = 5
+MAX_MERCHANTS_PER_USER = 500
+# Conditional saves retried against other workers' saves before giving up until the next flush
+DETECTOR_SAVE_ATTEMPTS = 5
+
+SECONDS_PER_DAY = 86400.0
+
+def merchant_key(description: Optional[str]) -> Optional[str]:
+    """Normalizes a description so charges from one merchant share a sketch"""
+    if not description:
+        return None
+    key = re.sub(r"[\d#*]+", " ", description.lower())
+    key = " ".join(key.split())
+    return key[:64] or None
+
+class RunningStats:
+    """Welford's online mean and variance"""
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningStats"):
+        """Combines with stats over other values (Chan et al.'s parallel update)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def cv(self) -> float:
+        """Coefficient of variation (std / mean)"""
+        return self.std / self.mean if self.mean else float("inf")
+
+    def to_list(self) -> List[float]:
+        return [self.count, self.mean, self.m2]
+
+def _decay(days: float, half_life: float) -> float:
+    return 0.5 ** (days / half_life)
+
+def _decayed_window(days: float, half_life: float) -> float:
+    """Days of spend a decayed sum holds after `days` of steady spending.
+
+    A decayed sum of a steady daily rate r settles at r * half_life / ln 2;
+    before that it is short by the factor 1 - 2^(-days / half_life).
+    """
+    return half_life / math.log(2) * (1 - _decay(days, half_life))
+
+def _days_between(later: datetime, earlier: datetime) -> float:
+    return (later - earlier).total_seconds() / SECONDS_PER_DAY
+
+class CategoryStats:
+    __slots__ = ("amounts", "short_spend", "long_spend", "first_date", "last_date")
+
+    def __init__(self):
+        self.amounts = RunningStats()
+        self.short_spend = 0.0
+        self.long_spend = 0.0
+        self.first_date = None
+        self.last_date = None
+
+    def add(self, amount: float, date: datetime):
+        self.amounts.add(amount)
+        if self.last_date is None:
+            self.first_date = self.last_date = date
+            self.short_spend = self.long_spend = amount
+        elif date >= self.last_date:
+            days = _days_between(date, self.last_date)
+            self.short_spend = self.short_spend * _decay(days, SHORT_HALF_LIFE_DAYS) + amount
+            self.long_spend = self.long_spend * _decay(days, LONG_HALF_LIFE_DAYS) + amount
+            self.last_date = date
+        else:
+            # Backdated charge: add it already decayed to the current reference time
+            days = _days_between(self.last_date, date)
+            self.short_spend += amount * _decay(days, SHORT_HALF_LIFE_DAYS)
+            self.long_spend += amount * _decay(days, LONG_HALF_LIFE_DAYS)
+            self.first_date = min(self.first_date, date)
+
+    def merge(self, other: "CategoryStats"):
+        """Folds in stats of charges observed elsewhere"""
+        self.amounts.merge(other.amounts)
+        if other.last_date is None:
+            return
+        if self.last_date is None:
+            self.short_spend, self.long_spend = other.short_spend, other.long_spend
+            self.first_date, self.last_date = other.first_date, other.last_date
+            return
+        # Both decayed sums are referenced to their own last charge; move them to the later one
+        reference = max(self.last_date, other.last_date)
+        own, theirs = _days_between(reference, self.last_date), _days_between(reference, other.last_date)
+        self.short_spend = (self.short_spend * _decay(own, SHORT_HALF_LIFE_DAYS)
+                            + other.short_spend * _decay(theirs, SHORT_HALF_LIFE_DAYS))
+        self.long_spend = (self.long_spend * _decay(own, LONG_HALF_LIFE_DAYS)
+                           + other.long_spend * _decay(theirs, LONG_HALF_LIFE_DAYS))
+        self.first_date = min(self.first_date, other.first_date)
+        self.last_date = reference
+
+    def velocity_ratio(self) -> Optional[float]:
+        """Recent daily spend rate over the long-run daily rate"""
+        if self.last_date is None or _days_between(self.last_date, self.first_date) < VELOCITY_MIN_DAYS:
+            return None
+        observed = _days_between(self.last_date, self.first_date)
+        short_rate = self.short_spend / _decayed_window(observed, SHORT_HALF_LIFE_DAYS)
+        long_rate = self.long_spend / _decayed_window(observed, LONG_HALF_LIFE_DAYS)
+        return short_rate / long_rate if long_rate > 0 else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "amounts": self.amounts.to_list(),
+            "short_spend": self.short_spend,
+            "long_spend": self.long_spend,
+            "first_date": self.first_date,
+            "last_date": self.last_date
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CategoryStats":
+        stats = cls()
+        stats.amounts = RunningStats(*data["amounts"])
+        stats.short_spend = data["short_spend"]
+        stats.long_spend = data["long_spend"]
+        stats.first_date = data["first_date"]
+        stats.last_date = data["last_date"]
+        return stats
+
+class MerchantSketch:
+    __slots__ = ("label", "category", "intervals", "amounts", "first_date", "last_date", "reported")
+
+    def __init__(self, label: str, category: str):
+        self.label = label
+        self.category = category
+        self.intervals = RunningStats()
+        self.amounts = RunningStats()
+        self.first_date = None
+        self.last_date = None
+        self.reported = False
+
+    def add(self, amount: float, date: datetime):
+        self.amounts.add(amount)
+        if self.last_date is None:
+            self.first_date = date
+        if self.last_date is None or date <= self.last_date:
+            # Out-of-order charges count towards the amount but not the period
+            self.last_date = self.last_date or date
+            return
+        self.intervals.add(_days_between(date, self.last_date))
+        self.last_date = date
+
+    def merge(self, other: "MerchantSketch"):
+        """Folds in a sketch of charges observed elsewhere, after the ones in this sketch"""
+        if other.first_date is not None and self.last_date is not None and other.first_date > self.last_date:
+            # The gap between the two runs of charges is an interval neither sketch saw
+            self.intervals.add(_days_between(other.first_date, self.last_date))
+        self.intervals.merge(other.intervals)
+        self.amounts.merge(other.amounts)
+        if other.last_date is not None and (self.last_date is None or other.last_date > self.last_date):
+            self.last_date = other.last_date
+        self.reported = self.reported or other.reported
+
+    def is_recurring(self) -> bool:
+        return (
+            self.amounts.count >= RECURRING_MIN_CHARGES
+            and self.intervals.count >= RECURRING_MIN_CHARGES - 1
+            and self.intervals.mean >= RECURRING_MIN_INTERVAL_DAYS
+            and self.intervals.cv <= RECURRING_MAX_INTERVAL_CV
+            and self.amounts.cv <= RECURRING_MAX_AMOUNT_CV
+        )
+
+    def summary(self) -> Dict:
+        return {
+            "merchant": self.label,
+            "category": self.category,
+            "charges": self.amounts.count,
+            "average_amount": round(self.amounts.mean, 2),
+            "interval_days": round(self.intervals.mean, 1),
+            "last_charged": self.last_date,
+            "next_expected": self.last_date + timedelta(days=self.intervals.mean)
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "label": self.label,
+            "category": self.category,
+            "intervals": self.intervals.to_list(),
+            "amounts": self.amounts.to_list(),
+            "first_date": self.first_date,
+            "last_date": self.last_date,
+            "reported": self.reported
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MerchantSketch":
+        sketch = cls(data["label"], data["category"])
+        sketch.intervals = RunningStats(*data["intervals"])
+        sketch.amounts = RunningStats(*data["amounts"])
+        sketch.first_date = data.get("first_date")
+        sketch.last_date = data["last_date"]
+        sketch.reported = data["reported"]
+        return sketch
+
+class UserState:
+    __slots__ = ("categories", "merchants", "dirty", "version", "base", "pending")
+
+    def __init__(self):
+        self.categories = {}
+        self.merchants = OrderedDict()  # Least recently charged first
+        self.dirty = False
+        self.version = 0  # Stored version this state is based on
+        self.base = 0  # Rebuilds from history the stored state had been through
+        self.pending = None  # UserState of what was observed here since the last save
+
+    def to_dict(self) -> Dict:
+        # Stored as lists: categories and merchants are not safe as Mongo field names
+        return {
+            "categories": [{"category": c, **s.to_dict()} for c, s in self.categories.items()],
+            "merchants": [{"key": k, **s.to_dict()} for k, s in self.merchants.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserState":
+        state = cls()
+        for item in data.get("categories", []):
+            state.categories[item["category"]] = CategoryStats.from_dict(item)
+        for item in data.get("merchants", []):
+            state.merchants[item["key"]] = MerchantSketch.from_dict(item)
+        state.version = data.get("version", 0)
+        state.base = data.get("base", 0)
+        return state
+
+    def merge(self, other: "UserState"):
+        """Folds in observations made elsewhere (other is left unchanged)"""
+        for category, stats in other.categories.items():
+            if category in self.categories:
+                self.categories[category].merge(stats)
+            else:
+                self.categories[category] = CategoryStats.from_dict(stats.to_dict())
+        for key, sketch in other.merchants.items():
+            if key in self.merchants:
+                self.merchants[key].merge(sketch)
+                self.merchants.move_to_end(key)
+            else:
+                self.merchants[key] = MerchantSketch.from_dict(sketch.to_dict())
+        while len(self.merchants) > MAX_MERCHANTS_PER_USER:
+            self.merchants.popitem(last=False)
+
+def observe(state: UserState, transaction: Dict) -> List[Dict]:
+    """Updates a user's statistics with one transaction and returns any alerts it raises.
+
+    Each expense is scored against the statistics as they were before it,
+    then folded in, and also into state.pending when the state has one.
+    Non-expense transactions are ignored.
+    """
+    if transaction.get("transaction_type") != "expense":
+        return []
+
+    amount = float(transaction.get("amount", 0))
+    category = transaction.get("category") or "Other"
+    date = transaction.get("date") or datetime.utcnow()
+    alerts = []
+
+    stats = state.categories.get(category)
+    if stats is None:
+        stats = state.categories[category] = CategoryStats()
+
+    if stats.amounts.count >= ANOMALY_MIN_HISTORY and stats.amounts.std > 0:
+        score = (amount - stats.amounts.mean) / stats.amounts.std
+        if score >= ANOMALY_Z_THRESHOLD:
+            alerts.append({
+                "type": "anomaly",
+                "title": "Unusual transaction",
+                "message": f"{amount:,.2f} in {category} is well above your usual {stats.amounts.mean:,.2f}.",
+                "category": category,
+                "amount": amount,
+                "score": round(score, 2)
+            })
+
+    previous_ratio = stats.velocity_ratio()
+    stats.add(amount, date)
+    pending = state.pending
+    if pending is not None:
+        pending.categories.setdefault(category, CategoryStats()).add(amount, date)
+    ratio = stats.velocity_ratio()
+    # Alert when the ratio crosses the threshold, not on every charge above it
+    if ratio is not None and ratio >= VELOCITY_RATIO_THRESHOLD and (previous_ratio or 0) < VELOCITY_RATIO_THRESHOLD:
+        alerts.append({
+            "type": "velocity",
+            "title": "Spending spike",
+            "message": f"Your {category} spending this week is running {ratio:.1f}x your usual rate.",
+            "category": category,
+            "amount": amount,
+            "score": round(ratio, 2)
+        })
+
+    key = merchant_key(transaction.get("description"))
+    if key is not None:
+        sketch = state.merchants.get(key)
+        if sketch is None:
+            sketch = state.merchants[key] = MerchantSketch(transaction["description"], category)
+            if len(state.merchants) > MAX_MERCHANTS_PER_USER:
+                state.merchants.popitem(last=False)
+        state.merchants.move_to_end(key)
+        pending_sketch = None
+        if pending is not None:
+            pending_sketch = pending.merchants.get(key)
+            if pending_sketch is None:
+                pending_sketch = pending.merchants[key] = MerchantSketch(sketch.label, category)
+            pending_sketch.add(amount, date)
+        sketch.add(amount, date)
+        if not sketch.reported and sketch.is_recurring():
+            sketch.reported = True
+            if pending_sketch is not None:
+                pending_sketch.reported = True
+            alerts.append({
+                "type": "recurring",
+                "title": "Possible subscription",
+                "message": f"'{sketch.label}' charges about {sketch.amounts.mean:,.2f} every {sketch.intervals.mean:.0f} days.",
+                "category": category,
+                "amount": amount,
+                "score": None
+            })
+
+    state.dirty = True
+    return alerts
+
+class SpendingDetector:
+    """Per-user detector state for the active users in this process"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_email -> UserState, least recently used first
+        self._loading = {}
+        self._saving = set()
+
+    async def state(self, user_email: str) -> UserState:
+        """Returns the user's state, loading it from Mongo the first time"""
+        state = self._users.get(user_email)
+        if state is not None:
+            self._users.move_to_end(user_email)
+            return state
+
+        loading = self._loading.get(user_email)
+        if loading is None:
+            loading = self._loading[user_email] = asyncio.ensure_future(self._load(user_email))
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            self._loading.pop(user_email, None)
+
+    async def _load(self, user_email: str) -> UserState:
+        saved = await load_detector_state(user_email)
+        state = UserState.from_dict(saved) if saved else UserState()
+        state.pending = UserState()
+        self.put(user_email, state)
+        return state
+
+    def put(self, user_email: str, state: UserState):
+        self._users[user_email] = state
+        self._users.move_to_end(user_email)
+        while len(self._users) > self.max_users:
+            evicted_email, evicted = self._users.popitem(last=False)
+            if evicted.dirty:
+                task = asyncio.ensure_future(self._save(evicted_email, evicted))
+                self._saving.add(task)
+                task.add_done_callback(self._saving.discard)
+
+    async def _save(self, user_email: str, state: UserState):
+        pending, state.pending = state.pending, UserState()
+        state.dirty = False
+        version, base, document = state.version, state.base, state.to_dict()
+        adopted = False
+        try:
+            for _ in range(DETECTOR_SAVE_ATTEMPTS):
+                if await save_detector_state(user_email, document, version):
+                    version += 1
+                    break
+                adopted = True
+                stored = UserState.from_dict(await load_detector_state(user_email) or {})
+                if stored.base != state.base:
+                    # Rebuilt from history since this state was loaded, and the
+                    # history holds what was observed here: nothing to add
+                    version, base, document = stored.version, stored.base, stored.to_dict()
+                    break
+                # Another worker saved since this state was loaded: add what was
+                # observed here to its state rather than overwrite it
+                stored.merge(pending)
+                version, document = stored.version, stored.to_dict()
+            else:
+                raise RuntimeError(f"still conflicting after {DETECTOR_SAVE_ATTEMPTS} attempts")
+        except Exception as e:
+            # Keep the observations for the next flush
+            pending.merge(state.pending)
+            state.pending = pending
+            state.dirty = True
+            logging.error(f"Error saving detector state for {user_email}: {e}")
+            return
+        
+        if adopted:
+            # Adopt the stored state, plus whatever was observed here while saving
+            merged = UserState.from_dict(document)
+            merged.merge(state.pending)
+            state.categories, state.merchants = merged.categories, merged.merchants
+            state.base = base
+        state.version = version
+
+    async def observe(self, user_email: str, transactions: List[Dict]) -> List[Dict]:
+        """Folds transactions (oldest first) into the user's state and stores the alerts raised"""
+        state = await self.state(user_email)
+        alerts = []
+        for transaction in transactions:
+            for alert in observe(state, transaction):
+                alert.update({
+                    "user_email": user_email,
+                    "transaction_id": str(transaction["_id"]) if transaction.get("_id") else None,
+                    "created_at": datetime.utcnow(),
+                    "read": False
+                })
+                alerts.append(alert)
+        if alerts:
+            await insert_alerts(alerts)
+        return alerts
+
+    async def recurring(self, user_email: str) -> List[Dict]:
+        """Recurring-charge candidates, soonest expected charge first"""
+        state = await self.state(user_email)
+        candidates = [sketch.summary() for sketch in state.merchants.values() if sketch.is_recurring()]
+        return sorted(candidates, key=lambda c: c["next_expected"])
+
+    async def flush(self):
+        """Writes every changed user state back to Mongo"""
+        for user_email, state in list(self._users.items()):
+            if state.dirty:
+                await self._save(user_email, state)
+        if self._saving:
+            await asyncio.gather(*list(self._saving), return_exceptions=True)
+
+detector = SpendingDetector(DETECTOR_MAX_USERS)
+_flush_task = None
+
+async def record_transactions(user_email: str, transactions: List[Dict]) -> List[Dict]:
+    """Write-path hook: never fails the write that triggered it"""
+    if not SPENDING_DETECTOR:
+        return []
+    try:
+        # Statistics are kept in the user's base currency
+        currency = await get_user_currency(user_email)
+        transactions = convert_rows([dict(transaction) for transaction in transactions], currency)
+        return await detector.observe(user_email, transactions)
+    except Exception as e:
+        logging.error(f"Spending detector failed for {user_email}: {e}")
+        return []
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(DETECTOR_FLUSH_SECONDS)
+        try:
+            await detector.flush()
+        except Exception as e:
+            logging.error(f"Detector state flush failed: {e}")
+
+async def start():
+    """Starts the background state flush"""
+    global _flush_task
+    if SPENDING_DETECTOR and _flush_task is None:
+        _flush_task = asyncio.ensure_future(_flush_loop())
+
+async def stop():
+    """Stops the background flush and writes out any remaining changes"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await detector.flush()
@@ -0,0 +1,54 @@
+"""Price stream hub lifecycle and stream authentication"""
+import asyncio
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from price_stream import PriceHub
+from routes.market import STREAM_TICKET_AUDIENCE, get_stream_user, parse_stream_symbols
+from utils import SECRET_KEY
+
+def test_stopped_poller_drops_last_value():
+    async def scenario():
+        async def fetch(symbol):
+            return {"symbol": symbol, "price": 100}
+
+        hub = PriceHub(fetch, interval=0.01)
+        subscriber = hub.subscribe(["stock:AAPL"])
+        assert (await subscriber.next_batch(1))[0]["quote"]["price"] == 100
+        assert "stock:AAPL" in hub._latest
+
+        hub.unsubscribe(subscriber)
+        await asyncio.sleep(0.05)
+        assert hub._pollers == {}
+        assert hub._latest == {}
+
+    asyncio.run(scenario())
+
+def test_stream_symbols_are_validated():
+    assert parse_stream_symbols("stock:BRK.B, crypto:bitcoin") == ["stock:BRK.B", "crypto:bitcoin"]
+    for symbols in ("stock:", "forex:EURUSD", "stock:AAPL/../x", "crypto:" + "a" * 100):
+        with pytest.raises(HTTPException):
+            parse_stream_symbols(symbols)
+
+def token(**claims) -> str:
+    return jwt.encode({"email": "a@b.com", "exp": datetime.utcnow() + timedelta(minutes=5), **claims},
+                      SECRET_KEY, algorithm="HS256")
+
+def test_stream_requires_authentication():
+    async def scenario():
+        with pytest.raises(HTTPException) as failure:
+            await get_stream_user(None, None)
+        assert failure.value.status_code == 401
+
+        assert await get_stream_user(f"Bearer {token()}", None) == "a@b.com"
+        assert await get_stream_user(None, token(aud=STREAM_TICKET_AUDIENCE)) == "a@b.com"
+        # An access token is not a stream ticket, and a stream ticket is not an access token
+        with pytest.raises(HTTPException):
+            await get_stream_user(None, token())
+        with pytest.raises(HTTPException):
+            await get_stream_user(f"Bearer {token(aud=STREAM_TICKET_AUDIENCE)}", None)
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+"""Fill leases of the shared cache when another worker holds or takes them"""
+import asyncio
+import os
+
+import pytest
+
+import shared_cache
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "segment.cache")
+    classes = shared_cache.parse_classes(shared_cache.SHARED_CACHE_CLASSES)
+    shared_cache.create_segment(path, classes, shared_cache.SHARED_CACHE_WAYS)
+    cache = shared_cache.SharedCache(path, classes, shared_cache.SHARED_CACHE_WAYS)
+    monkeypatch.setattr(shared_cache, "cache", cache)
+    return cache
+
+OTHER_WORKER = os.getpid() + 1
+THIRD_WORKER = os.getpid() + 2
+
+def test_fill_releases_its_own_lease(cache):
+    async def fetch():
+        assert cache.get("lease:quote", count=False) == os.getpid()
+        return {"price": 1}
+
+    assert asyncio.run(shared_cache.get_or_fetch("quote", 60, fetch)) == {"price": 1}
+    assert cache.get("lease:quote", count=False) is None
+    assert cache.get("quote", count=False) == {"price": 1}
+
+def test_fill_keeps_a_lease_another_worker_took(cache):
+    async def fetch():
+        # Our lease expired mid-fetch and a third worker took the key's lease
+        cache.set("lease:quote", THIRD_WORKER, 5)
+        return {"price": 1}
+
+    asyncio.run(shared_cache.get_or_fetch("quote", 60, fetch))
+    assert cache.get("lease:quote", count=False) == THIRD_WORKER
+
+def test_fill_after_waiting_keeps_the_next_holders_lease(cache, monkeypatch):
+    async def wait_for_fill(key, lease_key):
+        # The holder let its lease expire without a value, and a third
+        # worker took the lease before this one could
+        cache.set(lease_key, THIRD_WORKER, 5)
+        return None
+
+    async def fetch():
+        return {"price": 1}
+
+    monkeypatch.setattr(shared_cache, "_wait_for_fill", wait_for_fill)
+    cache.add("lease:quote", OTHER_WORKER, 5)
+    assert asyncio.run(shared_cache.get_or_fetch("quote", 60, fetch)) == {"price": 1}
+    assert cache.get("lease:quote", count=False) == THIRD_WORKER
@@ -0,0 +1,90 @@
+"""Detector state saves across workers and against a backfill rebuild"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import spending_detector
+from spending_detector import SpendingDetector, UserState, observe
+
+class StateStore:
+    """detector_state with the repository's conditional-save semantics"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def load(self, email):
+        document = self.documents.get(email)
+        return dict(document) if document else None
+
+    async def save(self, email, state, version=None, rebuilt=False):
+        stored = self.documents.get(email, {})
+        if version is not None and stored.get("version", 0) != version:
+            return False
+        self.documents[email] = {
+            **state,
+            "version": stored.get("version", 0) + 1,
+            "base": stored.get("base", 0) + (1 if rebuilt else 0)
+        }
+        return True
+
+@pytest.fixture
+def store(monkeypatch):
+    store = StateStore()
+    monkeypatch.setattr(spending_detector, "load_detector_state", store.load)
+    monkeypatch.setattr(spending_detector, "save_detector_state", store.save)
+
+    async def insert_alerts(alerts):
+        pass
+    monkeypatch.setattr(spending_detector, "insert_alerts", insert_alerts)
+    return store
+
+def expense(day: int, amount: float = 10.0):
+    return {"transaction_type": "expense", "amount": amount, "category": "Food",
+            "date": datetime(2026, 1, 1) + timedelta(days=day)}
+
+def stored_count(store) -> int:
+    state = UserState.from_dict(store.documents["a@b.com"])
+    return state.categories["Food"].amounts.count
+
+def test_workers_merge_their_observations(store):
+    async def scenario():
+        first, second = SpendingDetector(10), SpendingDetector(10)
+        await first.observe("a@b.com", [expense(1)])
+        await second.observe("a@b.com", [expense(2), expense(3)])
+        await first.flush()
+        await second.flush()
+        assert stored_count(store) == 3
+
+        await first.observe("a@b.com", [expense(4)])
+        await first.flush()
+        assert stored_count(store) == 4
+
+    asyncio.run(scenario())
+
+def test_rebuild_replaces_observations_made_before_it(store):
+    async def scenario():
+        history = [expense(day) for day in range(5)]
+        worker = SpendingDetector(10)
+        await worker.observe("a@b.com", history[:3])
+        await worker.flush()
+        await worker.observe("a@b.com", history[3:])
+
+        # The backfill replays the full history, which holds the unsaved observations
+        rebuilt = UserState()
+        for transaction in history:
+            observe(rebuilt, transaction)
+        await store.save("a@b.com", rebuilt.to_dict(), rebuilt=True)
+
+        await worker.flush()
+        assert stored_count(store) == 5
+        state = await worker.state("a@b.com")
+        assert state.categories["Food"].amounts.count == 5
+        assert state.base == 1
+
+        # Observations after the rebuild are saved as usual
+        await worker.observe("a@b.com", [expense(6)])
+        await worker.flush()
+        assert stored_count(store) == 6
+
+    asyncio.run(scenario())
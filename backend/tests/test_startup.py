@@ -0,0 +1,15 @@
+"""Startup budget: importing the API entry point stays fast and lazy"""
+import os
+
+from benchmarks.import_time import LAZY_MODULES, measure_once
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 600))
+
+def test_import_main_within_budget():
+    # The best of several cold imports is the least noisy estimate of the real cost
+    best = min((measure_once() for _ in range(10)), key=lambda timings: timings["main"][1])
+    assert best["main"][1] / 1000 <= IMPORT_TIME_BUDGET_MS
+
+def test_heavy_dependencies_load_lazily():
+    timings = measure_once()
+    assert [name for name in LAZY_MODULES if name in timings] == []
@@ -0,0 +1,67 @@
+"""Write-through of the transaction cache against a concurrent load"""
+import asyncio
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+import transaction_cache as cache_module
+from transaction_cache import TransactionCache
+
+def transaction(amount: float, days_ago: int = 1):
+    return {
+        "_id": ObjectId(), "date": datetime.now() - timedelta(days=days_ago), "amount": amount,
+        "category": "Food", "transaction_type": "expense", "currency": "USD"
+    }
+
+def test_insert_during_load_is_counted_once(monkeypatch):
+    stored = [transaction(10), transaction(20)]
+    inserted = transaction(5)
+
+    async def get_column_rows(user_email, start, end=None, transaction_type=None, limit=0):
+        # The insert (and its version bump to 2) lands after the reader read
+        # version 1 but before its query, so the loaded rows already hold it
+        stored.append(inserted)
+        return list(stored)
+
+    monkeypatch.setattr(cache_module, "get_column_rows", get_column_rows)
+
+    async def scenario():
+        cache = TransactionCache(True, 1 << 20, 13, 300, 1000)
+        start = datetime.now() - timedelta(days=30)
+        await cache.window("a@b.com", 1, start, None, "USD")
+        # The insert's write-through, with the version it produced
+        cache.add("a@b.com", [inserted], 2)
+
+        window = await cache.window("a@b.com", 2, start, None, "USD")
+        assert cache.hits == 1
+        assert len(window) == 3
+        assert window.total() == 35
+
+    asyncio.run(scenario())
+
+def test_write_through_follows_local_writes(monkeypatch):
+    stored = [transaction(10)]
+
+    async def get_column_rows(user_email, start, end=None, transaction_type=None, limit=0):
+        return list(stored)
+
+    monkeypatch.setattr(cache_module, "get_column_rows", get_column_rows)
+
+    async def scenario():
+        cache = TransactionCache(True, 1 << 20, 13, 300, 1000)
+        start = datetime.now() - timedelta(days=30)
+        await cache.window("a@b.com", 1, start, None, "USD")
+        added = transaction(7)
+        cache.add("a@b.com", [added], 2)
+        cache.remove("a@b.com", str(stored[0]["_id"]), 3)
+
+        window = await cache.window("a@b.com", 3, start, None, "USD")
+        assert cache.loads == 1
+        assert window.total() == 7
+
+        # A write from another worker moves the version past the columns
+        window = await cache.window("a@b.com", 5, start, None, "USD")
+        assert cache.loads == 2
+        assert window.total() == 10
+
+    asyncio.run(scenario())
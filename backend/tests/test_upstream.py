@@ -0,0 +1,135 @@
+"""Provider breakers and hedging against a stub HTTP upstream"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from upstream import CircuitBreaker, Provider
+
+class StubUpstream(BaseHTTPRequestHandler):
+    """Answers every GET with {"path": ...}; behaviour is set per test"""
+
+    status = 200
+    delay = 0.0
+    stall_once = set()  # Paths whose next request sleeps for a second
+    requests = 0
+
+    def do_GET(self):
+        StubUpstream.requests += 1
+        if self.path in self.stall_once:
+            self.stall_once.discard(self.path)
+            time.sleep(1)
+        time.sleep(self.delay)
+        if self.status != 200:
+            self.send_error(self.status)
+            return
+        payload = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def upstream():
+    StubUpstream.status = 200
+    StubUpstream.delay = 0.0
+    StubUpstream.stall_once = set()
+    StubUpstream.requests = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+def make_provider(**breaker_options) -> Provider:
+    options = {"min_calls": 5, "open_seconds": 0.2, "half_open_successes": 2}
+    options.update(breaker_options)
+    return Provider("Stub", CircuitBreaker(**options), timeout=2)
+
+def fetcher(url: str):
+    def fetch(timeout: float):
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    return fetch
+
+def test_breaker_opens_serves_stale_and_recovers(upstream):
+    async def scenario():
+        provider = make_provider()
+        breaker = provider.breaker
+        fetch = fetcher(f"{upstream}/quote")
+        assert await provider.call("quote", fetch) == {"path": "/quote"}
+
+        StubUpstream.status = 500
+        results = [await provider.call("quote", fetch) for _ in range(breaker.min_calls)]
+        assert breaker.state == breaker.OPEN
+        # Once open, calls are answered without reaching the upstream
+        sent = StubUpstream.requests
+        results += [await provider.call("quote", fetch) for _ in range(20)]
+        assert StubUpstream.requests == sent
+        assert provider.rejected >= 20
+        assert all(result["stale"] for result in results)
+
+        StubUpstream.status = 200
+        await asyncio.sleep(breaker.open_seconds + 0.05)
+        states = []
+        for _ in range(breaker.half_open_successes):
+            assert "stale" not in await provider.call("quote", fetch)
+            states.append(breaker.state)
+        assert states == [breaker.HALF_OPEN, breaker.CLOSED]
+
+    asyncio.run(scenario())
+
+def test_open_breaker_without_last_known_value_raises_503(upstream):
+    async def scenario():
+        provider = make_provider()
+        StubUpstream.status = 500
+        for _ in range(provider.breaker.min_calls):
+            with pytest.raises(Exception) as failure:
+                await provider.call("quote", fetcher(f"{upstream}/quote"))
+        assert failure.value.status_code == 503
+        assert int(failure.value.headers["Retry-After"]) >= 1
+        assert provider.breaker.state == provider.breaker.OPEN
+
+    asyncio.run(scenario())
+
+def test_breaker_opens_on_slow_calls(upstream):
+    async def scenario():
+        provider = make_provider(slow_call_seconds=0.05)
+        StubUpstream.delay = 0.1
+        for _ in range(provider.breaker.min_calls):
+            await provider.call("quote", fetcher(f"{upstream}/quote"))
+        assert provider.failures == 0
+        assert provider.breaker.state == provider.breaker.OPEN
+
+    asyncio.run(scenario())
+
+def test_slow_first_attempt_is_hedged(upstream):
+    async def scenario():
+        provider = make_provider()
+        for i in range(20):  # Latency history for the hedge delay
+            await provider.call(f"warm{i}", fetcher(f"{upstream}/warm{i}"))
+        assert provider.hedge_delay() is not None
+
+        StubUpstream.stall_once.add("/stalled")
+        started = time.monotonic()
+        assert await provider.call("stalled", fetcher(f"{upstream}/stalled")) == {"path": "/stalled"}
+        assert time.monotonic() - started < 0.5
+        assert provider.hedges == 1
+        assert provider.hedge_wins == 1
+
+        # Non-idempotent calls are never hedged
+        StubUpstream.stall_once.add("/write")
+        await provider.call("write", fetcher(f"{upstream}/write"), hedge=False)
+        assert provider.hedges == 1
+
+    asyncio.run(scenario())
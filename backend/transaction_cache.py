@@ -0,0 +1,394 @@
+"""Hot cache of active users' recent transactions in columnar form.
+
+Spending analysis, budget status and the AI financial context all read the
+same recent transactions of the same active users. Instead of re-reading
+those documents from Mongo and holding them as dicts, the cache keeps each
+user's last TRANSACTION_CACHE_MONTHS months as parallel numpy columns:
+millisecond timestamps, amounts, and small integer codes for category,
+transaction type and currency (per-user code tables of interned strings),
+plus the 12 ObjectId bytes so deletes can find their row. That is about 35
+bytes per transaction against over 900 as a dict (see
+benchmarks/transaction_cache_memory.py).
+
+Columns are labelled with the user's data version they were loaded at,
+and a read passes the version its handler built the ETag from: columns at
+any other version are reloaded, so a write made by another worker process
+is seen by the next read here. The cache is write-through for this
+process's own writes: the transaction routes add inserted rows and remove
+deleted ones together with the version their write produced, which only
+applies when no other write came in between. Columns may already hold a
+row inserted after the version they are labelled with (the insert landed
+between the reader's version read and its query), so added rows whose
+ObjectId is already cached are skipped. Users are evicted least
+recently used once the columns of all cached users exceed
+TRANSACTION_CACHE_MAX_BYTES, and reloaded after TRANSACTION_CACHE_TTL_SECONDS
+in case a write bypassed the data version (scripts, migrations).
+
+Reads that reach back before the cached months, or users with more than
+TRANSACTION_CACHE_MAX_ROWS recent transactions, are answered from the
+database instead, through the same TransactionWindow.
+"""
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from repository import get_column_rows
+from fx import DEFAULT_CURRENCY, convert_columns
+
+TRANSACTION_CACHE = os.getenv("TRANSACTION_CACHE", "true").lower() == "true"
+TRANSACTION_CACHE_MAX_BYTES = int(os.getenv("TRANSACTION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 13 months covers the year-long spending analysis
+TRANSACTION_CACHE_MONTHS = int(os.getenv("TRANSACTION_CACHE_MONTHS", 13))
+TRANSACTION_CACHE_TTL_SECONDS = float(os.getenv("TRANSACTION_CACHE_TTL_SECONDS", 300))
+TRANSACTION_CACHE_MAX_ROWS = int(os.getenv("TRANSACTION_CACHE_MAX_ROWS", 50000))
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+MS_PER_DAY = 86400000
+MILLISECOND = timedelta(milliseconds=1)
+# Code tables, slots and the LRU entry of one cached user, beyond its arrays
+USER_OVERHEAD_BYTES = 1024
+
+def to_millis(value: datetime) -> int:
+    """Milliseconds since the epoch of a naive UTC (as stored) or aware datetime"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MILLISECOND
+
+class Codes:
+    """Small integer codes for repeated strings, each string interned once"""
+
+    __slots__ = ("values", "index")
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def code(self, value) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            if isinstance(value, str):
+                value = sys.intern(value)
+            self.values.append(value)
+            self.index[value] = code
+        return code
+
+class TransactionWindow:
+    """Selected transactions with amounts in one currency, aggregated with numpy"""
+
+    __slots__ = ("amounts", "millis", "category_codes", "type_codes", "categories", "types", "_category_totals")
+
+    def __init__(self, amounts, millis, category_codes, type_codes, categories: List, types: List):
+        self.amounts = amounts
+        self.millis = millis
+        self.category_codes = category_codes
+        self.type_codes = type_codes
+        self.categories = categories
+        self.types = types
+        self._category_totals = None
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def _type_mask(self, transaction_type: str):
+        import numpy as np
+
+        if transaction_type not in self.types:
+            return np.zeros(len(self.type_codes), dtype=bool)
+        return self.type_codes == self.types.index(transaction_type)
+
+    def total(self, transaction_type: Optional[str] = None) -> float:
+        if transaction_type is None:
+            return float(self.amounts.sum())
+        return float(self.amounts[self._type_mask(transaction_type)].sum())
+
+    def category_totals(self, transaction_type: Optional[str] = None) -> Dict:
+        """Amount per category, for categories with at least one transaction"""
+        import numpy as np
+
+        if transaction_type is None and self._category_totals is not None:
+            return self._category_totals
+        codes, amounts = self.category_codes, self.amounts
+        if transaction_type is not None:
+            mask = self._type_mask(transaction_type)
+            codes, amounts = codes[mask], amounts[mask]
+        counts = np.bincount(codes, minlength=len(self.categories))
+        sums = np.bincount(codes, weights=amounts, minlength=len(self.categories))
+        totals = {self.categories[code]: float(sums[code]) for code in np.flatnonzero(counts).tolist()}
+        if transaction_type is None:
+            self._category_totals = totals
+        return totals
+
+    def monthly_totals(self) -> Dict[str, float]:
+        """Amount per calendar month, keyed "YYYY-MM" """
+        import numpy as np
+
+        months = self.millis.astype("datetime64[ms]").astype("datetime64[M]")
+        unique, inverse = np.unique(months, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=self.amounts, minlength=len(unique))
+        return dict(zip(np.datetime_as_string(unique, unit="M").tolist(), sums.tolist()))
+
+class TransactionColumns:
+    """One user's transactions as growable numpy columns"""
+
+    __slots__ = ("since", "version", "expires_at", "size", "ids", "millis", "amounts", "category_codes", "type_codes",
+                 "currency_codes", "categories", "types", "currencies")
+
+    def __init__(self, since: int, expires_at: float, capacity: int, version: int = 0):
+        import numpy as np
+
+        self.since = since  # Epoch ms from which the columns hold every transaction
+        self.version = version  # User data version the rows were read at (or after)
+        self.expires_at = expires_at
+        self.size = 0
+        self.ids = np.zeros((capacity, 12), dtype=np.uint8)
+        self.millis = np.zeros(capacity, dtype=np.int64)
+        self.amounts = np.zeros(capacity, dtype=np.float64)
+        self.category_codes = np.zeros(capacity, dtype=np.int32)
+        self.type_codes = np.zeros(capacity, dtype=np.uint8)
+        self.currency_codes = np.zeros(capacity, dtype=np.uint16)
+        self.categories = Codes()
+        self.types = Codes()
+        self.currencies = Codes()
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict], since: int = 0, expires_at: float = 0.0,
+                  version: int = 0) -> "TransactionColumns":
+        import numpy as np
+
+        count = len(rows)
+        columns = cls(since, expires_at, count, version)
+        columns.size = count
+        if not count:
+            return columns
+        columns.ids[:] = np.frombuffer(b"".join(row["_id"].binary for row in rows), dtype=np.uint8).reshape(count, 12)
+        columns.millis[:] = np.fromiter((to_millis(row["date"]) for row in rows), dtype=np.int64, count=count)
+        columns.amounts[:] = np.fromiter((row.get("amount", 0) for row in rows), dtype=np.float64, count=count)
+        categories, types, currencies = columns.categories, columns.types, columns.currencies
+        columns.category_codes[:] = np.fromiter(
+            (categories.code(row.get("category")) for row in rows), dtype=np.int32, count=count)
+        columns.type_codes[:] = np.fromiter(
+            (types.code(_type_value(row.get("transaction_type"))) for row in rows), dtype=np.uint8, count=count)
+        columns.currency_codes[:] = np.fromiter(
+            (currencies.code(row.get("currency") or DEFAULT_CURRENCY) for row in rows), dtype=np.uint16, count=count)
+        return columns
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.ids, self.millis, self.amounts, self.category_codes, self.type_codes, self.currency_codes)
+        return sum(array.nbytes for array in arrays) + USER_OVERHEAD_BYTES
+
+    def append(self, row: Dict):
+        import numpy as np
+
+        if self.size == len(self.millis):
+            self._grow(max(16, self.size * 2))
+        i = self.size
+        self.ids[i] = np.frombuffer(row["_id"].binary, dtype=np.uint8)
+        self.millis[i] = to_millis(row["date"])
+        self.amounts[i] = row.get("amount", 0)
+        self.category_codes[i] = self.categories.code(row.get("category"))
+        self.type_codes[i] = self.types.code(_type_value(row.get("transaction_type")))
+        self.currency_codes[i] = self.currencies.code(row.get("currency") or DEFAULT_CURRENCY)
+        self.size += 1
+
+    def _grow(self, capacity: int):
+        import numpy as np
+
+        for name in ("ids", "millis", "amounts", "category_codes", "type_codes", "currency_codes"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    def find(self, id_bytes: bytes) -> Optional[int]:
+        """The row index of this ObjectId, None if it is not cached"""
+        import numpy as np
+
+        matches = np.flatnonzero((self.ids[:self.size] == np.frombuffer(id_bytes, dtype=np.uint8)).all(axis=1))
+        return int(matches[0]) if len(matches) else None
+
+    def remove(self, id_bytes: bytes) -> bool:
+        """Drops the row with this ObjectId (order is not kept); False if it is not cached"""
+        i = self.find(id_bytes)
+        if i is None:
+            return False
+        last = self.size - 1
+        for array in (self.ids, self.millis, self.amounts, self.category_codes, self.type_codes, self.currency_codes):
+            array[i] = array[last]
+        self.size = last
+        return True
+
+    def window(self, start: Optional[datetime], end: Optional[datetime], currency: str,
+               transaction_type: Optional[str] = None) -> TransactionWindow:
+        """The rows dated within [start, end] (and of transaction_type), converted into currency"""
+        import numpy as np
+
+        size = self.size
+        millis = self.millis[:size]
+        mask = None
+        if start is not None:
+            mask = millis >= to_millis(start)
+        if end is not None:
+            mask = (millis <= to_millis(end)) if mask is None else mask & (millis <= to_millis(end))
+        if transaction_type is not None:
+            type_code = self.types.index.get(transaction_type)
+            if type_code is None:
+                type_mask = np.zeros(size, dtype=bool)
+            else:
+                type_mask = self.type_codes[:size] == type_code
+            mask = type_mask if mask is None else mask & type_mask
+
+        def column(array):
+            return array[:size] if mask is None else array[:size][mask]
+
+        millis = column(self.millis)
+        amounts = convert_columns(
+            column(self.amounts), column(self.currency_codes), self.currencies.values,
+            millis // MS_PER_DAY + EPOCH_ORDINAL, currency
+        )
+        return TransactionWindow(
+            amounts, millis, column(self.category_codes), column(self.type_codes),
+            self.categories.values, self.types.values
+        )
+
+def _type_value(transaction_type) -> Optional[str]:
+    # Freshly validated rows carry the TransactionType enum, stored ones its value
+    return getattr(transaction_type, "value", transaction_type)
+
+class TransactionCache:
+    """LRU of TransactionColumns per user under a global byte budget"""
+
+    def __init__(self, enabled: bool, max_bytes: int, months: int, ttl: float, max_rows: int):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.months = months
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.database_reads = 0
+        self.evictions = 0
+        self.stale = 0
+        self._users = OrderedDict()  # user_email -> TransactionColumns
+
+    async def window(self, user_email: str, version: int, start: datetime, end: Optional[datetime],
+                     currency: str, transaction_type: Optional[str] = None) -> TransactionWindow:
+        """The user's transactions dated within [start, end] with amounts in currency.
+
+        version is the user's data version the caller read (and built its
+        ETag from); the rows are read at that version or a later one.
+        """
+        columns = await self._columns(user_email, version, start)
+        if columns is None:
+            self.database_reads += 1
+            rows = await get_column_rows(user_email, start, end, transaction_type, limit=self.max_rows)
+            columns = TransactionColumns.from_rows(rows)
+        return columns.window(start, end, currency, transaction_type)
+
+    async def _columns(self, user_email: str, version: int, start: datetime) -> Optional[TransactionColumns]:
+        if not self.enabled:
+            return None
+        since = datetime.now() - timedelta(days=31 * self.months)
+        if start < since:
+            return None
+
+        columns = self._users.get(user_email)
+        if columns is not None and columns.expires_at > time.monotonic():
+            if columns.version == version:
+                self._users.move_to_end(user_email)
+                self.hits += 1
+                return columns
+            self.stale += 1
+
+        self.loads += 1
+        # The caller read version before this query, so the rows hold every write up to it,
+        # and possibly later inserts too: add() skips rows that are already cached
+        rows = await get_column_rows(user_email, since, limit=self.max_rows + 1)
+        if len(rows) > self.max_rows:
+            logging.debug(f"Not caching transactions for {user_email}: more than {self.max_rows} recent rows")
+            return None
+
+        columns = TransactionColumns.from_rows(rows, to_millis(since), time.monotonic() + self.ttl, version)
+        self._store(user_email, columns)
+        return columns
+
+    def _store(self, user_email: str, columns: TransactionColumns):
+        previous = self._users.get(user_email)
+        if previous is not None and previous.version > columns.version:
+            # A load that read an older version finished after a newer one
+            return
+        self._drop(user_email)
+        self._users[user_email] = columns
+        self.bytes += columns.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._users:
+            _, evicted = self._users.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _drop(self, user_email: str):
+        columns = self._users.pop(user_email, None)
+        if columns is not None:
+            self.bytes -= columns.nbytes
+
+    def _written(self, user_email: str, version: int) -> Optional[TransactionColumns]:
+        """The user's columns if this write, which produced version, directly follows them"""
+        columns = self._users.get(user_email)
+        if columns is None:
+            return None
+        if columns.version != version - 1:
+            # Another write (maybe in another worker) came in between; reload on the next read
+            self._drop(user_email)
+            return None
+        columns.version = version
+        return columns
+
+    def add(self, user_email: str, transactions: Iterable[Dict], version: int):
+        """Write-through for inserted transactions (with their _id assigned); version is the one the write produced"""
+        columns = self._written(user_email, version)
+        if columns is None:
+            return
+        before = columns.nbytes
+        for transaction in transactions:
+            if to_millis(transaction["date"]) < columns.since:
+                continue
+            if columns.find(transaction["_id"].binary) is None:
+                columns.append(transaction)
+        self.bytes += columns.nbytes - before
+        self._evict()
+
+    def remove(self, user_email: str, transaction_id: str, version: int):
+        """Write-through for a deleted transaction; version is the one the delete produced"""
+        from bson.objectid import ObjectId
+
+        columns = self._written(user_email, version)
+        if columns is not None:
+            columns.remove(ObjectId(transaction_id).binary)
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self._users),
+            "rows": sum(columns.size for columns in self._users.values()),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "stale": self.stale,
+            "loads": self.loads,
+            "database_reads": self.database_reads,
+            "evictions": self.evictions
+        }
+
+transaction_cache = TransactionCache(
+    TRANSACTION_CACHE,
+    TRANSACTION_CACHE_MAX_BYTES,
+    TRANSACTION_CACHE_MONTHS,
+    TRANSACTION_CACHE_TTL_SECONDS,
+    TRANSACTION_CACHE_MAX_ROWS
+)
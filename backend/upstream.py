@@ -0,0 +1,255 @@
+"""Resilient calls to third-party HTTP APIs.
+
+Each upstream provider (Alpha Vantage, CoinGecko, ...) gets a Provider
+with its own circuit breaker, latency history and last-known values:
+
+- The breaker watches a rolling window of calls and opens when too many
+  fail or are slow. While it is open, calls fail fast instead of queueing
+  behind a degraded upstream. After a cool-down it lets single probe calls
+  through (half-open) and closes again once enough of them succeed.
+- Idempotent reads can be hedged: if the first attempt has not answered
+  within the provider's recent p95 latency, a second identical attempt is
+  sent and whichever answers first wins. Hedges are capped at a fraction
+  of calls so a slow upstream never sees double the traffic.
+- When a call is rejected or fails, the last value fetched for the same key
+  is returned marked stale (up to a maximum age) instead of an error.
+
+Fetch functions are blocking (requests) and run on the provider's thread
+pool with the provider's timeout.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from fastapi import HTTPException
+
+def percentile(values, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of call outcomes"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int = 50, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_seconds: float = 2.0, slow_rate: float = 0.8,
+                 open_seconds: float = 30, half_open_successes: int = 3):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_successes = half_open_successes
+        self.state = self.CLOSED
+        self.opened = 0
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_successes = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; a half-open breaker admits one probe at a time"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_successes = 0
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record(self, failed: bool, latency: float):
+        """Records the outcome of a call that allow() admitted"""
+        if self.state == self.OPEN:
+            # A call admitted before the breaker tripped; the trip already decided
+            return
+        slow = latency >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if failed or slow:
+                self._trip()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_successes:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append((failed, slow))
+        count = len(self._outcomes)
+        if count < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        if failures / count >= self.error_rate or slow_calls / count >= self.slow_rate:
+            self._trip()
+
+    def release(self):
+        """Frees the half-open probe slot of a call that was cancelled before it finished"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker admits a probe"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+
+    def stats(self) -> Dict:
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        return {
+            "state": self.state,
+            "times_opened": self.opened,
+            "window_calls": len(self._outcomes),
+            "window_failures": failures,
+            "retry_after_seconds": round(self.retry_after(), 1)
+        }
+
+class Provider:
+    """One upstream API: breaker, hedged attempts and last-known values per key"""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, timeout: float, executor=None,
+                 hedge_percentile: float = 95, min_hedge_delay: float = 0.05,
+                 hedge_budget: float = 0.1, stale_seconds: float = 3600, max_cached: int = 1000):
+        self.name = name
+        self.breaker = breaker
+        self.timeout = timeout
+        self.executor = executor
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.hedge_budget = hedge_budget
+        self.stale_seconds = stale_seconds
+        self.max_cached = max_cached
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.stale_served = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=500)  # seconds, successful attempts only
+        self._last_known = OrderedDict()  # key -> (value, fetched_at)
+
+    def hedge_delay(self) -> Optional[float]:
+        """The recent latency percentile, once there are enough samples to trust it"""
+        if len(self._latencies) < 20:
+            return None
+        return max(percentile(self._latencies, self.hedge_percentile), self.min_hedge_delay)
+
+    async def call(self, key: str, fetch: Callable[[float], Dict], hedge: bool = True) -> Dict:
+        """Fetches a value for key through the breaker.
+
+        fetch(timeout) runs on a worker thread. HTTPExceptions below 500 from
+        fetch mean the upstream answered (e.g. unknown symbol) and are re-raised
+        without counting as failures. Only pass hedge=True for idempotent reads.
+        """
+        self.calls += 1
+        if not self.breaker.allow():
+            self.rejected += 1
+            return self._fallback(key, f"{self.name} circuit is open")
+
+        started = time.monotonic()
+        try:
+            value = await self._attempts(fetch, hedge)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if isinstance(e, HTTPException) and e.status_code < 500:
+                self.breaker.record(False, time.monotonic() - started)
+                raise
+            self.failures += 1
+            self.breaker.record(True, time.monotonic() - started)
+            # Exception text can include the request URL and its API key
+            logging.warning(f"{self.name} call for {key} failed: {type(e).__name__}")
+            return self._fallback(key, type(e).__name__)
+
+        self.breaker.record(False, time.monotonic() - started)
+        self._remember(key, value)
+        return value
+
+    def _start(self, fetch):
+        loop = asyncio.get_event_loop()
+        started = time.monotonic()
+        attempt = loop.run_in_executor(self.executor, fetch, self.timeout)
+
+        def done(future):
+            # Losing hedges still count towards the latency history
+            if not future.cancelled() and future.exception() is None:
+                self._latencies.append(time.monotonic() - started)
+        attempt.add_done_callback(done)
+        return attempt
+
+    async def _attempts(self, fetch, hedge: bool) -> Dict:
+        first = self._start(fetch)
+        delay = self.hedge_delay() if hedge else None
+        if delay is None or delay >= self.timeout or self.hedges >= self.hedge_budget * self.calls:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = self._start(fetch)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    if attempt is second:
+                        self.hedge_wins += 1
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+
+    def _remember(self, key: str, value: Dict):
+        self._last_known[key] = (value, time.time())
+        self._last_known.move_to_end(key)
+        while len(self._last_known) > self.max_cached:
+            self._last_known.popitem(last=False)
+
+    def _fallback(self, key: str, reason: str) -> Dict:
+        """The last known value marked stale, or a 503 when there is none recent enough"""
+        cached = self._last_known.get(key)
+        if cached is not None and time.time() - cached[1] <= self.stale_seconds:
+            self.stale_served += 1
+            value, fetched_at = cached
+            return {**value, "stale": True, "as_of": datetime.utcfromtimestamp(fetched_at).isoformat()}
+        retry_after = max(int(self.breaker.retry_after()), 1)
+        raise HTTPException(
+            status_code=503,
+            detail=f"{self.name} is unavailable: {reason}",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def stats(self) -> Dict:
+        p50 = percentile(self._latencies, 50)
+        p95 = percentile(self._latencies, 95)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "stale_served": self.stale_served,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else None,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "breaker": self.breaker.stats()
+        }
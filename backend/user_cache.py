@@ -0,0 +1,88 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+from repository import read_topic_versions
+import events
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+# Cached values built over sliding date windows are also bounded in age
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+
+class UserCache:
+    """Bounded LRU of values computed from one user's data.
+
+    Each entry lists the change topics it depends on and is stamped with the
+    user's write counters for those topics (kept next to the data version),
+    read before the value was computed. A lookup reads the current counters
+    and only returns an entry whose stamp still matches, so a write made by
+    any worker process invalidates it; a value whose computation overlapped
+    a write carries the older stamp and is recomputed on the next lookup.
+    Change events from this process also drop matching entries right away.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # (user_email, name, key) -> (value, topics, stamp, expires_at)
+        self._user_keys = {}  # user_email -> set of entry keys
+
+    async def get_or_compute(self, user_email: str, name: str, key: Hashable,
+                             topics: Iterable[str], compute: Callable[[], Awaitable[Any]]):
+        """Returns the cached value for (name, key), computing and storing it on a miss"""
+        topics = tuple(sorted(set(topics)))
+        versions = await read_topic_versions(user_email)
+        stamp = tuple(versions.get(topic, 0) for topic in topics)
+        entry_key = (user_email, name, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None and entry[2] == stamp and entry[3] > time.monotonic():
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[0]
+        
+        self.misses += 1
+        value = await compute()
+        
+        entry = self._entries.get(entry_key)
+        # Counters only grow, so a stamp behind the stored one belongs to an older computation
+        if entry is None or all(new >= old for new, old in zip(stamp, entry[2])):
+            self._store(entry_key, value, topics, stamp)
+        return value
+
+    def _store(self, entry_key, value, topics, stamp):
+        self._entries[entry_key] = (value, topics, stamp, time.monotonic() + self.ttl)
+        self._entries.move_to_end(entry_key)
+        self._user_keys.setdefault(entry_key[0], set()).add(entry_key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._forget(evicted)
+
+    def _forget(self, entry_key):
+        keys = self._user_keys.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key)
+            if not keys:
+                del self._user_keys[entry_key[0]]
+
+    def invalidate(self, user_email: str, topic: str):
+        """Change event handler: drops the user's entries that depend on topic"""
+        for entry_key in list(self._user_keys.get(user_email, ())):
+            if topic in self._entries[entry_key][1]:
+                del self._entries[entry_key]
+                self._forget(entry_key)
+                self.invalidations += 1
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "users": len(self._user_keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }
+
+user_cache = UserCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+events.subscribe(user_cache.invalidate)
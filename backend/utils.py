@@ -1,28 +1,31 @@
 import datetime
 import os
-import openai
 import logging
-import jwt
-import requests
 from typing import Dict, List, Optional, Union
 from dotenv import load_dotenv
-from fastapi import Request, HTTPException
+from fastapi import Request, HTTPException, Header
 
 logging.basicConfig(level=logging.INFO)
 
 load_dotenv()
 
-# Configure OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY")
 
+def get_openai():
+    """Imports and configures the OpenAI client on first use"""
+    import openai
+    if not openai.api_key:
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+    return openai
+
+CURRENCY_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
 def format_currency(amount: float, currency: str = "INR") -> str:
     """Formats a number as currency"""
     try:
-        if currency == "INR":
-            return f"₹{amount:,.2f}"
-        elif currency == "USD":
-            return f"${amount:,.2f}"
+        symbol = CURRENCY_SYMBOLS.get(currency)
+        if symbol:
+            return f"{symbol}{amount:,.2f}"
         else:
             return f"{amount:,.2f} {currency}"
     except Exception as e:
@@ -49,6 +52,7 @@ async def generate_ai_suggestion(user_data: Optional[Dict] = None):
         else:
             prompt = f"{base_prompt} Provide a general smart money-saving tip."
         
+        openai = get_openai()
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",  # Updated to use chat model
             messages=[
@@ -74,19 +78,55 @@ def validate_transaction(data):
         
     return None
 
-async def verify_token(token: str) -> Dict:
-    """Verifies a JWT token and returns the payload"""
+async def verify_token(token: str, audience: Optional[str] = None) -> Dict:
+    """Verifies a JWT token and returns the payload.
+
+    Tokens issued for one purpose only (such as price stream tickets) carry an
+    audience and are rejected unless that audience is asked for.
+    """
+    import jwt
+    
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], audience=audience)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def calculate_budget_status(budget: Dict, transactions: List[Dict]) -> Dict:
-    """Calculate budget status based on transactions"""
-    total_spent = sum(t["amount"] for t in transactions if t["category"] == budget["category"])
+async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> str:
+    """Returns the authenticated user's email from the bearer token"""
+    # Sub-requests dispatched in-process by /batch were authenticated once already
+    batch_user = getattr(request.state, "user_email", None)
+    if batch_user:
+        return batch_user
+    
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+    
+    token = authorization.split(" ")[1]
+    payload = await verify_token(token)
+    return payload["email"]
+
+async def get_current_admin(request: Request, authorization: Optional[str] = Header(None)) -> str:
+    """Like get_current_user, but only for users with the admin role"""
+    from repository import get_user_role
+    
+    user_email = await get_current_user(request, authorization)
+    if await get_user_role(user_email) != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_email
+
+def calculate_budget_status(budget: Dict, transactions) -> Dict:
+    """Calculate budget status from transaction rows or a cached TransactionWindow"""
+    if isinstance(transactions, list):
+        total_spent = sum(t["amount"] for t in transactions if t["category"] == budget["category"])
+    else:
+        total_spent = transactions.category_totals().get(budget["category"], 0.0)
+    return budget_status_from_spent(budget, total_spent)
+
+def budget_status_from_spent(budget: Dict, total_spent: float) -> Dict:
+    """Calculate budget status from the amount already spent in its category"""
     remaining = budget["amount"] - total_spent
     percentage_used = (total_spent / budget["amount"]) * 100 if budget["amount"] > 0 else 0
     
@@ -99,22 +139,29 @@ def calculate_budget_status(budget: Dict, transactions: List[Dict]) -> Dict:
     }
 
 async def get_financial_news():
-    """Fetch latest financial news"""
-    NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+    """Fetch latest financial news (served from the background-refreshed news cache)"""
+    from news_cache import get_latest_news
+    
     try:
-        url = f"https://newsapi.org/v2/top-headlines?country=in&category=business&apiKey={NEWS_API_KEY}"
-        response = requests.get(url)
-        data = response.json()
-        return data.get("articles", [])[:5]  # Return top 5 news articles
+        return await get_latest_news(count=5)  # Return top 5 news articles
     except Exception as e:
         logging.error(f"Error fetching financial news: {e}")
         return []
 
-def analyze_spending_trends(transactions: List[Dict]) -> Dict:
-    """Analyze spending trends from transaction data"""
-    if not transactions:
+def analyze_spending_trends(transactions) -> Dict:
+    """Analyze spending trends from transaction rows or a cached TransactionWindow"""
+    if not len(transactions):
         return {"message": "No transaction data available"}
     
+    if not isinstance(transactions, list):
+        categories = transactions.category_totals()
+        monthly_spending = transactions.monthly_totals()
+        return {
+            "top_spending_categories": sorted(categories.items(), key=lambda x: x[1], reverse=True)[:3],
+            "monthly_spending": monthly_spending,
+            "total_transactions": len(transactions)
+        }
+    
     categories = {}
     monthly_spending = {}
     
@@ -0,0 +1,62 @@
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import Response
+from repository import read_data_version, increment_data_version
+from shared_cache import get_or_fetch
+import events
+
+# Responses derived from a user's data can be revalidated but never served blindly
+CACHE_CONTROL = "private, no-cache"
+# How long a computed body stays reusable under its ETag by every worker
+ETAG_CACHE_SECONDS = float(os.getenv("ETAG_CACHE_SECONDS", 300))
+
+async def get_data_version(user_email: str) -> int:
+    """Returns the current data version for a user (0 if never written)"""
+    return await read_data_version(user_email)
+
+async def bump_data_version(user_email: str, topic: str) -> int:
+    """Publishes a change event and increments the user's data version after a write.
+
+    topic is one of events.CHANGE_TOPICS (transactions, budgets, profile, goals).
+    """
+    events.publish(user_email, topic)
+    return await increment_data_version(user_email, topic)
+
+def make_etag(user_email: str, version: int, *parts) -> str:
+    """Builds a strong ETag from the user, their data version and the request shape"""
+    raw = "|".join([user_email, str(version)] + ["" if p is None else str(p) for p in parts])
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+async def cached_response(etag: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """The response body for etag, computed once per host through the shared cache.
+
+    compute must read the user's data at the version the ETag was built from
+    or later: from the database, or from per-process caches checked against
+    that version (transaction_cache, user_cache). A body built from anything
+    older would be stored under the new ETag for every worker, and clients
+    revalidating with that ETag would keep it until the next write.
+    """
+    return await get_or_fetch(f"etag:{etag}", ETAG_CACHE_SECONDS, compute)
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response for a matching conditional GET"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+def set_etag_headers(response: Response, etag: str):
+    """Attaches the ETag and revalidation headers to a full response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+class GroupCommitBuffer:
+    """Collects concurrent inserts and writes them with one batched round trip.
+
+    When no batch is being written, a document goes out on the next loop
+    iteration (together with anything queued in the same tick), so a lone
+    writer pays no extra latency. While a batch is in flight, new documents
+    queue up and are flushed when it completes, when the queue reaches
+    max_batch, or after max_delay seconds, whichever comes first. Each caller
+    waits until the batch write is acknowledged and then gets its own
+    document's _id, or its own error, so durability matches a single insert.
+
+    write_batch receives the documents (with _id already assigned) and
+    returns one entry per document: None on success or the exception for
+    that document.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Dict]], Awaitable[List[Optional[Exception]]]],
+                 max_batch: int, max_delay: float):
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.documents = 0
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+
+    async def insert(self, document: Dict):
+        """Queues a document and returns its _id once its batch is written"""
+        from bson.objectid import ObjectId
+        
+        document.setdefault("_id", ObjectId())
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+        
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            delay = self.max_delay if self._inflight else 0
+            self._timer = loop.call_later(delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._write_done)
+
+    def _write_done(self, task):
+        self._inflight.discard(task)
+        # Documents that queued behind this batch go out now rather than at max_delay
+        if self._pending and not self._inflight:
+            self._flush()
+
+    async def _write(self, batch):
+        documents = [document for document, _ in batch]
+        try:
+            errors = await self.write_batch(documents)
+        except Exception as e:
+            logging.error(f"Group commit of {len(documents)} documents failed: {e}")
+            errors = [e] * len(documents)
+        
+        self.batches += 1
+        self.documents += len(documents)
+        for (document, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(document["_id"])
+            else:
+                future.set_exception(error)
+
+    async def drain(self):
+        """Flushes anything pending and waits for in-flight batches (used at shutdown)"""
+        self._flush()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
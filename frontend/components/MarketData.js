@@ -55,12 +55,66 @@ export default function MarketData({ className }) {
       }
     };
 
+    const fetchTrendingAssets = async () => {
+      try {
+        const trendingRes = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/market/trending`);
+        if (!trendingRes.ok) throw new Error(`Failed to fetch trending assets: ${trendingRes.statusText}`);
+        const trendingJson = await trendingRes.json();
+        setTrendingAssets([
+          ...trendingJson.trending_stocks?.slice(0, 3) || [],
+          ...trendingJson.trending_crypto?.slice(0, 3) || []
+        ]);
+      } catch (err) {
+        console.error("Error refreshing trending assets:", err.message);
+      }
+    };
+
     fetchMarketData();
+
+    // Live prices are pushed by the server; EventSource reconnects on its own
+    // and resumes from the last event it received. It cannot send headers, so
+    // the stream is authenticated by a short-lived ticket cookie
+    let priceStream = null;
+    let closed = false;
+    const openPriceStream = async () => {
+      try {
+        const ticketRes = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/market/stream/ticket`, {
+          method: 'POST',
+          credentials: 'include',
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+        });
+        if (!ticketRes.ok) throw new Error(`Failed to get a price stream ticket: ${ticketRes.statusText}`);
+        if (closed) return;
+        priceStream = new EventSource(
+          `${process.env.NEXT_PUBLIC_BACKEND_URL}/market/stream?symbols=stock:AAPL,crypto:bitcoin`,
+          { withCredentials: true }
+        );
+        priceStream.addEventListener('price', (event) => {
+          const update = JSON.parse(event.data);
+          if (update.symbol === 'stock:AAPL') {
+            setStockData(update.quote);
+          } else if (update.symbol === 'crypto:bitcoin') {
+            setCryptoData(update.quote);
+          }
+        });
+        // A reconnect after the ticket expired is refused and not retried; start over with a new ticket
+        priceStream.onerror = () => {
+          if (!closed && priceStream.readyState === EventSource.CLOSED) setTimeout(openPriceStream, 3000);
+        };
+      } catch (err) {
+        console.error("Error opening price stream:", err.message);
+      }
+    };
+    if (localStorage.getItem('token')) openPriceStream();
     
-    // Refresh data every 5 minutes
-    const intervalId = setInterval(fetchMarketData, 5 * 60 * 1000);
+    // Trending assets are not streamed, so refresh them every 5 minutes
+    const intervalId = setInterval(fetchTrendingAssets, 5 * 60 * 1000);
     
-    return () => clearInterval(intervalId);
+    return () => {
+      closed = true;
+      if (priceStream) priceStream.close();
+      clearInterval(intervalId);
+    };
   }, []);
 
   // Mock historical data for charts
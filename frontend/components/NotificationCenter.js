@@ -8,52 +8,49 @@ export default function NotificationCenter({ className }) {
   const [unreadCount, setUnreadCount] = useState(0);
   const [isOpen, setIsOpen] = useState(false);
 
-  // Sample notifications - in a real app, these would come from an API
+  // Spending alerts raised by the backend detector when transactions are added
+  const ALERT_TYPES = {
+    anomaly: 'alert',
+    velocity: 'alert',
+    recurring: 'info',
+  };
+
+  const authHeaders = () => ({
+    'Authorization': `Bearer ${localStorage.getItem('token')}`
+  });
+
   useEffect(() => {
     const fetchNotifications = async () => {
+      if (!process.env.NEXT_PUBLIC_BACKEND_URL) {
+        setError('Backend URL not configured');
+        return;
+      }
+      
       setLoading(true);
       
       try {
-        // Simulate API call with sample data
-        await new Promise(resolve => setTimeout(resolve, 800));
+        if (!localStorage.getItem('token')) {
+          throw new Error('Not authenticated');
+        }
         
-        const sampleNotifications = [
-          {
-            id: 1,
-            type: 'alert',
-            title: 'Budget Alert',
-            message: 'You\'ve reached 80% of your Shopping budget this month.',
-            timestamp: new Date(Date.now() - 1000 * 60 * 30), // 30 minutes ago
-            read: false,
-          },
-          {
-            id: 2,
-            type: 'info',
-            title: 'New Financial Insight',
-            message: 'Your spending in Groceries category has decreased by 15% compared to last month.',
-            timestamp: new Date(Date.now() - 1000 * 60 * 60 * 3), // 3 hours ago
-            read: false,
-          },
-          {
-            id: 3,
-            type: 'success',
-            title: 'Savings Goal Progress',
-            message: 'You\'ve reached 50% of your Emergency Fund savings goal!',
-            timestamp: new Date(Date.now() - 1000 * 60 * 60 * 24), // 1 day ago
-            read: true,
-          },
-          {
-            id: 4,
-            type: 'market',
-            title: 'Stock Price Alert',
-            message: 'AAPL stock price is up by 3% today.',
-            timestamp: new Date(Date.now() - 1000 * 60 * 60 * 48), // 2 days ago
-            read: true,
-          },
-        ];
+        const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/alerts/?limit=20`, {
+          headers: authHeaders()
+        });
         
-        setNotifications(sampleNotifications);
-        setUnreadCount(sampleNotifications.filter(n => !n.read).length);
+        if (!response.ok) {
+          throw new Error('Failed to fetch notifications');
+        }
+        
+        const data = await response.json();
+        setNotifications((data.alerts || []).map(alert => ({
+          id: alert._id,
+          type: ALERT_TYPES[alert.type] || 'info',
+          title: alert.title,
+          message: alert.message,
+          timestamp: new Date(alert.created_at),
+          read: alert.read,
+        })));
+        setUnreadCount(data.unread_count || 0);
       } catch (err) {
         console.error('Error fetching notifications:', err);
         setError(err.message);
@@ -66,6 +63,9 @@ export default function NotificationCenter({ className }) {
   }, []);
 
   const markAsRead = (id) => {
+    const notification = notifications.find(n => n.id === id);
+    if (!notification || notification.read) return;
+    
     setNotifications(
       notifications.map(notification => 
         notification.id === id 
@@ -74,6 +74,11 @@ export default function NotificationCenter({ className }) {
       )
     );
     setUnreadCount(prev => Math.max(0, prev - 1));
+    
+    fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/alerts/${id}/read`, {
+      method: 'POST',
+      headers: authHeaders()
+    }).catch(err => console.error('Error marking notification as read:', err));
   };
 
   const markAllAsRead = () => {
@@ -81,6 +86,11 @@ export default function NotificationCenter({ className }) {
       notifications.map(notification => ({ ...notification, read: true }))
     );
     setUnreadCount(0);
+    
+    fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/alerts/read-all`, {
+      method: 'POST',
+      headers: authHeaders()
+    }).catch(err => console.error('Error marking notifications as read:', err));
   };
 
   const getNotificationIcon = (type) => {
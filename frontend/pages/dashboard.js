@@ -41,64 +41,60 @@ export default function Dashboard() {
     }
 
     const fetchData = async () => {
-      // Fetch recent transactions
+      // Transactions and the AI suggestion come back in one batched round trip
       try {
-        const transactionsResponse = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL}/transactions?limit=10`, 
+        const batchResponse = await fetch(
+          `${process.env.NEXT_PUBLIC_BACKEND_URL}/batch`,
           {
+            method: 'POST',
             headers: {
-              'Authorization': `Bearer ${token}`
-            }
+              'Authorization': `Bearer ${token}`,
+              'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+              requests: [
+                { id: 'transactions', path: '/transactions/', params: { limit: 10 } },
+                { id: 'suggestion', path: '/ai/suggest' }
+              ]
+            })
           }
         );
         
-        if (!transactionsResponse.ok) {
-          throw new Error(`Failed to fetch transactions: ${transactionsResponse.statusText}`);
+        if (!batchResponse.ok) {
+          throw new Error(`Failed to fetch dashboard data: ${batchResponse.statusText}`);
         }
         
-        const transactionsData = await transactionsResponse.json();
-        setTransactions(transactionsData.transactions || []);
-      } catch (err) {
-        console.error('Error fetching transactions:', err);
-        setErrors({
-          ...errors,
-          transactions: "Unable to load transactions. Please try again."
-        });
-      } finally {
-        setLoading(prev => ({
-          ...prev,
-          transactions: false
-        }));
-      }
-
-      // Fetch AI suggestion
-      try {
-        const suggestionResponse = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL}/ai/suggest`,
-          {
-            headers: {
-              'Authorization': `Bearer ${token}`
-            }
-          }
-        );
+        const batchData = await batchResponse.json();
+        const results = Object.fromEntries(batchData.responses.map(item => [item.id, item]));
+        const newErrors = {};
         
-        if (!suggestionResponse.ok) {
-          throw new Error(`Failed to fetch AI suggestion: ${suggestionResponse.statusText}`);
+        if (results.transactions?.status === 200) {
+          setTransactions(results.transactions.body.transactions || []);
+        } else {
+          console.error('Error fetching transactions:', results.transactions?.body);
+          newErrors.transactions = "Unable to load transactions. Please try again.";
         }
         
-        const suggestionData = await suggestionResponse.json();
-        setSuggestion(suggestionData.suggestion || "");
+        if (results.suggestion?.status === 200) {
+          setSuggestion(results.suggestion.body.suggestion || "");
+        } else {
+          console.error('Error fetching AI suggestion:', results.suggestion?.body);
+          newErrors.suggestion = "Unable to load AI suggestion. Please try again.";
+        }
+        
+        setErrors(prev => ({ ...prev, ...newErrors }));
       } catch (err) {
-        console.error('Error fetching AI suggestion:', err);
-        setErrors({
-          ...errors,
+        console.error('Error fetching dashboard data:', err);
+        setErrors(prev => ({
+          ...prev,
+          transactions: "Unable to load transactions. Please try again.",
           suggestion: "Unable to load AI suggestion. Please try again."
-        });
+        }));
       } finally {
-        setLoading(prev => ({
-          ...prev,
+        setLoading({
+          transactions: false,
           suggestion: false
-        }));
+        });
       }
     };
 